@@ -1,3 +1,36 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from apps.transactions.models import Transaction
 
-# Create your tests here.
+
+class DashboardTests(TestCase):
+    """Главная страница: итоги одним запросом, баланс по первичному ключу."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.client.force_login(self.user)
+        now = timezone.now()
+        for amount, transaction_type in (('1000.00', 'income'), ('250.00', 'expense'), ('50.00', 'expense')):
+            Transaction.objects.create(user=self.user, amount=Decimal(amount), type=transaction_type, date=now)
+
+    def test_figures(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['balance'], Decimal('700.00'))
+        self.assertEqual(response.context['income'], Decimal('1000.00'))
+        self.assertEqual(response.context['expenses'], Decimal('300.00'))
+        self.assertEqual(len(response.context['recent_transactions']), 3)
+
+    def test_query_count(self):
+        # Сессия и пользователь, итоги месяца, баланс, версия данных, последние транзакции
+        with self.assertNumQueries(6):
+            self.client.get('/')
+        # Последние транзакции - из кэша до следующего изменения данных
+        with self.assertNumQueries(5):
+            self.client.get('/')
@@ -3,11 +3,15 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Sum, Q
 from django.utils import timezone
 from datetime import timedelta
 from apps.transactions.models import Transaction
 from apps.categories.models import Category
+from apps.analytics.services.balance import get_user_balance
+from apps.core.services.data_version import get_request_data_version
 
 
 def login_view(request):
@@ -107,25 +111,28 @@ def dashboard_view(request):
     now = timezone.now()
     month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
-    # Транзакции за месяц
-    monthly_transactions = Transaction.objects.filter(
+    # Расходы и доходы за месяц - одним запросом
+    monthly = Transaction.objects.filter(
         user=request.user,
         date__gte=month_start
+    ).aggregate(
+        expenses=Sum('amount', filter=Q(type='expense')),
+        income=Sum('amount', filter=Q(type='income')),
     )
+    expenses = monthly['expenses'] or 0
+    income = monthly['income'] or 0
     
-    # Считаем расходы и доходы
-    expenses = monthly_transactions.filter(type='expense').aggregate(total=Sum('amount'))['total'] or 0
-    income = monthly_transactions.filter(type='income').aggregate(total=Sum('amount'))['total'] or 0
+    # Общий баланс (все доходы - все расходы) - из поддерживаемых итогов пользователя
+    balance = get_user_balance(request.user.id).balance
     
-    # Общий баланс (все доходы - все расходы)
-    total_income = Transaction.objects.filter(user=request.user, type='income').aggregate(total=Sum('amount'))['total'] or 0
-    total_expenses = Transaction.objects.filter(user=request.user, type='expense').aggregate(total=Sum('amount'))['total'] or 0
-    balance = total_income - total_expenses
-    
-    # Последние транзакции
-    recent_transactions = Transaction.objects.filter(
-        user=request.user
-    ).select_related('category').order_by('-date')[:5]
+    # Последние транзакции - кэш до следующего изменения данных пользователя
+    recent_key = f'dashboard_recent:{request.user.id}:{get_request_data_version(request)}'
+    recent_transactions = cache.get(recent_key)
+    if recent_transactions is None:
+        recent_transactions = list(Transaction.objects.filter(
+            user=request.user
+        ).select_related('category').order_by('-date')[:5])
+        cache.set(recent_key, recent_transactions, settings.DASHBOARD_RECENT_CACHE_TTL)
     
     # Категории
     categories = Category.objects.filter(is_system=True)[:10]
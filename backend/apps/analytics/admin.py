@@ -1,3 +1,39 @@
 from django.contrib import admin
+from apps.analytics.models import DailyUserCategoryRollup, InsightCacheEntry, InsightJob, UserBalance
 
-# Register your models here.
+
+@admin.register(DailyUserCategoryRollup)
+class DailyUserCategoryRollupAdmin(admin.ModelAdmin):
+    list_display = ['user', 'day', 'category', 'type', 'total', 'count']
+    list_filter = ['type']
+    search_fields = ['user__email']
+    date_hierarchy = 'day'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'category')
+
+
+@admin.register(UserBalance)
+class UserBalanceAdmin(admin.ModelAdmin):
+    list_display = ['user', 'total_income', 'total_expense', 'updated_at']
+    search_fields = ['user__email']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(InsightJob)
+class InsightJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'days', 'status', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['user__email']
+    readonly_fields = ['financial_data', 'result', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+
+@admin.register(InsightCacheEntry)
+class InsightCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ['key', 'model', 'prompt_version', 'created_at', 'expires_at']
+    list_filter = ['model', 'prompt_version']
+    search_fields = ['key']
+    readonly_fields = ['key', 'financial_data', 'insights', 'created_at']
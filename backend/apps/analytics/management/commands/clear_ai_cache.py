@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.core.cache import cache
+from apps.analytics.models import InsightCacheEntry
 
 
 class Command(BaseCommand):
@@ -28,4 +29,9 @@ class Command(BaseCommand):
             cache.clear()
             self.stdout.write(self.style.WARNING('Очищен весь кэш'))
         
-        self.stdout.write(self.style.SUCCESS(f'Удалено {deleted_count} ключей кэша AI'))
+        # Рекомендации по ключу содержимого хранятся и в БД
+        deleted_entries, _ = InsightCacheEntry.objects.all().delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено {deleted_count} ключей кэша AI, записей в БД: {deleted_entries}'
+        ))
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.services.balance import rebuild_user_balance
+from apps.analytics.services.rollups import rebuild_user_rollups
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать дневные агрегаты и балансы пользователей (заполнение и восстановление после сбоев)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email или id пользователя (по умолчанию - все пользователи)')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user']:
+            value = options['user']
+            lookup = {'id': value} if value.isdigit() else {'email': value}
+            users = users.filter(**lookup)
+            if not users.exists():
+                raise CommandError(f'Пользователь не найден: {value}')
+
+        total_users = 0
+        total_rows = 0
+        for user_id, email in users.values_list('id', 'email').iterator():
+            rows = rebuild_user_rollups(user_id)
+            rebuild_user_balance(user_id)
+            total_users += 1
+            total_rows += rows
+            self.stdout.write(f'  {email}: {rows} агрегатов')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово! Пользователей: {total_users}, агрегатов: {total_rows}'
+        ))
@@ -0,0 +1,48 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.analytics.models import InsightJob
+from apps.analytics.services.insights import (
+    fail_stale_insight_jobs, prune_insight_cache, prune_insight_jobs, run_insight_job
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Обработать задачи AI-рекомендаций в очереди '
+        '(отдельный воркер при AI_INSIGHTS_ASYNC=False или после перезапуска веб-процессов)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, опрашивая очередь')
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза между опросами очереди, секунд')
+        parser.add_argument('--prune', action='store_true', help='Удалить старые задачи и записи кэша рекомендаций и выйти')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            deleted = prune_insight_jobs()
+            deleted_entries = prune_insight_cache()
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалено задач: {deleted}, записей кэша: {deleted_entries}'
+            ))
+            return
+
+        while True:
+            processed = self._process_pending()
+            if not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Готово! Обработано задач: {processed}'))
+                return
+            if not processed:
+                time.sleep(options['interval'])
+
+    def _process_pending(self):
+        stale = fail_stale_insight_jobs()
+        if stale:
+            self.stdout.write(self.style.WARNING(f'Прерванных задач завершено с ошибкой: {stale}'))
+        processed = 0
+        job_ids = InsightJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True)
+        for job_id in list(job_ids):
+            job = run_insight_job(job_id)
+            if job is not None:
+                processed += 1
+                self.stdout.write(f'  задача #{job.pk}: {job.get_status_display()}')
+        return processed
@@ -0,0 +1,130 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    """Заполняет дневные агрегаты по уже существующим транзакциям."""
+    Transaction = apps.get_model("transactions", "Transaction")
+    DailyUserCategoryRollup = apps.get_model("analytics", "DailyUserCategoryRollup")
+
+    rows = (
+        Transaction.objects.annotate(day=TruncDate("date"))
+        .values("user_id", "day", "category_id", "type")
+        .annotate(
+            total=Sum("amount"),
+            count=Count("id"),
+            min_amount=Min("amount"),
+            max_amount=Max("amount"),
+        )
+        .order_by()
+    )
+    DailyUserCategoryRollup.objects.bulk_create(
+        (DailyUserCategoryRollup(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("categories", "0003_merchant_category_rule"),
+        ("transactions", "0002_transaction_fingerprint"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyUserCategoryRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[("expense", "Расход"), ("income", "Доход")],
+                        max_length=10,
+                        verbose_name="Тип",
+                    ),
+                ),
+                (
+                    "total",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=18, verbose_name="Сумма"
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(default=0, verbose_name="Количество"),
+                ),
+                (
+                    "min_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=15,
+                        verbose_name="Минимальная сумма",
+                    ),
+                ),
+                (
+                    "max_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=15,
+                        verbose_name="Максимальная сумма",
+                    ),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="daily_rollups",
+                        to="categories.category",
+                        verbose_name="Категория",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Дневной агрегат",
+                "verbose_name_plural": "Дневные агрегаты",
+                "db_table": "daily_user_category_rollups",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "day"], name="daily_user__user_id_6fb865_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("category__isnull", False)),
+                        fields=("user", "day", "category", "type"),
+                        name="unique_daily_rollup_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_rollups, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def fill_balances(apps, schema_editor):
+    """Считает балансы пользователей по уже существующим транзакциям."""
+    Transaction = apps.get_model("transactions", "Transaction")
+    UserBalance = apps.get_model("analytics", "UserBalance")
+
+    rows = (
+        Transaction.objects.values("user_id")
+        .annotate(
+            total_income=Sum("amount", filter=Q(type="income")),
+            total_expense=Sum("amount", filter=Q(type="expense")),
+        )
+        .order_by()
+    )
+    UserBalance.objects.bulk_create(
+        (
+            UserBalance(
+                user_id=row["user_id"],
+                total_income=row["total_income"] or 0,
+                total_expense=row["total_expense"] or 0,
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_alter_profile_avatar_alter_profile_bio"),
+        ("analytics", "0001_daily_user_category_rollup"),
+        ("transactions", "0003_transaction_user_updated_at_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserBalance",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="balance",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                (
+                    "total_income",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=18,
+                        verbose_name="Всего доходов",
+                    ),
+                ),
+                (
+                    "total_expense",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=18,
+                        verbose_name="Всего расходов",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+            ],
+            options={
+                "verbose_name": "Баланс пользователя",
+                "verbose_name_plural": "Балансы пользователей",
+                "db_table": "user_balances",
+            },
+        ),
+        migrations.RunPython(fill_balances, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0002_user_balance"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InsightJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("days", models.PositiveIntegerField(verbose_name="Период (дней)")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("done", "Готово"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("start_date", models.DateTimeField(verbose_name="Начало периода")),
+                ("end_date", models.DateTimeField(verbose_name="Конец периода")),
+                (
+                    "financial_data",
+                    models.JSONField(default=dict, verbose_name="Данные для анализа"),
+                ),
+                (
+                    "result",
+                    models.JSONField(blank=True, null=True, verbose_name="Результат"),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="insight_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Задача AI-рекомендаций",
+                "verbose_name_plural": "Задачи AI-рекомендаций",
+                "db_table": "insight_jobs",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "days", "-created_at"],
+                        name="insight_job_user_id_520591_idx",
+                    ),
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="insight_job_status_228017_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0003_insight_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InsightCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        max_length=64, unique=True, verbose_name="Хэш запроса"
+                    ),
+                ),
+                ("model", models.CharField(max_length=200, verbose_name="Модель")),
+                (
+                    "prompt_version",
+                    models.PositiveIntegerField(verbose_name="Версия промпта"),
+                ),
+                (
+                    "financial_data",
+                    models.JSONField(default=dict, verbose_name="Данные для анализа"),
+                ),
+                (
+                    "insights",
+                    models.JSONField(default=list, verbose_name="Рекомендации"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "expires_at",
+                    models.DateTimeField(db_index=True, verbose_name="Актуально до"),
+                ),
+            ],
+            options={
+                "verbose_name": "Кэш AI-рекомендаций",
+                "verbose_name_plural": "Кэш AI-рекомендаций",
+                "db_table": "insight_cache",
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q, Sum
+
+
+def fill_missing_balances(apps, schema_editor):
+    """
+    Создаёт балансы пользователям, у которых строки ещё нет (раньше она
+    создавалась лениво при первом чтении). Дальше строка создаётся вместе с пользователем.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Transaction = apps.get_model("transactions", "Transaction")
+    UserBalance = apps.get_model("analytics", "UserBalance")
+
+    user_ids = User.objects.filter(balance__isnull=True).values_list("id", flat=True)
+    totals = {
+        row["user_id"]: row
+        for row in Transaction.objects.filter(user_id__in=user_ids)
+        .values("user_id")
+        .annotate(
+            total_income=Sum("amount", filter=Q(type="income")),
+            total_expense=Sum("amount", filter=Q(type="expense")),
+        )
+        .order_by()
+    }
+    UserBalance.objects.bulk_create(
+        (
+            UserBalance(
+                user_id=user_id,
+                total_income=totals.get(user_id, {}).get("total_income") or 0,
+                total_expense=totals.get(user_id, {}).get("total_expense") or 0,
+            )
+            for user_id in user_ids.iterator()
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("analytics", "0004_insight_cache_entry"),
+        ("transactions", "0005_import_job_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_missing_balances, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,150 @@
 from django.db import models
+from django.conf import settings
 
-# Create your models here.
+
+class DailyUserCategoryRollup(models.Model):
+    """
+    Дневной агрегат транзакций пользователя по категории и типу.
+    Поддерживается инкрементально при изменении транзакций
+    и пересобирается командой rebuild_rollups.
+    """
+    TRANSACTION_TYPES = [
+        ('expense', 'Расход'),
+        ('income', 'Доход'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+        verbose_name='Пользователь'
+    )
+    day = models.DateField(verbose_name='День')
+    # Как и у транзакций: при удалении категории агрегат уходит в "Без категории"
+    category = models.ForeignKey(
+        'categories.Category',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='daily_rollups',
+        verbose_name='Категория'
+    )
+    type = models.CharField(max_length=10, choices=TRANSACTION_TYPES, verbose_name='Тип')
+    total = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name='Сумма')
+    count = models.PositiveIntegerField(default=0, verbose_name='Количество')
+    min_amount = models.DecimalField(max_digits=15, decimal_places=2, verbose_name='Минимальная сумма')
+    max_amount = models.DecimalField(max_digits=15, decimal_places=2, verbose_name='Максимальная сумма')
+
+    class Meta:
+        db_table = 'daily_user_category_rollups'
+        verbose_name = 'Дневной агрегат'
+        verbose_name_plural = 'Дневные агрегаты'
+        indexes = [
+            models.Index(fields=['user', 'day']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'day', 'category', 'type'],
+                condition=models.Q(category__isnull=False),
+                name='unique_daily_rollup_bucket'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} {self.day} {self.category_id} {self.type}: {self.total}'
+
+
+class UserBalance(models.Model):
+    """
+    Итоги пользователя за всё время (баланс).
+    Поддерживаются инкрементально при изменении транзакций,
+    чтобы главная страница не суммировала всю историю.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='balance',
+        verbose_name='Пользователь'
+    )
+    total_income = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name='Всего доходов')
+    total_expense = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name='Всего расходов')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        db_table = 'user_balances'
+        verbose_name = 'Баланс пользователя'
+        verbose_name_plural = 'Балансы пользователей'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.balance}'
+
+    @property
+    def balance(self):
+        return self.total_income - self.total_expense
+
+
+class InsightJob(models.Model):
+    """
+    Задача генерации AI-рекомендаций.
+    Запрос к LLM выполняется в фоне, клиент опрашивает статус задачи.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='insight_jobs',
+        verbose_name='Пользователь'
+    )
+    days = models.PositiveIntegerField(verbose_name='Период (дней)')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    start_date = models.DateTimeField(verbose_name='Начало периода')
+    end_date = models.DateTimeField(verbose_name='Конец периода')
+    financial_data = models.JSONField(default=dict, verbose_name='Данные для анализа')
+    result = models.JSONField(null=True, blank=True, verbose_name='Результат')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'insight_jobs'
+        verbose_name = 'Задача AI-рекомендаций'
+        verbose_name_plural = 'Задачи AI-рекомендаций'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'days', '-created_at']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} {self.days}d ({self.get_status_display()})'
+
+
+class InsightCacheEntry(models.Model):
+    """
+    Кэш AI-рекомендаций по содержимому запроса.
+    Ключ - хэш данных для промпта, модели и версии промпта, поэтому
+    одинаковые сводки (в т.ч. разных пользователей) не отправляются в LLM повторно.
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name='Хэш запроса')
+    model = models.CharField(max_length=200, verbose_name='Модель')
+    prompt_version = models.PositiveIntegerField(verbose_name='Версия промпта')
+    financial_data = models.JSONField(default=dict, verbose_name='Данные для анализа')
+    insights = models.JSONField(default=list, verbose_name='Рекомендации')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Актуально до')
+
+    class Meta:
+        db_table = 'insight_cache'
+        verbose_name = 'Кэш AI-рекомендаций'
+        verbose_name_plural = 'Кэш AI-рекомендаций'
+
+    def __str__(self):
+        return f'{self.key[:12]} ({self.model})'
@@ -0,0 +1,74 @@
+"""
+Баланс пользователя за всё время (UserBalance).
+
+Итоги доходов и расходов сдвигаются на сумму каждой записанной/изменённой/удалённой
+транзакции, поэтому чтение баланса - один запрос по первичному ключу.
+Строка создаётся вместе с пользователем (с нулями), так что сдвиг всегда находит её.
+Полный пересчёт (rebuild_rollups, восстановление строки) идёт под блокировкой строки:
+параллельный сдвиг ждёт пересчёта и применяется поверх него, а сдвиг, начатый раньше,
+пересчёт дожидается и видит в агрегации.
+"""
+
+from decimal import Decimal
+from typing import Iterable
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from apps.analytics.models import UserBalance
+from apps.transactions.models import Transaction
+
+_BALANCE_FIELDS = {'income': 'total_income', 'expense': 'total_expense'}
+
+
+def apply_balance_delta(user_id: int, transaction_type: str, delta: Decimal):
+    """Сдвигает итог доходов или расходов пользователя на delta."""
+    field = _BALANCE_FIELDS.get(transaction_type)
+    if field is None or not delta:
+        return
+    UserBalance.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta}, updated_at=timezone.now()
+    )
+
+
+def add_transactions_to_balance(transactions: Iterable[Transaction]):
+    """Учитывает в балансе транзакции, записанные в обход сигналов (bulk_create)."""
+    deltas = {}
+    for obj in transactions:
+        key = (obj.user_id, obj.type)
+        deltas[key] = deltas.get(key, Decimal('0')) + Decimal(str(obj.amount))
+    for (user_id, transaction_type), delta in deltas.items():
+        apply_balance_delta(user_id, transaction_type, delta)
+
+
+def create_user_balance(user_id: int):
+    """Создаёт пустую строку баланса, если её нет."""
+    try:
+        with db_transaction.atomic():
+            UserBalance.objects.get_or_create(user_id=user_id)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        pass
+
+
+def rebuild_user_balance(user_id: int) -> UserBalance:
+    """Пересчитывает баланс пользователя по всем транзакциям под блокировкой строки."""
+    create_user_balance(user_id)
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=18, decimal_places=2))
+    with db_transaction.atomic():
+        balance = UserBalance.objects.select_for_update().get(user_id=user_id)
+        # Агрегация - после блокировки: сдвиги, записанные до неё, уже закоммичены
+        totals = Transaction.objects.filter(user_id=user_id).aggregate(
+            total_income=Coalesce(Sum('amount', filter=Q(type='income')), zero),
+            total_expense=Coalesce(Sum('amount', filter=Q(type='expense')), zero),
+        )
+        balance.total_income = totals['total_income']
+        balance.total_expense = totals['total_expense']
+        balance.save(update_fields=['total_income', 'total_expense', 'updated_at'])
+    return balance
+
+
+def get_user_balance(user_id: int) -> UserBalance:
+    """Баланс пользователя; если строки нет (удалена вручную) - пересчитывается."""
+    balance = UserBalance.objects.filter(user_id=user_id).first()
+    return balance or rebuild_user_balance(user_id)
@@ -0,0 +1,301 @@
+"""
+AI-рекомендации по финансам пользователя.
+
+Сводка за период считается в запросе (дневные агрегаты - это дёшево), а запрос
+к LLM, который может длиться минутами, выполняется в фоне (InsightJob):
+поток gunicorn не ждёт OpenRouter. Клиент получает 202 с id задачи
+и опрашивает её статус.
+
+Рекомендации кэшируются по содержимому: ключ - хэш данных для промпта, модели
+и версии промпта (InsightCacheEntry + кэш Django поверх). Пока сводка
+не меняется, LLM не вызывается повторно - ни через час, ни для другого
+пользователя с такими же агрегатами; новая транзакция меняет ключ.
+
+Одновременные промахи кэша (веб и мобильный клиент) запускают одну генерацию:
+победитель ставит блокировку cache.add с id своей задачи, остальные получают
+ту же задачу. Пока она идёт, отдаются устаревшие рекомендации: истёкшая запись
+для тех же данных или последний результат пользователя за этот период.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.utils import timezone
+from apps.analytics.models import InsightCacheEntry, InsightJob
+from apps.analytics.services.summary import period_summary
+from apps.core.services.background import submit_on_commit
+from apps.core.services.openrouter_service import PROMPT_VERSION, openrouter_service
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+def insights_cache_key(user_id: int, days: int) -> str:
+    """Последний результат пользователя за период (отдаётся, пока готовится новый)."""
+    return f'ai_insights_{user_id}_{days}'
+
+
+def insights_lock_key(user_id: int, days: int) -> str:
+    return f'ai_insights_lock_{user_id}_{days}'
+
+
+def insights_content_key(financial_data: Dict[str, Any]) -> str:
+    """Стабильный хэш входа LLM: данные для промпта, модель и версия промпта."""
+    payload = json.dumps(
+        {'data': financial_data, 'model': openrouter_service.model, 'prompt_version': PROMPT_VERSION},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_financial_data(summary: Dict[str, Any], days: int) -> Dict[str, Any]:
+    """Данные для промпта LLM из сводки за период."""
+    return {
+        'period_days': days,
+        'total_expenses': float(summary['total_expenses']),
+        'total_income': float(summary['total_income']),
+        'balance': float(summary['balance']),
+        'expense_count': summary['expense_count'],
+        'income_count': summary['income_count'],
+        'top_categories': [
+            {'name': cat['name'] or 'Без категории', 'total': float(cat['total'])}
+            for cat in summary['top_categories']
+        ]
+    }
+
+
+def build_result(insights: List[Dict[str, str]], financial_data: Dict[str, Any],
+                 start_date: datetime, end_date: datetime, days: int) -> Dict[str, Any]:
+    """Ответ эндпоинта AI-рекомендаций."""
+    return {
+        'insights': insights,
+        'period': {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'days': days
+        },
+        'summary': financial_data
+    }
+
+
+def is_error_result(result: Dict[str, Any]) -> bool:
+    insights = result.get('insights')
+    return not insights or insights[0].get('category') == 'Ошибка подключения'
+
+
+def get_cached_insights(content_key: str) -> Tuple[Optional[List[Dict[str, str]]], bool]:
+    """
+    Рекомендации по ключу содержимого: сначала кэш Django, затем БД.
+
+    Returns:
+        (рекомендации или None, свежие ли они)
+    """
+    memory_key = f'ai_insights_content_{content_key}'
+    entry = cache.get(memory_key)
+    if entry is None:
+        row = InsightCacheEntry.objects.filter(key=content_key).values('insights', 'expires_at').first()
+        if row is None:
+            return None, False
+        entry = {'insights': row['insights'], 'fresh_until': row['expires_at'].timestamp()}
+        cache.set(memory_key, entry, settings.AI_INSIGHTS_CACHE_TTL)
+    return entry['insights'], entry['fresh_until'] > time.time()
+
+
+def store_insights(content_key: str, financial_data: Dict[str, Any], insights: List[Dict[str, str]]):
+    """
+    Сохраняет рекомендации под ключом содержимого на AI_INSIGHTS_CONTENT_TTL.
+    Ответ с ошибкой API кэшируется только в памяти и ненадолго, чтобы не спамить API.
+    """
+    memory_key = f'ai_insights_content_{content_key}'
+    if is_error_result({'insights': insights}):
+        ttl = settings.AI_INSIGHTS_ERROR_CACHE_TTL
+        cache.set(memory_key, {'insights': insights, 'fresh_until': time.time() + ttl}, ttl)
+        return
+
+    expires_at = timezone.now() + timedelta(seconds=settings.AI_INSIGHTS_CONTENT_TTL)
+    defaults = {
+        'model': openrouter_service.model,
+        'prompt_version': PROMPT_VERSION,
+        'financial_data': financial_data,
+        'insights': insights,
+        'expires_at': expires_at,
+    }
+    try:
+        InsightCacheEntry.objects.update_or_create(key=content_key, defaults=defaults)
+    except IntegrityError:
+        # Ту же запись параллельно создал другой воркер
+        InsightCacheEntry.objects.filter(key=content_key).update(**defaults)
+    cache.set(
+        memory_key,
+        {'insights': insights, 'fresh_until': expires_at.timestamp()},
+        settings.AI_INSIGHTS_CACHE_TTL,
+    )
+
+
+def remember_result(user_id: int, days: int, result: Dict[str, Any]):
+    """Запоминает последний успешный результат пользователя для отдачи устаревшим."""
+    if not is_error_result(result):
+        cache.set(insights_cache_key(user_id, days), result, settings.AI_INSIGHTS_STALE_TTL)
+
+
+def _running_job(user, days: int) -> Optional[InsightJob]:
+    """Задача, которая уже генерирует рекомендации пользователя за этот период."""
+    job_id = cache.get(insights_lock_key(user.id, days))
+    jobs = InsightJob.objects.filter(user=user, days=days, status__in=ACTIVE_STATUSES)
+    if job_id:
+        job = jobs.filter(pk=job_id).first()
+        if job:
+            return job
+    # Кэш может быть локальным для процесса - проверяем и задачи других воркеров
+    return jobs.filter(
+        created_at__gte=timezone.now() - timedelta(seconds=settings.AI_INSIGHTS_JOB_TIMEOUT)
+    ).first()
+
+
+def start_insight_job(user, days: int, start_date: datetime, end_date: datetime,
+                      financial_data: Dict[str, Any]) -> InsightJob:
+    """
+    Ставит генерацию рекомендаций в очередь, не более одной на пользователя и период
+    (single-flight). Параллельные запросы получают задачу победителя и затем его результат.
+    """
+    job = _running_job(user, days)
+    if job:
+        return job
+
+    job = InsightJob.objects.create(
+        user=user,
+        days=days,
+        start_date=start_date,
+        end_date=end_date,
+        financial_data=financial_data,
+    )
+    lock_key = insights_lock_key(user.id, days)
+    if not cache.add(lock_key, job.pk, settings.AI_INSIGHTS_JOB_TIMEOUT):
+        # Параллельный запрос успел раньше - используем его задачу
+        winner = _running_job(user, days)
+        if winner and winner.pk != job.pk:
+            job.delete()
+            return winner
+        cache.set(lock_key, job.pk, settings.AI_INSIGHTS_JOB_TIMEOUT)
+
+    enqueue_insight_job(job)
+    return job
+
+
+def get_or_enqueue_insights(user, days: int) -> Tuple[Optional[Dict[str, Any]], Optional[InsightJob], bool]:
+    """
+    Рекомендации из кэша или задача на их генерацию (stale-while-revalidate).
+
+    Returns:
+        (результат, None, False) - актуальные рекомендации;
+        (результат, задача, True) - устаревшие рекомендации, обновление уже идёт;
+        (None, задача, False) - рекомендаций нет, генерация поставлена в очередь
+    """
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=days)
+    summary = period_summary(user.id, start_date, end_date)
+    financial_data = build_financial_data(summary, days)
+
+    # Если нет транзакций - LLM не нужен
+    if summary['transaction_count'] == 0:
+        result = build_result(
+            [{
+                'category': 'Информация',
+                'insight': 'Добавьте транзакции для получения рекомендаций',
+                'type': 'info'
+            }],
+            financial_data, start_date, end_date, days
+        )
+        return result, None, False
+
+    insights, fresh = get_cached_insights(insights_content_key(financial_data))
+    if insights is not None and fresh:
+        result = build_result(insights, financial_data, start_date, end_date, days)
+        remember_result(user.id, days, result)
+        return result, None, False
+
+    job = start_insight_job(user, days, start_date, end_date, financial_data)
+    if insights is not None:
+        return build_result(insights, financial_data, start_date, end_date, days), job, True
+
+    # Данные изменились - до готовности новых отдаём прошлые рекомендации
+    last_result = cache.get(insights_cache_key(user.id, days))
+    if last_result is not None:
+        return last_result, job, True
+    return None, job, False
+
+
+def run_insight_job(job_id: int) -> Optional[InsightJob]:
+    """
+    Генерирует рекомендации по задаче, если она ещё в очереди.
+    Задача захватывается атомарным UPDATE - два обработчика её не возьмут.
+    """
+    claimed = InsightJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    job = InsightJob.objects.get(pk=job_id)
+    try:
+        insights = openrouter_service.analyze_financial_data(job.financial_data)
+        store_insights(insights_content_key(job.financial_data), job.financial_data, insights)
+        job.result = build_result(insights, job.financial_data, job.start_date, job.end_date, job.days)
+        remember_result(job.user_id, job.days, job.result)
+        job.status = 'done'
+    except Exception as e:
+        logger.exception('Insight job %s failed', job_id)
+        job.status = 'failed'
+        job.error = f'{type(e).__name__}: {e}'
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+
+    # Следующая генерация возможна сразу (результат уже в кэше)
+    lock_key = insights_lock_key(job.user_id, job.days)
+    if cache.get(lock_key) == job.pk:
+        cache.delete(lock_key)
+    return job
+
+
+def fail_stale_insight_jobs(queryset=None) -> int:
+    """
+    Завершает ошибкой задачи, которые выполняются дольше AI_INSIGHTS_JOB_TIMEOUT:
+    их поток погиб вместе с воркером. Клиент увидит failed, а следующий запрос
+    рекомендаций создаст новую задачу. Возвращает количество.
+    """
+    horizon = timezone.now() - timedelta(seconds=settings.AI_INSIGHTS_JOB_TIMEOUT)
+    stale = (queryset if queryset is not None else InsightJob.objects.all()).filter(
+        status='running', started_at__lt=horizon
+    )
+    return stale.update(status='failed', error='Обработка прервана', finished_at=timezone.now())
+
+
+def enqueue_insight_job(job: InsightJob):
+    """Ставит задачу в фоновый пул после коммита транзакции БД."""
+    if not settings.AI_INSIGHTS_ASYNC:
+        # Задачу заберёт run_insight_jobs
+        return
+    submit_on_commit('ai-insights', settings.AI_INSIGHTS_WORKERS, run_insight_job, job.pk)
+
+
+def prune_insight_jobs() -> int:
+    """Удаляет задачи старше AI_INSIGHTS_JOB_RETENTION_DAYS. Возвращает количество."""
+    horizon = timezone.now() - timedelta(days=settings.AI_INSIGHTS_JOB_RETENTION_DAYS)
+    deleted, _ = InsightJob.objects.filter(created_at__lt=horizon).delete()
+    return deleted
+
+
+def prune_insight_cache() -> int:
+    """Удаляет записи кэша, которые устарели больше чем на AI_INSIGHTS_STALE_TTL. Возвращает количество."""
+    horizon = timezone.now() - timedelta(seconds=settings.AI_INSIGHTS_STALE_TTL)
+    deleted, _ = InsightCacheEntry.objects.filter(expires_at__lt=horizon).delete()
+    return deleted
@@ -0,0 +1,310 @@
+"""
+Дневные агрегаты транзакций (DailyUserCategoryRollup).
+Ключ агрегата - (пользователь, локальный день, категория, тип), значения - сумма,
+количество, минимум и максимум. Одиночные изменения транзакций применяются
+инкрементально (сигналы), массовые операции пересчитывают затронутые дни целиком.
+Аналитика читает агрегаты за полные дни и сырые транзакции только за неполные
+крайние дни периода.
+"""
+
+from datetime import date as date_type, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Greatest, Least, TruncDate
+from django.utils import timezone
+from apps.analytics.models import DailyUserCategoryRollup
+from apps.categories.models import Category
+from apps.transactions.models import Transaction
+
+
+REBUILD_BATCH_SIZE = 1000
+# Больше диапазонов дней - читаем одним диапазоном от первого до последнего дня
+MAX_REFRESH_RANGES = 50
+
+_AMOUNT_FIELD = DecimalField(max_digits=15, decimal_places=2)
+
+
+def transaction_day(value: datetime) -> date_type:
+    """Локальный день транзакции (в часовом поясе проекта)."""
+    if timezone.is_naive(value):
+        return value.date()
+    return timezone.localdate(value)
+
+
+def _day_start(day: date_type) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _aware(value: datetime) -> datetime:
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def _bucket(user_id: int, day: date_type, category_id: Optional[int], transaction_type: str):
+    # category_id=None превращается в IS NULL
+    return DailyUserCategoryRollup.objects.filter(
+        user_id=user_id, day=day, category_id=category_id, type=transaction_type
+    )
+
+
+def _raw_buckets(queryset) -> List[Dict[str, Any]]:
+    """Группирует сырые транзакции в строки того же вида, что и агрегаты."""
+    return list(
+        queryset.annotate(day=TruncDate('date')).values('day', 'category_id', 'type').annotate(
+            total=Sum('amount'),
+            count=Count('id'),
+            min_amount=Min('amount'),
+            max_amount=Max('amount'),
+        ).order_by()
+    )
+
+
+def add_to_rollup(user_id: int, date: datetime, category_id: Optional[int],
+                  transaction_type: str, amount: Decimal):
+    """Добавляет транзакцию в агрегат её дня."""
+    day = transaction_day(date)
+    bucket = _bucket(user_id, day, category_id, transaction_type)
+    amount_value = Value(amount, output_field=_AMOUNT_FIELD)
+    changes = {
+        'total': F('total') + amount_value,
+        'count': F('count') + 1,
+        'min_amount': Least(F('min_amount'), amount_value),
+        'max_amount': Greatest(F('max_amount'), amount_value),
+    }
+    # После удаления категории в "Без категории" может оказаться несколько строк
+    # одного дня - обновляем ровно одну из них
+    if DailyUserCategoryRollup.objects.filter(pk__in=bucket.values('pk')[:1]).update(**changes):
+        return
+
+    try:
+        with db_transaction.atomic():
+            DailyUserCategoryRollup.objects.create(
+                user_id=user_id,
+                day=day,
+                category_id=category_id,
+                type=transaction_type,
+                total=amount,
+                count=1,
+                min_amount=amount,
+                max_amount=amount,
+            )
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        DailyUserCategoryRollup.objects.filter(pk__in=bucket.values('pk')[:1]).update(**changes)
+
+
+def remove_from_rollup(user_id: int, date: datetime, category_id: Optional[int],
+                       transaction_type: str, amount: Decimal):
+    """
+    Убирает транзакцию из агрегата её дня.
+    Если убирается минимум/максимум или последняя транзакция - агрегат пересчитывается.
+    """
+    day = transaction_day(date)
+    bucket = _bucket(user_id, day, category_id, transaction_type).filter(
+        count__gt=1, min_amount__lt=amount, max_amount__gt=amount
+    )
+    updated = DailyUserCategoryRollup.objects.filter(pk__in=bucket.values('pk')[:1]).update(
+        total=F('total') - Value(amount, output_field=_AMOUNT_FIELD),
+        count=F('count') - 1,
+    )
+    if not updated:
+        recompute_bucket(user_id, day, category_id, transaction_type)
+
+
+def change_amount_in_rollup(user_id: int, date: datetime, category_id: Optional[int],
+                            transaction_type: str, old_amount: Decimal, new_amount: Decimal):
+    """
+    Меняет сумму транзакции внутри её агрегата (день, категория и тип не изменились).
+    Если старая сумма была минимумом/максимумом - агрегат пересчитывается.
+    """
+    day = transaction_day(date)
+    bucket = _bucket(user_id, day, category_id, transaction_type).filter(
+        min_amount__lt=old_amount, max_amount__gt=old_amount
+    )
+    new_value = Value(new_amount, output_field=_AMOUNT_FIELD)
+    updated = DailyUserCategoryRollup.objects.filter(pk__in=bucket.values('pk')[:1]).update(
+        total=F('total') + Value(new_amount - old_amount, output_field=_AMOUNT_FIELD),
+        min_amount=Least(F('min_amount'), new_value),
+        max_amount=Greatest(F('max_amount'), new_value),
+    )
+    if not updated:
+        recompute_bucket(user_id, day, category_id, transaction_type)
+
+
+def recompute_bucket(user_id: int, day: date_type, category_id: Optional[int], transaction_type: str):
+    """Пересчитывает один агрегат по сырым транзакциям дня."""
+    stats = Transaction.objects.filter(
+        user_id=user_id,
+        category_id=category_id,
+        type=transaction_type,
+        date__gte=_day_start(day),
+        date__lt=_day_start(day + timedelta(days=1)),
+    ).aggregate(
+        total=Sum('amount'),
+        count=Count('id'),
+        min_amount=Min('amount'),
+        max_amount=Max('amount'),
+    )
+    with db_transaction.atomic():
+        _bucket(user_id, day, category_id, transaction_type).delete()
+        if stats['count']:
+            DailyUserCategoryRollup.objects.create(
+                user_id=user_id, day=day, category_id=category_id, type=transaction_type, **stats
+            )
+
+
+def refresh_user_days(user_id: int, days: Iterable[date_type]):
+    """
+    Пересчитывает все агрегаты пользователя за указанные дни.
+    Используется массовыми операциями (bulk_create, update), которые не шлют сигналы.
+    """
+    days = set(days)
+    if not days:
+        return
+
+    # Читаем только затронутые дни: соседние дни склеиваются в один диапазон
+    ranges = []
+    for day in sorted(days):
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    if len(ranges) > MAX_REFRESH_RANGES:
+        ranges = [[ranges[0][0], ranges[-1][1]]]
+    date_filter = Q()
+    for first_day, last_day in ranges:
+        date_filter |= Q(date__gte=_day_start(first_day), date__lt=_day_start(last_day + timedelta(days=1)))
+
+    rows = _raw_buckets(Transaction.objects.filter(date_filter, user_id=user_id))
+    with db_transaction.atomic():
+        DailyUserCategoryRollup.objects.filter(user_id=user_id, day__in=days).delete()
+        DailyUserCategoryRollup.objects.bulk_create(
+            [DailyUserCategoryRollup(user_id=user_id, **row) for row in rows if row['day'] in days],
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+
+
+def refresh_transactions_days(transactions: Iterable[Transaction]):
+    """Пересчитывает агрегаты за дни переданных транзакций."""
+    days_by_user = {}
+    for obj in transactions:
+        days_by_user.setdefault(obj.user_id, set()).add(transaction_day(obj.date))
+    for user_id, days in days_by_user.items():
+        refresh_user_days(user_id, days)
+
+
+def rebuild_user_rollups(user_id: int) -> int:
+    """Полностью пересобирает агрегаты пользователя. Возвращает количество строк."""
+    rows = _raw_buckets(Transaction.objects.filter(user_id=user_id))
+    with db_transaction.atomic():
+        DailyUserCategoryRollup.objects.filter(user_id=user_id).delete()
+        DailyUserCategoryRollup.objects.bulk_create(
+            [DailyUserCategoryRollup(user_id=user_id, **row) for row in rows],
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+    return len(rows)
+
+
+def period_buckets(user_id: int, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
+    """
+    Агрегаты транзакций пользователя за период [start_date, end_date].
+
+    Полные дни читаются из дневных агрегатов, неполные крайние дни - из сырых
+    транзакций, поэтому результат совпадает с фильтром date__range по транзакциям.
+
+    Returns:
+        [{'day', 'category_id', 'type', 'total', 'count', 'min_amount', 'max_amount'}, ...]
+        (строки с одинаковым ключом возможны - их нужно суммировать)
+    """
+    start_date = _aware(start_date)
+    end_date = _aware(end_date)
+    if start_date > end_date:
+        return []
+
+    first_full_day = transaction_day(start_date)
+    if _day_start(first_full_day) < start_date:
+        first_full_day += timedelta(days=1)
+    last_full_day = transaction_day(end_date) - timedelta(days=1)
+
+    transactions = Transaction.objects.filter(user_id=user_id)
+    if first_full_day > last_full_day:
+        return _raw_buckets(transactions.filter(date__range=[start_date, end_date]))
+
+    buckets = list(
+        DailyUserCategoryRollup.objects.filter(
+            user_id=user_id, day__range=[first_full_day, last_full_day]
+        ).values('day', 'category_id', 'type', 'total', 'count', 'min_amount', 'max_amount')
+    )
+    buckets.extend(_raw_buckets(transactions.filter(
+        Q(date__gte=start_date, date__lt=_day_start(first_full_day))
+        | Q(date__gte=_day_start(last_full_day + timedelta(days=1)), date__lte=end_date)
+    )))
+    return buckets
+
+
+def totals_by_type(buckets: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """{'expense': {'total', 'count'}, 'income': {'total', 'count'}}"""
+    totals = {
+        'expense': {'total': Decimal('0'), 'count': 0},
+        'income': {'total': Decimal('0'), 'count': 0},
+    }
+    for bucket in buckets:
+        item = totals.setdefault(bucket['type'], {'total': Decimal('0'), 'count': 0})
+        item['total'] += bucket['total']
+        item['count'] += bucket['count']
+    return totals
+
+
+def totals_by_period(buckets: Iterable[Dict[str, Any]], period: str = 'day') -> List[Dict[str, Any]]:
+    """
+    Суммы расходов/доходов по дням или месяцам в порядке возрастания.
+
+    Returns:
+        [{'key': date или (год, месяц), 'expenses', 'income', 'count'}, ...]
+    """
+    grouped = {}
+    for bucket in buckets:
+        day = bucket['day']
+        key = day if period == 'day' else (day.year, day.month)
+        item = grouped.setdefault(key, {
+            'key': key, 'expenses': Decimal('0'), 'income': Decimal('0'), 'count': 0
+        })
+        item['expenses' if bucket['type'] == 'expense' else 'income'] += bucket['total']
+        item['count'] += bucket['count']
+    return [grouped[key] for key in sorted(grouped)]
+
+
+def totals_by_category(buckets: Iterable[Dict[str, Any]], transaction_type: str = 'expense',
+                       limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Суммы по категориям (по убыванию суммы) с названием и цветом категории.
+
+    Returns:
+        [{'category_id', 'name', 'color', 'total', 'count'}, ...]
+        name/color равны None для транзакций без категории
+    """
+    grouped = {}
+    for bucket in buckets:
+        if bucket['type'] != transaction_type:
+            continue
+        item = grouped.setdefault(bucket['category_id'], {
+            'category_id': bucket['category_id'], 'total': Decimal('0'), 'count': 0
+        })
+        item['total'] += bucket['total']
+        item['count'] += bucket['count']
+
+    result = sorted(grouped.values(), key=lambda item: item['total'], reverse=True)
+    if limit is not None:
+        result = result[:limit]
+
+    category_ids = [item['category_id'] for item in result if item['category_id'] is not None]
+    categories = {
+        category_id: (name, color)
+        for category_id, name, color in Category.objects.filter(id__in=category_ids).values_list(
+            'id', 'name', 'color'
+        )
+    } if category_ids else {}
+    for item in result:
+        item['name'], item['color'] = categories.get(item['category_id'], (None, None))
+    return result
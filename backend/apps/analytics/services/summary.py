@@ -0,0 +1,44 @@
+"""
+Общий слой запросов аналитики: сводка за период.
+Все итоги, количества и средние по обоим типам считаются за один проход
+по строкам дневных агрегатов периода, топ категорий - из тех же строк.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+from apps.analytics.services.rollups import period_buckets, totals_by_category, totals_by_type
+
+
+def period_summary(user_id: int, start_date: datetime, end_date: datetime,
+                   top_limit: Optional[int] = 5) -> Dict[str, Any]:
+    """
+    Сводка по транзакциям пользователя за период [start_date, end_date].
+
+    Запросы: агрегаты полных дней, сырые транзакции неполных крайних дней
+    и названия категорий из топа.
+
+    Returns:
+        {
+            'total_expenses', 'total_income', 'balance' (Decimal),
+            'expense_count', 'income_count', 'transaction_count' (int),
+            'average_expense', 'average_income' (Decimal),
+            'top_categories': [{'category_id', 'name', 'color', 'total', 'count'}, ...]
+                (top_limit=None - все категории расходов)
+        }
+    """
+    buckets = period_buckets(user_id, start_date, end_date)
+    totals = totals_by_type(buckets)
+
+    expense = totals['expense']
+    income = totals['income']
+    return {
+        'total_expenses': expense['total'],
+        'total_income': income['total'],
+        'balance': income['total'] - expense['total'],
+        'expense_count': expense['count'],
+        'income_count': income['count'],
+        'transaction_count': expense['count'] + income['count'],
+        'average_expense': expense['total'] / expense['count'] if expense['count'] else expense['total'],
+        'average_income': income['total'] / income['count'] if income['count'] else income['total'],
+        'top_categories': totals_by_category(buckets, 'expense', limit=top_limit),
+    }
@@ -0,0 +1,109 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from apps.analytics.services.balance import apply_balance_delta, create_user_balance, rebuild_user_balance
+from apps.analytics.services.rollups import (
+    add_to_rollup, change_amount_in_rollup, recompute_bucket, remove_from_rollup, transaction_day
+)
+from apps.transactions.models import Transaction
+
+ROLLUP_FIELDS = ('user_id', 'date', 'category_id', 'type', 'amount')
+
+
+def _rollup_key(values):
+    """(user_id, date, category_id, type, amount) с приведёнными типами."""
+    date = Transaction._meta.get_field('date').to_python(values['date'])
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return values['user_id'], date, values['category_id'], values['type'], Decimal(str(values['amount']))
+
+
+def _instance_key(instance):
+    return _rollup_key({field: getattr(instance, field) for field in ROLLUP_FIELDS})
+
+
+def _bucket_of(key):
+    user_id, date, category_id, transaction_type, _ = key
+    return user_id, transaction_day(date), category_id, transaction_type
+
+
+def _move_balance(old_key, new_key):
+    """Переносим сумму транзакции в балансе, если изменились пользователь, тип или сумма."""
+    old_user_id, _, _, old_type, old_amount = old_key
+    new_user_id, _, _, new_type, new_amount = new_key
+    if (old_user_id, old_type, old_amount) != (new_user_id, new_type, new_amount):
+        apply_balance_delta(old_user_id, old_type, -old_amount)
+        apply_balance_delta(new_user_id, new_type, new_amount)
+
+
+def _stored_key(pk):
+    """Ключ агрегата по значениям, которые сейчас лежат в БД."""
+    values = Transaction.objects.filter(pk=pk).values(*ROLLUP_FIELDS).first()
+    return _rollup_key(values) if values else None
+
+
+def _is_transaction_origin(origin):
+    return isinstance(origin, Transaction) or getattr(origin, 'model', None) is Transaction
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_balance_for_new_user(sender, instance, created, raw=False, **kwargs):
+    """Строка баланса есть с момента создания пользователя - сдвигам всегда есть что менять."""
+    if created and not raw:
+        create_user_balance(instance.pk)
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_rollup_key(sender, instance, raw=False, **kwargs):
+    """Запоминаем, в каком дневном агрегате транзакция лежит до сохранения."""
+    if not raw and not instance._state.adding and instance.pk:
+        instance._rollup_key = _stored_key(instance.pk)
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_save(sender, instance, created, raw=False, **kwargs):
+    """Переносим транзакцию из старого дневного агрегата в новый и обновляем баланс."""
+    if raw:
+        return
+
+    new_key = _instance_key(instance)
+    old_key = instance.__dict__.pop('_rollup_key', None)
+    if created:
+        add_to_rollup(*new_key)
+        apply_balance_delta(new_key[0], new_key[3], new_key[4])
+        return
+    if old_key is None:
+        # Строки не было в БД (сохранение с явным pk) - пересчитываем день целиком
+        user_id, date, category_id, transaction_type, _ = new_key
+        recompute_bucket(user_id, transaction_day(date), category_id, transaction_type)
+        rebuild_user_balance(user_id)
+        return
+
+    _move_balance(old_key, new_key)
+    if _bucket_of(old_key) != _bucket_of(new_key):
+        remove_from_rollup(*old_key)
+        add_to_rollup(*new_key)
+    elif old_key[4] != new_key[4]:
+        # Агрегат тот же - сдвигаем только сумму, иначе пересчёт при удалении
+        # уже учёл бы новую сумму и она посчиталась бы дважды
+        change_amount_in_rollup(*new_key[:4], old_key[4], new_key[4])
+
+
+@receiver(pre_delete, sender=Transaction)
+def remember_rollup_key_on_delete(sender, instance, origin=None, **kwargs):
+    # Удаляемый объект мог устареть - берём значения из БД
+    if origin is instance:
+        instance._rollup_key = _stored_key(instance.pk)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    """Убираем удалённую транзакцию из дневного агрегата и баланса."""
+    # При удалении пользователя агрегаты удаляются каскадом вместе с ним
+    if origin is not None and not _is_transaction_origin(origin):
+        return
+    key = instance.__dict__.pop('_rollup_key', None) or _instance_key(instance)
+    remove_from_rollup(*key)
+    apply_balance_delta(key[0], key[3], -key[4])
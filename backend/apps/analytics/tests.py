@@ -1,3 +1,571 @@
-from django.test import TestCase
+import io
+from datetime import datetime, timedelta
+from unittest import mock
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Avg, Count, Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.analytics.models import DailyUserCategoryRollup, InsightCacheEntry, InsightJob, UserBalance
+from apps.analytics.services.balance import get_user_balance, rebuild_user_balance
+from apps.analytics.services.insights import (
+    build_financial_data, fail_stale_insight_jobs, get_or_enqueue_insights, insights_content_key, insights_lock_key,
+    run_insight_job, start_insight_job
+)
+from apps.analytics.services.rollups import period_buckets, rebuild_user_rollups, totals_by_type
+from apps.analytics.services.summary import period_summary
+from apps.categories.models import Category
+from apps.transactions.models import Transaction
 
-# Create your tests here.
+
+def _local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class PeriodBucketsTests(TestCase):
+    """period_buckets совпадает с фильтром date__range по сырым транзакциям."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        moments = [
+            _local(2025, 3, 9, 23, 59, 59),
+            _local(2025, 3, 10, 0, 0),
+            _local(2025, 3, 10, 0, 0, 0, 1),
+            _local(2025, 3, 10, 13, 30),
+            _local(2025, 3, 11, 12, 0),
+            _local(2025, 3, 11, 23, 59, 59, 999999),
+            _local(2025, 3, 12, 0, 0),
+            _local(2025, 3, 12, 18, 45),
+            _local(2025, 3, 13, 0, 0, 1),
+        ]
+        for index, moment in enumerate(moments):
+            Transaction.objects.create(
+                user=self.user,
+                amount=Decimal(index + 1),
+                type='income' if index % 3 == 0 else 'expense',
+                date=moment,
+            )
+
+    def assertMatchesRawRange(self, start_date, end_date):
+        expected = {
+            row['type']: (row['total'], row['count'])
+            for row in Transaction.objects.filter(
+                user=self.user, date__range=[start_date, end_date]
+            ).values('type').annotate(total=Sum('amount'), count=Count('id')).order_by()
+        }
+        totals = totals_by_type(period_buckets(self.user.id, start_date, end_date))
+        for transaction_type in ('income', 'expense'):
+            with self.subTest(start=start_date, end=end_date, type=transaction_type):
+                self.assertEqual(
+                    (totals[transaction_type]['total'], totals[transaction_type]['count']),
+                    expected.get(transaction_type, (Decimal('0'), 0)),
+                )
+
+    def test_partial_first_and_last_day(self):
+        self.assertMatchesRawRange(_local(2025, 3, 10, 0, 0, 0, 1), _local(2025, 3, 12, 12, 0))
+        self.assertMatchesRawRange(_local(2025, 3, 9, 12, 0), _local(2025, 3, 13, 0, 0))
+
+    def test_bounds_at_midnight(self):
+        # Граница включается: транзакция ровно в полночь конца периода входит в результат
+        self.assertMatchesRawRange(_local(2025, 3, 10), _local(2025, 3, 12))
+        self.assertMatchesRawRange(_local(2025, 3, 10), _local(2025, 3, 12) - timedelta(microseconds=1))
+        self.assertMatchesRawRange(_local(2025, 3, 9), _local(2025, 3, 14))
+
+    def test_period_inside_one_day(self):
+        self.assertMatchesRawRange(_local(2025, 3, 10, 0, 0), _local(2025, 3, 10, 0, 0))
+        self.assertMatchesRawRange(_local(2025, 3, 10, 0, 0, 0, 1), _local(2025, 3, 10, 23, 0))
+        self.assertMatchesRawRange(_local(2025, 3, 9, 23, 0), _local(2025, 3, 10, 0, 30))
+
+    def test_naive_bounds_are_local(self):
+        totals = totals_by_type(period_buckets(self.user.id, datetime(2025, 3, 10), datetime(2025, 3, 11, 23, 59)))
+        self.assertEqual(totals['income']['count'] + totals['expense']['count'], 4)
+
+    def test_empty_period(self):
+        self.assertEqual(period_buckets(self.user.id, _local(2025, 3, 12), _local(2025, 3, 10)), [])
+
+
+class PeriodSummaryTests(TestCase):
+    """Сводка за период совпадает с агрегатами по сырым транзакциям."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.cafe = Category.objects.create(user=self.user, name='Кафе', type='expense', color='#FF0000')
+        self.food = Category.objects.create(user=self.user, name='Еда', type='expense', color='#00FF00')
+        now = timezone.now()
+        rows = [
+            ('120.00', 'expense', self.cafe, 1), ('80.00', 'expense', self.cafe, 3),
+            ('500.00', 'expense', self.food, 2), ('35.50', 'expense', None, 4),
+            ('1000.00', 'income', None, 5), ('250.00', 'income', None, 6),
+            # За пределами 30 дней
+            ('999.00', 'expense', self.food, 40),
+        ]
+        for amount, transaction_type, category, days_ago in rows:
+            Transaction.objects.create(
+                user=self.user, amount=Decimal(amount), type=transaction_type,
+                category=category, date=now - timedelta(days=days_ago, hours=1),
+            )
+        self.end_date = now
+        self.start_date = now - timedelta(days=30)
+
+    def test_matches_raw_aggregates(self):
+        with self.assertNumQueries(3):
+            summary = period_summary(self.user.id, self.start_date, self.end_date)
+
+        transactions = Transaction.objects.filter(user=self.user, date__range=[self.start_date, self.end_date])
+        for transaction_type, prefix in (('expense', 'expense'), ('income', 'income')):
+            raw = transactions.filter(type=transaction_type).aggregate(
+                total=Sum('amount'), count=Count('id'), average=Avg('amount')
+            )
+            with self.subTest(type=transaction_type):
+                self.assertEqual(summary[f'{prefix}_count'], raw['count'])
+                self.assertEqual(summary[f'average_{prefix}'], raw['average'])
+        self.assertEqual(summary['total_expenses'], Decimal('735.50'))
+        self.assertEqual(summary['total_income'], Decimal('1250.00'))
+        self.assertEqual(summary['balance'], Decimal('514.50'))
+        self.assertEqual(summary['transaction_count'], 6)
+        self.assertEqual(
+            [(item['name'], item['color'], item['total'], item['count']) for item in summary['top_categories']],
+            [('Еда', '#00FF00', Decimal('500.00'), 1), ('Кафе', '#FF0000', Decimal('200.00'), 2),
+             (None, None, Decimal('35.50'), 1)],
+        )
+
+    def test_top_limit_and_empty_period(self):
+        summary = period_summary(self.user.id, self.start_date, self.end_date, top_limit=1)
+        self.assertEqual([item['name'] for item in summary['top_categories']], ['Еда'])
+
+        empty = period_summary(self.user.id, self.end_date + timedelta(days=1), self.end_date + timedelta(days=2))
+        self.assertEqual((empty['transaction_count'], empty['average_expense'], empty['top_categories']),
+                         (0, Decimal('0'), []))
+
+    def test_views_use_summary(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = client.get('/api/v1/analytics/summary/', {'days': 30}).data
+        self.assertEqual((data['total_expenses'], data['total_income'], data['expense_count']), (735.5, 1250.0, 4))
+        self.assertEqual(data['average_transaction'], 183.875)
+        self.assertEqual(data['top_categories'][2], {'name': 'Без категории', 'color': '#CCCCCC', 'total': 35.5})
+
+        data = client.get('/api/v1/transactions/stats_by_category/', {
+            'start_date': self.start_date.isoformat(), 'end_date': self.end_date.isoformat(),
+        }).data
+        self.assertEqual([(item['category'], item['count'], item['percentage']) for item in data['by_category']],
+                         [('Еда', 1, Decimal('68.0')), ('Кафе', 2, Decimal('27.2')), ('Без категории', 1, Decimal('4.8'))])
+
+
+class RollupMaintenanceTests(TestCase):
+    """Дневные агрегаты совпадают с сырыми транзакциями после любых изменений."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.cafe = Category.objects.create(user=self.user, name='Кафе', type='expense')
+        self.food = Category.objects.create(user=self.user, name='Еда', type='expense')
+
+    def _create(self, amount, day=10, hour=12, category=None, transaction_type='expense'):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), type=transaction_type,
+            date=_local(2025, 3, day, hour), category=category,
+        )
+
+    def assertRollupsMatchTransactions(self):
+        expected = {}
+        for transaction in Transaction.objects.filter(user=self.user):
+            key = (timezone.localtime(transaction.date).date(), transaction.category_id, transaction.type)
+            expected.setdefault(key, []).append(transaction.amount)
+        actual = {}
+        for row in DailyUserCategoryRollup.objects.filter(user=self.user):
+            # После удаления категории в "Без категории" бывает несколько строк одного дня
+            item = actual.setdefault((row.day, row.category_id, row.type), [Decimal('0'), 0, [], []])
+            item[0] += row.total
+            item[1] += row.count
+            item[2].append(row.min_amount)
+            item[3].append(row.max_amount)
+        self.assertEqual(
+            {key: (total, count, min(mins), max(maxes)) for key, (total, count, mins, maxes) in actual.items()},
+            {key: (sum(amounts), len(amounts), min(amounts), max(amounts)) for key, amounts in expected.items()},
+        )
+
+    def test_amount_change_in_same_bucket(self):
+        low = self._create('10.00', category=self.cafe)
+        self._create('50.00', category=self.cafe)
+        high = self._create('90.00', category=self.cafe)
+        middle = self._create('40.00', category=self.cafe)
+        for transaction, amount in ((middle, '45.00'), (low, '5.00'), (high, '60.00'), (low, '70.00')):
+            transaction.amount = Decimal(amount)
+            transaction.save()
+            self.assertRollupsMatchTransactions()
+
+    def test_category_type_and_date_moves(self):
+        transaction = self._create('100.00', category=self.cafe)
+        self._create('30.00', category=self.cafe)
+        self._create('20.00', day=11, category=self.food)
+        changes = [
+            {'category': self.food},
+            {'category': None},
+            {'date': _local(2025, 3, 11, 23, 59)},
+            # Полночь по местному времени - уже следующий день
+            {'date': _local(2025, 3, 12, 0, 0)},
+            {'type': 'income'},
+            {'date': _local(2025, 3, 10, 9, 0), 'type': 'expense', 'category': self.cafe, 'amount': Decimal('1.00')},
+        ]
+        for change in changes:
+            with self.subTest(change=change):
+                for field, value in change.items():
+                    setattr(transaction, field, value)
+                transaction.save()
+                self.assertRollupsMatchTransactions()
+
+    def test_delete(self):
+        transactions = [self._create(amount, category=self.cafe) for amount in ('10.00', '20.00', '30.00', '40.00')]
+        for transaction in (transactions[1], transactions[0], transactions[3], transactions[2]):
+            transaction.delete()
+            self.assertRollupsMatchTransactions()
+        self.assertFalse(DailyUserCategoryRollup.objects.filter(user=self.user).exists())
+
+    def test_delete_of_stale_instance(self):
+        transaction = self._create('10.00', category=self.cafe)
+        self._create('20.00', category=self.cafe)
+        stale = Transaction.objects.get(pk=transaction.pk)
+        transaction.date = _local(2025, 3, 15, 12)
+        transaction.save()
+        stale.delete()
+        self.assertRollupsMatchTransactions()
+
+    def test_queryset_delete(self):
+        for amount in ('10.00', '20.00', '30.00'):
+            self._create(amount, category=self.cafe)
+        self._create('40.00', day=11)
+        Transaction.objects.filter(user=self.user, amount__lt=Decimal('25')).delete()
+        self.assertRollupsMatchTransactions()
+
+    def test_category_delete(self):
+        self._create('10.00', category=self.cafe)
+        self._create('20.00', category=self.food)
+        self._create('30.00')
+        self.cafe.delete()
+        self.assertRollupsMatchTransactions()
+        self.food.delete()
+        self.assertRollupsMatchTransactions()
+
+        # Дальнейшие изменения в "Без категории" учитывают все строки дня
+        Transaction.objects.filter(user=self.user, amount=Decimal('20.00')).get().delete()
+        self.assertRollupsMatchTransactions()
+        self._create('5.00')
+        self.assertRollupsMatchTransactions()
+
+    def test_rebuild_matches_incremental(self):
+        self._create('10.00', category=self.cafe)
+        self._create('20.00', day=11, transaction_type='income')
+        rows = DailyUserCategoryRollup.objects.filter(user=self.user).values_list(
+            'day', 'category_id', 'type', 'total', 'count', 'min_amount', 'max_amount'
+        )
+        incremental = sorted(rows)
+        self.assertEqual(rebuild_user_rollups(self.user.id), 2)
+        self.assertEqual(sorted(rows.all()), incremental)
+
+
+class UserBalanceTests(TestCase):
+    """Баланс пользователя поддерживается сдвигами с момента создания пользователя."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+
+    def _create(self, amount, transaction_type='expense'):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), type=transaction_type, date=timezone.now()
+        )
+
+    def test_row_exists_from_user_creation(self):
+        balance = UserBalance.objects.get(user=self.user)
+        self.assertEqual((balance.total_income, balance.total_expense), (0, 0))
+
+    def test_deltas_before_first_read_are_counted(self):
+        salary = self._create('1000.00', 'income')
+        coffee = self._create('150.00')
+        coffee.amount = Decimal('200.00')
+        coffee.save()
+        salary.type = 'expense'
+        salary.save()
+        self._create('50.00').delete()
+
+        balance = get_user_balance(self.user.id)
+        self.assertEqual(balance.total_income, Decimal('0'))
+        self.assertEqual(balance.total_expense, Decimal('1200.00'))
+
+    def test_rebuild_matches_deltas(self):
+        self._create('1000.00', 'income')
+        self._create('300.00')
+        before = get_user_balance(self.user.id)
+        rebuilt = rebuild_user_balance(self.user.id)
+        self.assertEqual((rebuilt.total_income, rebuilt.total_expense), (before.total_income, before.total_expense))
+        self.assertEqual(rebuilt.balance, Decimal('700.00'))
+
+    def test_missing_row_is_rebuilt(self):
+        self._create('300.00')
+        UserBalance.objects.filter(user=self.user).delete()
+        self.assertEqual(get_user_balance(self.user.id).total_expense, Decimal('300.00'))
+        # Следующие сдвиги идут в восстановленную строку
+        self._create('100.00')
+        self.assertEqual(get_user_balance(self.user.id).total_expense, Decimal('400.00'))
+
+
+INSIGHTS = [{'category': 'Кафе', 'insight': 'Готовьте кофе дома', 'type': 'warning'}]
+
+
+@override_settings(AI_INSIGHTS_ASYNC=False)
+class InsightJobTests(TestCase):
+    """AI-рекомендации в фоновой задаче: 202, опрос статуса и восстановление после перезапуска."""
+
+    url = '/api/v1/analytics/ai-insights/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Transaction.objects.create(
+            user=self.user, amount=Decimal('100.00'), type='expense', date=timezone.now() - timedelta(hours=1)
+        )
+        patcher = mock.patch(
+            'apps.analytics.services.insights.openrouter_service.analyze_financial_data', return_value=INSIGHTS
+        )
+        self.analyze = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _job_url(self, job_id):
+        return f'/api/v1/analytics/ai-insights/jobs/{job_id}/'
+
+    def test_request_returns_job_then_result(self):
+        response = self.client.get(self.url, {'days': 30})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['job_id']
+        self.assertEqual(response['Location'], self._job_url(job_id))
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get(self._job_url(job_id)).data['status'], 'pending')
+
+        self.assertEqual(run_insight_job(job_id).status, 'done')
+        # Задачу уже забрали - повторный запуск ничего не делает
+        self.assertIsNone(run_insight_job(job_id))
+        self.analyze.assert_called_once()
+
+        data = self.client.get(self._job_url(job_id)).data
+        self.assertEqual((data['status'], data['result']['insights']), ('done', INSIGHTS))
+        response = self.client.get(self.url, {'days': 30})
+        self.assertEqual((response.status_code, response.data['insights']), (200, INSIGHTS))
+
+    def test_failed_generation(self):
+        self.analyze.side_effect = RuntimeError('boom')
+        job_id = self.client.get(self.url).data['job_id']
+        job = run_insight_job(job_id)
+        self.assertEqual((job.status, job.error), ('failed', 'RuntimeError: boom'))
+        self.assertEqual(self.client.get(self._job_url(job_id)).data['status'], 'failed')
+
+    def test_no_transactions_skip_llm(self):
+        Transaction.objects.filter(user=self.user).delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['insights'][0]['type'], 'info')
+        self.assertFalse(InsightJob.objects.exists())
+
+    def test_other_users_job_is_hidden(self):
+        job_id = self.client.get(self.url).data['job_id']
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(
+            username='other', email='other@example.com', password='password'
+        ))
+        self.assertEqual(other.get(self._job_url(job_id)).status_code, 404)
+
+    def test_orphaned_running_job_fails_and_is_replaced(self):
+        job_id = self.client.get(self.url).data['job_id']
+        InsightJob.objects.filter(pk=job_id).update(status='running', started_at=timezone.now() - timedelta(hours=1))
+
+        data = self.client.get(self._job_url(job_id)).data
+        self.assertEqual((data['status'], InsightJob.objects.get(pk=job_id).error), ('failed', 'Обработка прервана'))
+        # Следующий запрос создаёт новую задачу
+        self.assertNotEqual(self.client.get(self.url).data['job_id'], job_id)
+
+    def test_fresh_running_job_is_kept(self):
+        job_id = self.client.get(self.url).data['job_id']
+        InsightJob.objects.filter(pk=job_id).update(status='running', started_at=timezone.now())
+        self.assertEqual(fail_stale_insight_jobs(), 0)
+        self.assertEqual(self.client.get(self._job_url(job_id)).data['status'], 'running')
+
+    def test_worker_command(self):
+        job_id = self.client.get(self.url).data['job_id']
+        InsightJob.objects.create(
+            user=self.user, days=7, status='running', start_date=timezone.now(), end_date=timezone.now(),
+            started_at=timezone.now() - timedelta(hours=1),
+        )
+        call_command('run_insight_jobs', stdout=io.StringIO())
+        self.assertEqual(InsightJob.objects.get(pk=job_id).status, 'done')
+        self.assertEqual(InsightJob.objects.get(days=7).status, 'failed')
+
+
+@override_settings(AI_INSIGHTS_ASYNC=False)
+class InsightSingleFlightTests(TestCase):
+    """Одна генерация на пользователя и период; пока она идёт, отдаются устаревшие рекомендации."""
+
+    url = '/api/v1/analytics/ai-insights/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='user', email='user@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self._transaction('100.00')
+        patcher = mock.patch(
+            'apps.analytics.services.insights.openrouter_service.analyze_financial_data', return_value=INSIGHTS
+        )
+        self.analyze = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _transaction(self, amount):
+        Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), type='expense', date=timezone.now() - timedelta(hours=1)
+        )
+
+    def _generate(self):
+        job_id = self.client.get(self.url).data['job_id']
+        run_insight_job(job_id)
+        return job_id
+
+    def test_concurrent_misses_share_one_job(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        self.assertEqual(first.data['job_id'], second.data['job_id'])
+        # Блокировка в кэше другого процесса не видна - задача находится в БД
+        cache.clear()
+        self.assertEqual(self.client.get(self.url).data['job_id'], first.data['job_id'])
+        self.assertEqual(InsightJob.objects.count(), 1)
+        # Другой период - своя генерация
+        self.assertNotEqual(self.client.get(self.url, {'days': 7}).data['job_id'], first.data['job_id'])
+
+    def test_lost_race_returns_winner_job(self):
+        winner = InsightJob.objects.create(
+            user=self.user, days=30, start_date=timezone.now(), end_date=timezone.now()
+        )
+        with mock.patch('apps.analytics.services.insights._running_job', side_effect=[None, winner]), \
+                mock.patch('apps.analytics.services.insights.cache.add', return_value=False):
+            job = start_insight_job(self.user, 30, timezone.now(), timezone.now(), {})
+        self.assertEqual(job, winner)
+        self.assertEqual(list(InsightJob.objects.values_list('pk', flat=True)), [winner.pk])
+
+    def test_lock_released_after_job(self):
+        self._generate()
+        self.assertIsNone(cache.get(insights_lock_key(self.user.id, 30)))
+
+    def test_stale_result_while_data_changed(self):
+        self._generate()
+        self._transaction('50.00')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Insights-Stale'], 'true')
+        self.assertEqual(response.data['summary']['total_expenses'], 100.0)
+        self.assertEqual(InsightJob.objects.filter(status='pending').count(), 1)
+
+        run_insight_job(InsightJob.objects.get(status='pending').pk)
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Insights-Stale'))
+        self.assertEqual(response.data['summary']['total_expenses'], 150.0)
+
+    def test_expired_entry_is_served_stale(self):
+        self._generate()
+        InsightCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+
+        result, job, stale = get_or_enqueue_insights(self.user, 30)
+        self.assertTrue(stale)
+        self.assertEqual(result['insights'], INSIGHTS)
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(self.analyze.call_count, 1)
+
+
+@override_settings(AI_INSIGHTS_ASYNC=False)
+class InsightContentCacheTests(TestCase):
+    """Рекомендации кэшируются по содержимому сводки и переживают очистку кэша Django."""
+
+    url = '/api/v1/analytics/ai-insights/'
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch(
+            'apps.analytics.services.insights.openrouter_service.analyze_financial_data', return_value=INSIGHTS
+        )
+        self.analyze = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _client(self, name):
+        user = get_user_model().objects.create_user(username=name, email=f'{name}@example.com', password='password')
+        Transaction.objects.create(
+            user=user, amount=Decimal('100.00'), type='expense', date=timezone.now() - timedelta(hours=1)
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def _generate(self, client):
+        run_insight_job(client.get(self.url).data['job_id'])
+
+    def test_same_data_reuses_result(self):
+        self._generate(self._client('first'))
+        self.assertEqual(InsightCacheEntry.objects.count(), 1)
+
+        # Другой пользователь с такими же агрегатами получает готовый ответ без LLM
+        response = self._client('second').get(self.url)
+        self.assertEqual((response.status_code, response.data['insights']), (200, INSIGHTS))
+        self.assertEqual(self.analyze.call_count, 1)
+        self.assertEqual(InsightJob.objects.count(), 1)
+
+    def test_entry_survives_cache_clear(self):
+        client = self._client('user')
+        self._generate(client)
+        cache.clear()
+        response = client.get(self.url)
+        self.assertEqual((response.status_code, response.data['insights']), (200, INSIGHTS))
+        self.assertEqual(self.analyze.call_count, 1)
+
+    def test_key_depends_on_data_model_and_prompt(self):
+        summary = {
+            'total_expenses': Decimal('100'), 'total_income': Decimal('0'), 'balance': Decimal('-100'),
+            'expense_count': 1, 'income_count': 0, 'top_categories': [],
+        }
+        data = build_financial_data(summary, 30)
+        key = insights_content_key(data)
+        self.assertEqual(insights_content_key(dict(reversed(list(data.items())))), key)
+        self.assertNotEqual(insights_content_key(build_financial_data(summary, 7)), key)
+        with mock.patch('apps.analytics.services.insights.openrouter_service.model', 'other/model'):
+            self.assertNotEqual(insights_content_key(data), key)
+        with mock.patch('apps.analytics.services.insights.PROMPT_VERSION', 999):
+            self.assertNotEqual(insights_content_key(data), key)
+
+    def test_error_result_is_not_persisted(self):
+        self.analyze.return_value = [{'category': 'Ошибка подключения', 'insight': 'Нет связи', 'type': 'warning'}]
+        client = self._client('user')
+        self._generate(client)
+        self.assertFalse(InsightCacheEntry.objects.exists())
+        # Ошибка недолго кэшируется в памяти, чтобы не спамить API
+        self.assertEqual(client.get(self.url).status_code, 200)
+        self.assertEqual(self.analyze.call_count, 1)
+
+    def test_clear_command_removes_entries(self):
+        client = self._client('user')
+        self._generate(client)
+        call_command('clear_ai_cache', stdout=io.StringIO())
+        self.assertFalse(InsightCacheEntry.objects.exists())
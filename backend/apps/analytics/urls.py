@@ -1,9 +1,10 @@
 from django.urls import path
-from apps.analytics.views import SummaryView, DailyTrendView, MonthlyTrendView, AIInsightsView
+from apps.analytics.views import SummaryView, DailyTrendView, MonthlyTrendView, AIInsightsView, AIInsightsJobView
 
 urlpatterns = [
     path('summary/', SummaryView.as_view(), name='analytics-summary'),
     path('daily/', DailyTrendView.as_view(), name='analytics-daily'),
     path('monthly/', MonthlyTrendView.as_view(), name='analytics-monthly'),
     path('ai-insights/', AIInsightsView.as_view(), name='analytics-ai-insights'),
+    path('ai-insights/jobs/<int:job_id>/', AIInsightsJobView.as_view(), name='analytics-ai-insights-job'),
 ]
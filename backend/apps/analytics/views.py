@@ -1,13 +1,18 @@
-from django.db.models import Sum, Count, Avg, Q
-from django.db.models.functions import TruncDay, TruncMonth
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
-from apps.transactions.models import Transaction
-from apps.core.services.openrouter_service import openrouter_service
+from apps.analytics.models import InsightJob
+from apps.analytics.services.insights import ACTIVE_STATUSES, fail_stale_insight_jobs, get_or_enqueue_insights
+from apps.analytics.services.rollups import period_buckets, totals_by_period
+from apps.analytics.services.summary import period_summary
+from apps.core.services.etag import conditional_response
+from apps.core.services.response_cache import cached_response
 import os
 
 
@@ -18,34 +23,15 @@ class SummaryView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
+    @conditional_response('analytics.summary', time_window=True)
+    @cached_response('analytics.summary')
     def get(self, request):
         days = int(request.query_params.get('days', 30))
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
 
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__range=[start_date, end_date]
-        )
-
-        total_expenses = transactions.filter(type='expense').aggregate(Sum('amount'))['amount__sum'] or 0
-        total_income = transactions.filter(type='income').aggregate(Sum('amount'))['amount__sum'] or 0
-
-        # Топ категорий
-        top_categories = transactions.filter(type='expense').values(
-            'category__name', 'category__color'
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('-total')[:5]
-
-        # Средняя транзакция
-        avg_transaction = transactions.filter(type='expense').aggregate(
-            Avg('amount')
-        )['amount__avg'] or 0
-
-        # Количество транзакций
-        expense_count = transactions.filter(type='expense').count()
-        income_count = transactions.filter(type='income').count()
+        # Все итоги и топ категорий - одним проходом по дневным агрегатам периода
+        summary = period_summary(request.user.id, start_date, end_date)
 
         return Response({
             'period': {
@@ -53,21 +39,21 @@ class SummaryView(APIView):
                 'end_date': end_date.isoformat(),
                 'days': days
             },
-            'total_expenses': float(total_expenses),
-            'total_income': float(total_income),
-            'balance': float(total_income - total_expenses),
-            'average_transaction': float(avg_transaction),
+            'total_expenses': float(summary['total_expenses']),
+            'total_income': float(summary['total_income']),
+            'balance': float(summary['balance']),
+            'average_transaction': float(summary['average_expense']),
             'top_categories': [
                 {
-                    'name': item['category__name'] or 'Без категории',
-                    'color': item['category__color'] or '#CCCCCC',
+                    'name': item['name'] or 'Без категории',
+                    'color': item['color'] or '#CCCCCC',
                     'total': float(item['total'])
                 }
-                for item in top_categories
+                for item in summary['top_categories']
             ],
-            'transaction_count': transactions.count(),
-            'expense_count': expense_count,
-            'income_count': income_count
+            'transaction_count': summary['transaction_count'],
+            'expense_count': summary['expense_count'],
+            'income_count': summary['income_count']
         })
 
 
@@ -78,26 +64,20 @@ class DailyTrendView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
+    @conditional_response('analytics.daily', time_window=True)
+    @cached_response('analytics.daily')
     def get(self, request):
         days = int(request.query_params.get('days', 30))
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days)
 
-        daily = Transaction.objects.filter(
-            user=request.user,
-            date__range=[start_date, end_date]
-        ).annotate(
-            day=TruncDay('date')
-        ).values('day').annotate(
-            expenses=Sum('amount', filter=Q(type='expense')),
-            income=Sum('amount', filter=Q(type='income'))
-        ).order_by('day')
+        daily = totals_by_period(period_buckets(request.user.id, start_date, end_date), 'day')
 
         result = [
             {
-                'date': item['day'].strftime('%Y-%m-%d'),
-                'expenses': float(item['expenses'] or 0),
-                'income': float(item['income'] or 0)
+                'date': item['key'].strftime('%Y-%m-%d'),
+                'expenses': float(item['expenses']),
+                'income': float(item['income'])
             }
             for item in daily
         ]
@@ -112,28 +92,21 @@ class MonthlyTrendView(APIView):
     """
     permission_classes = [IsAuthenticated]
 
+    @conditional_response('analytics.monthly', time_window=True)
+    @cached_response('analytics.monthly')
     def get(self, request):
         months = int(request.query_params.get('months', 12))
-        end_date = datetime.now()
+        end_date = timezone.now()
         start_date = end_date - timedelta(days=30 * months)
 
-        monthly = Transaction.objects.filter(
-            user=request.user,
-            date__range=[start_date, end_date]
-        ).annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            expenses=Sum('amount', filter=Q(type='expense')),
-            income=Sum('amount', filter=Q(type='income')),
-            count=Count('id')
-        ).order_by('month')
+        monthly = totals_by_period(period_buckets(request.user.id, start_date, end_date), 'month')
 
         result = [
             {
-                'month': item['month'].strftime('%Y-%m'),
-                'expenses': float(item['expenses'] or 0),
-                'income': float(item['income'] or 0),
-                'balance': float((item['income'] or 0) - (item['expenses'] or 0)),
+                'month': '%04d-%02d' % item['key'],
+                'expenses': float(item['expenses']),
+                'income': float(item['income']),
+                'balance': float(item['income'] - item['expenses']),
                 'transaction_count': item['count']
             }
             for item in monthly
@@ -146,96 +119,59 @@ class AIInsightsView(APIView):
     """
     AI-рекомендации от внешнего API.
     GET /api/v1/analytics/ai-insights/?days=30
+
+    Готовые рекомендации отдаются сразу (200). Иначе генерация ставится
+    в фоновую очередь и возвращается 202 с id задачи: результат - через
+    GET /api/v1/analytics/ai-insights/jobs/{job_id}/ или повторный запрос.
+    Устаревшие рекомендации отдаются с заголовком X-Insights-Stale, пока
+    в фоне готовятся новые.
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        from django.core.cache import cache
-        from django.utils import timezone
-
         days = int(request.query_params.get('days', 30))
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
 
-        # Проверяем кэш
-        cache_key = f'ai_insights_{request.user.id}_{days}'
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            return Response(cached_result)
-
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__range=[start_date, end_date]
-        )
-
-        # Собираем данные для отправки в AI API
-        total_expenses = transactions.filter(type='expense').aggregate(Sum('amount'))['amount__sum'] or 0
-        total_income = transactions.filter(type='income').aggregate(Sum('amount'))['amount__sum'] or 0
-        balance = total_income - total_expenses
-
-        top_expense_categories = transactions.filter(type='expense').values(
-            'category__name'
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('-total')[:5]
-
-        expense_count = transactions.filter(type='expense').count()
-        income_count = transactions.filter(type='income').count()
-
-        financial_data = {
-            'period_days': days,
-            'total_expenses': float(total_expenses),
-            'total_income': float(total_income),
-            'balance': float(balance),
-            'expense_count': expense_count,
-            'income_count': income_count,
-            'top_categories': [
-                {'name': cat['category__name'] or 'Без категории', 'total': float(cat['total'])}
-                for cat in top_expense_categories
-            ]
-        }
-
-        # Если нет транзакций
-        if transactions.count() == 0:
-            result = {
-                'insights': [
-                    {
-                        'category': 'Информация',
-                        'insight': 'Добавьте транзакции для получения рекомендаций',
-                        'type': 'info'
-                    }
-                ],
-                'period': {
-                    'start_date': start_date.isoformat(),
-                    'end_date': end_date.isoformat(),
-                    'days': days
-                },
-                'summary': financial_data
-            }
-            cache.set(cache_key, result, 3600)
-            return Response(result)
+        result, job, stale = get_or_enqueue_insights(request.user, days)
+        if result is not None:
+            response = Response(result)
+            if stale:
+                response['X-Insights-Stale'] = 'true'
+            return response
 
-        # Получаем рекомендации через OpenRouter AI
-        print(f'[AIInsights] Calling OpenRouter service with data: {financial_data}')
-        insights = openrouter_service.analyze_financial_data(financial_data)
-        print(f'[AIInsights] Received {len(insights)} insights from OpenRouter')
+        response = Response(insight_job_data(job, request), status=status.HTTP_202_ACCEPTED)
+        response['Location'] = reverse('analytics-ai-insights-job', args=[job.pk])
+        response['Retry-After'] = str(settings.AI_INSIGHTS_POLL_INTERVAL)
+        return response
 
-        result = {
-            'insights': insights,
-            'period': {
-                'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat(),
-                'days': days
-            },
-            'summary': financial_data
-        }
-
-        # Кэшируем только успешные ответы (если есть рекомендации)
-        if insights and insights[0].get('category') != 'Ошибка подключения':
-            cache.set(cache_key, result, 3600)  # 1 час
-        else:
-            # При ошибке кэшируем на 5 минут чтобы не спамить API
-            cache.set(cache_key, result, 300)
-            print('[AIInsights] Error response cached for 5 minutes')
-
-        return Response(result)
+
+class AIInsightsJobView(APIView):
+    """
+    Статус задачи AI-рекомендаций.
+    GET /api/v1/analytics/ai-insights/jobs/{job_id}/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(InsightJob, pk=job_id, user=request.user)
+        # Воркер с задачей перезапущен - иначе клиент опрашивал бы её вечно
+        if job.status == 'running' and fail_stale_insight_jobs(InsightJob.objects.filter(pk=job.pk)):
+            job.refresh_from_db()
+        response = Response(insight_job_data(job, request))
+        if job.status in ACTIVE_STATUSES:
+            response['Retry-After'] = str(settings.AI_INSIGHTS_POLL_INTERVAL)
+        return response
+
+
+def insight_job_data(job, request):
+    """Представление задачи: статус, ссылка для опроса и результат, когда готов."""
+    data = {
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(reverse('analytics-ai-insights-job', args=[job.pk])),
+        'created_at': job.created_at.isoformat(),
+    }
+    if job.status == 'done':
+        data['result'] = job.result
+    elif job.status == 'failed':
+        data['error'] = 'Не удалось получить рекомендации, попробуйте позже'
+    return data
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.categories.models import Category
+from apps.categories.models import Category, MerchantCategoryRule
 
 
 @admin.register(Category)
@@ -11,3 +11,13 @@ class CategoryAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user')
+
+
+@admin.register(MerchantCategoryRule)
+class MerchantCategoryRuleAdmin(admin.ModelAdmin):
+    list_display = ['user', 'merchant_hash', 'category', 'hits', 'updated_at']
+    search_fields = ['user__email', 'category__name']
+    readonly_fields = ['updated_at']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'category')
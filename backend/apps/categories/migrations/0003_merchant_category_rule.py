@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("categories", "0002_create_system_categories"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MerchantCategoryRule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("merchant_hash", models.BigIntegerField(verbose_name="Хэш продавца")),
+                (
+                    "hits",
+                    models.PositiveIntegerField(
+                        default=1, verbose_name="Количество правок"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="merchant_rules",
+                        to="categories.category",
+                        verbose_name="Категория",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="merchant_rules",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Правило категоризации",
+                "verbose_name_plural": "Правила категоризации",
+                "db_table": "merchant_category_rules",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "merchant_hash"),
+                        name="unique_user_merchant_rule",
+                    )
+                ],
+            },
+        ),
+    ]
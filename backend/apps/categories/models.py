@@ -52,3 +52,40 @@ class Category(models.Model):
 
     def __str__(self):
         return f'{self.name} ({self.get_type_display()})'
+
+
+class MerchantCategoryRule(models.Model):
+    """
+    Выученное правило автокатегоризации пользователя.
+    Запоминается, когда пользователь вручную меняет категорию транзакции:
+    хэш нормализованного продавца (описания) -> категория.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='merchant_rules',
+        verbose_name='Пользователь'
+    )
+    merchant_hash = models.BigIntegerField(verbose_name='Хэш продавца')
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='merchant_rules',
+        verbose_name='Категория'
+    )
+    hits = models.PositiveIntegerField(default=1, verbose_name='Количество правок')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'merchant_category_rules'
+        verbose_name = 'Правило категоризации'
+        verbose_name_plural = 'Правила категоризации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'merchant_hash'],
+                name='unique_user_merchant_rule'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.merchant_hash} -> {self.category_id}'
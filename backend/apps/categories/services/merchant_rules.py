@@ -0,0 +1,135 @@
+"""
+Выученные правила категоризации пользователя.
+Когда пользователь вручную меняет категорию транзакции, запоминаем пару
+"хэш нормализованного продавца -> категория". При автокатегоризации эти правила
+проверяются раньше глобального словаря ключевых слов.
+Правила пользователя кэшируются целиком одной записью в кэше Django.
+В ключ входит собственная версия правил пользователя (тоже в кэше): правка правила
+или удаление категории увеличивают её, а запись, которую параллельный запрос
+успел положить по старой версии, больше не читается. Запись транзакций версию
+правил не трогает, поиск по правилам не обращается к БД. Чтобы сброс видели все
+воркеры, нужен общий кэш (REDIS_URL, см. проверку core.W001).
+"""
+
+import hashlib
+import re
+import time
+from typing import Dict, Optional, Tuple
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from apps.categories.models import Category, MerchantCategoryRule
+
+UserRules = Tuple[Dict[int, int], Dict[int, Category]]
+
+CACHE_KEY = 'merchant_rules_{user_id}_{version}'
+VERSION_KEY = 'merchant_rules_version_{user_id}'
+CACHE_TTL = 60 * 60
+
+# Цифры, знаки и служебные символы: номера карт, суммы, даты, номера чеков
+_NOISE_RE = re.compile(r'[^a-zа-я ]+')
+# Служебные слова банковских SMS и выписок, не относящиеся к продавцу
+STOP_WORDS = frozenset([
+    'покупка', 'оплата', 'списание', 'перевод', 'зачисление', 'карта', 'карты', 'счет', 'счета',
+    'руб', 'р', 'rub', 'rur', 'pokupka', 'oplata', 'card', 'purchase', 'payment',
+])
+
+
+def normalize_merchant(description: Optional[str]) -> str:
+    """
+    Нормализует описание до продавца: нижний регистр, только буквы,
+    без служебных слов банка.
+    """
+    if not description:
+        return ''
+    words = _NOISE_RE.sub(' ', description.lower().replace('ё', 'е')).split()
+    return ' '.join(word for word in words if word not in STOP_WORDS)
+
+
+def merchant_hash(description: Optional[str], transaction_type: str) -> Optional[int]:
+    """
+    64-битный хэш продавца (влезает в BigIntegerField).
+    Тип входит в хэш, чтобы доход и расход у одного продавца не смешивались.
+    """
+    merchant = normalize_merchant(description)
+    if not merchant:
+        return None
+    digest = hashlib.blake2b(f'{transaction_type}|{merchant}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _rules_version(user_id: int) -> int:
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # Начальная версия из времени: после вытеснения ключа версия не вернётся
+        # к значению, под которым в кэше ещё могут лежать старые правила
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def get_user_rules(user_id: int) -> UserRules:
+    """
+    Правила пользователя: ({хэш продавца: id категории}, {id категории: Category}).
+    Загружаются одним запросом и кэшируются до следующего изменения правил.
+    Для пачки транзакций загружайте правила один раз и передавайте в match_rules.
+    """
+    key = CACHE_KEY.format(user_id=user_id, version=_rules_version(user_id))
+    rules = cache.get(key)
+    if rules is None:
+        rule_map = {}
+        categories = {}
+        for rule in MerchantCategoryRule.objects.filter(user_id=user_id).select_related('category'):
+            rule_map[rule.merchant_hash] = rule.category_id
+            categories[rule.category_id] = rule.category
+        rules = (rule_map, categories)
+        cache.set(key, rules, CACHE_TTL)
+    return rules
+
+
+def invalidate_user_rules(user_id: int):
+    """Делает кэш правил пользователя неактуальным (новая версия правил)."""
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Версии ещё нет или её вытеснили
+        cache.set(key, time.time_ns(), None)
+
+
+def match_rules(rules: UserRules, description: Optional[str], transaction_type: str) -> Optional[Category]:
+    """Категория из уже загруженных правил (get_user_rules) или None."""
+    key = merchant_hash(description, transaction_type)
+    if key is None:
+        return None
+    rule_map, categories = rules
+    category_id = rule_map.get(key)
+    return categories.get(category_id) if category_id is not None else None
+
+
+def match_user_category(user_id: Optional[int], description: Optional[str],
+                        transaction_type: str) -> Optional[Category]:
+    """Категория из правил пользователя или None."""
+    if not user_id:
+        return None
+    return match_rules(get_user_rules(user_id), description, transaction_type)
+
+
+def learn_category(user_id: int, description: Optional[str], transaction_type: str, category: Category):
+    """
+    Запоминает выбор пользователя: продавец из описания -> категория.
+    Повторная правка того же продавца перезаписывает правило.
+    """
+    key = merchant_hash(description, transaction_type)
+    if key is None:
+        return
+
+    updated = MerchantCategoryRule.objects.filter(user_id=user_id, merchant_hash=key).update(
+        category=category, hits=F('hits') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        MerchantCategoryRule.objects.get_or_create(
+            user_id=user_id, merchant_hash=key, defaults={'category': category}
+        )
+    invalidate_user_rules(user_id)
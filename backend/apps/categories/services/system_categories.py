@@ -0,0 +1,50 @@
+"""
+Кэш системных категорий в памяти процесса.
+Ключ - (название, тип). Все системные категории загружаются одним запросом
+при первом обращении и сбрасываются сигналами сохранения/удаления Category,
+поэтому автокатегоризация в установившемся режиме не делает запросов к БД.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from apps.categories.models import Category
+
+
+class SystemCategoryCache:
+    """Потокобезопасный кэш системных категорий текущего процесса."""
+
+    def __init__(self):
+        self._categories = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _ttl(self) -> int:
+        # Сигналы сбрасывают кэш только в том процессе, где изменилась категория,
+        # поэтому остальные воркеры перечитывают его не реже раза в TTL.
+        return getattr(settings, 'SYSTEM_CATEGORY_CACHE_TTL', 300)
+
+    def _load(self) -> Dict[Tuple[str, str], Category]:
+        categories = self._categories
+        if categories is not None and time.monotonic() - self._loaded_at < self._ttl():
+            return categories
+
+        with self._lock:
+            if self._categories is None or time.monotonic() - self._loaded_at >= self._ttl():
+                self._categories = {
+                    (category.name, category.type): category
+                    for category in Category.objects.filter(is_system=True)
+                }
+                self._loaded_at = time.monotonic()
+            return self._categories
+
+    def get(self, name: str, category_type: str) -> Optional[Category]:
+        return self._load().get((name, category_type))
+
+    def invalidate(self):
+        with self._lock:
+            self._categories = None
+
+
+system_category_cache = SystemCategoryCache()
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.categories.models import Category, MerchantCategoryRule
+from apps.categories.services.merchant_rules import invalidate_user_rules
+from apps.categories.services.system_categories import system_category_cache
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_system_category_cache(sender, instance, **kwargs):
+    """Сбрасываем кэш системных категорий при их изменении."""
+    if instance.is_system:
+        system_category_cache.invalidate()
+
+
+@receiver(post_save, sender=MerchantCategoryRule)
+@receiver(post_delete, sender=MerchantCategoryRule)
+def invalidate_merchant_rules(sender, instance, **kwargs):
+    """
+    Правило изменено или удалено - в том числе в админке и каскадом при удалении
+    категории (иначе в транзакцию подставилась бы несуществующая категория).
+    """
+    invalidate_user_rules(instance.user_id)
@@ -1,3 +1,143 @@
-from django.test import TestCase
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.categories.models import Category, MerchantCategoryRule
+from apps.categories.services.merchant_rules import (
+    get_user_rules, invalidate_user_rules, learn_category, match_user_category, merchant_hash
+)
+from apps.categories.services.system_categories import system_category_cache
+from apps.core.services.data_version import get_data_version
+from apps.transactions.models import Transaction
+from apps.transactions.services.category_suggester import get_system_category, suggest_categories
 
-# Create your tests here.
+
+def _create_user(name='user'):
+    return get_user_model().objects.create_user(username=name, email=f'{name}@example.com', password='password')
+
+
+class MerchantRulesTests(TestCase):
+    """Выученные правила: запоминание, поиск без запросов и сброс кэша."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = _create_user()
+        self.cafe = Category.objects.create(user=self.user, name='Кофейни', type='expense')
+        self.food = Category.objects.create(user=self.user, name='Еда', type='expense')
+
+    def test_manual_edit_is_learned(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        transaction = Transaction.objects.create(
+            user=self.user, amount=Decimal('250.00'), type='expense', date=timezone.now(),
+            description='Pokupka 250.00 RUB Card *1234 COFFEE LIKE',
+        )
+        response = client.patch(f'/api/v1/transactions/{transaction.id}/', {'category': self.cafe.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        # Другая сумма и карта - тот же продавец
+        self.assertEqual(match_user_category(self.user.id, 'Оплата 90 руб карта *9999 Coffee Like', 'expense'), self.cafe)
+        self.assertIsNone(match_user_category(self.user.id, 'Coffee Like', 'income'))
+        self.assertIsNone(match_user_category(_create_user('other').id, 'Coffee Like', 'expense'))
+
+    def test_relearn_overrides_rule(self):
+        learn_category(self.user.id, 'Coffee Like', 'expense', self.cafe)
+        self.assertEqual(match_user_category(self.user.id, 'Coffee Like', 'expense'), self.cafe)
+        learn_category(self.user.id, 'Coffee Like', 'expense', self.food)
+        self.assertEqual(match_user_category(self.user.id, 'Coffee Like', 'expense'), self.food)
+        self.assertEqual(MerchantCategoryRule.objects.get(user=self.user).hits, 2)
+
+    def test_cached_lookup_makes_no_queries(self):
+        learn_category(self.user.id, 'Coffee Like', 'expense', self.cafe)
+        get_user_rules(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(match_user_category(self.user.id, 'Coffee Like', 'expense'), self.cafe)
+
+        # Запись транзакций не сбрасывает кэш правил
+        Transaction.objects.create(user=self.user, amount=Decimal('1'), type='expense', date=timezone.now())
+        with self.assertNumQueries(0):
+            get_user_rules(self.user.id)
+
+    def test_invalidation_does_not_touch_data_version(self):
+        version = get_data_version(self.user.id)
+        learn_category(self.user.id, 'Coffee Like', 'expense', self.cafe)
+        invalidate_user_rules(self.user.id)
+        self.assertEqual(get_data_version(self.user.id), version)
+
+    def test_rule_and_category_delete_invalidate_cache(self):
+        learn_category(self.user.id, 'Coffee Like', 'expense', self.cafe)
+        learn_category(self.user.id, 'Пятёрочка', 'expense', self.food)
+        get_user_rules(self.user.id)
+
+        MerchantCategoryRule.objects.get(merchant_hash=merchant_hash('Coffee Like', 'expense')).delete()
+        self.assertIsNone(match_user_category(self.user.id, 'Coffee Like', 'expense'))
+
+        self.food.delete()
+        self.assertIsNone(match_user_category(self.user.id, 'Пятёрочка', 'expense'))
+
+    def test_rule_saved_directly_invalidates_cache(self):
+        get_user_rules(self.user.id)
+        MerchantCategoryRule.objects.create(
+            user=self.user, merchant_hash=merchant_hash('Coffee Like', 'expense'), category=self.cafe
+        )
+        self.assertEqual(match_user_category(self.user.id, 'Coffee Like', 'expense'), self.cafe)
+
+    def test_evicted_version_does_not_resurrect_stale_rules(self):
+        learn_category(self.user.id, 'Coffee Like', 'expense', self.cafe)
+        get_user_rules(self.user.id)
+        cache.delete(f'merchant_rules_version_{self.user.id}')
+        MerchantCategoryRule.objects.filter(user=self.user).update(category=self.food)
+        invalidate_user_rules(self.user.id)
+        self.assertEqual(match_user_category(self.user.id, 'Coffee Like', 'expense'), self.food)
+
+
+class SystemCategoryCacheTests(TestCase):
+    """Кэш системных категорий: поиск без запросов и сброс при изменениях."""
+
+    def setUp(self):
+        # Кэш живёт в процессе и переживает откат транзакции предыдущего теста
+        system_category_cache.invalidate()
+        # Системные категории созданы миграцией
+        self.food = Category.objects.get(name='Продукты', type='expense', is_system=True)
+
+    def test_lookup_after_warmup_makes_no_queries(self):
+        self.assertEqual(get_system_category('Продукты', 'expense'), self.food)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_system_category('Продукты', 'expense'), self.food)
+            categories = suggest_categories([('Магнит', 'expense'), ('Пятёрочка', 'expense'), ('', 'expense')])
+        self.assertEqual(categories, [self.food, self.food, None])
+
+    def test_missing_category_is_created_once(self):
+        category = get_system_category('Покупки', 'expense')
+        self.assertTrue(category.is_system)
+        self.assertEqual(category.icon, 'shopping_bag')
+        # Создание сбросило кэш: одна перезагрузка, дальше без запросов
+        with self.assertNumQueries(1):
+            self.assertEqual(get_system_category('Покупки', 'expense'), category)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_system_category('Покупки', 'expense'), category)
+        self.assertEqual(Category.objects.filter(name='Покупки', is_system=True).count(), 1)
+
+    def test_changes_invalidate_cache(self):
+        get_system_category('Продукты', 'expense')
+        self.food.name = 'Супермаркеты'
+        self.food.save()
+        self.assertEqual(get_system_category('Супермаркеты', 'expense'), self.food)
+
+        self.food.delete()
+        self.assertIsNone(system_category_cache.get('Супермаркеты', 'expense'))
+
+    def test_user_category_does_not_invalidate_cache(self):
+        get_system_category('Продукты', 'expense')
+        Category.objects.create(user=_create_user(), name='Продукты', type='expense')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_system_category('Продукты', 'expense'), self.food)
+
+    @override_settings(SYSTEM_CATEGORY_CACHE_TTL=0)
+    def test_ttl_reloads_changes_from_other_processes(self):
+        get_system_category('Продукты', 'expense')
+        # update() не шлёт сигналы - как изменение в другом воркере
+        Category.objects.filter(pk=self.food.pk).update(icon='store')
+        self.assertEqual(get_system_category('Продукты', 'expense').icon, 'store')
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Count, Max
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -10,6 +11,15 @@ from apps.categories.serializers import (
     CategoryCreateSerializer,
     CategoryUpdateSerializer,
 )
+from apps.core.services.etag import conditional_response
+
+
+def system_categories_state():
+    """Состояние системных категорий для ETag анонимных запросов (один агрегат)."""
+    state = Category.objects.filter(is_system=True).aggregate(
+        last_updated=Max('updated_at'), count=Count('id')
+    )
+    return state['last_updated'], state['count']
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -58,6 +68,10 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return CategoryUpdateSerializer
         return self.serializer_class
 
+    @conditional_response('categories.list', anonymous_state=system_categories_state)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -77,6 +91,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
     @action(detail=False, methods=['get'])
+    @conditional_response('categories.system', anonymous_state=system_categories_state)
     def system(self, request):
         """
         Получить только системные категории.
@@ -87,6 +102,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @conditional_response('categories.my')
     def my(self, request):
         """
         Получить только пользовательские категории.
@@ -5,3 +5,7 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
     verbose_name = 'Ядро'
+
+    def ready(self):
+        import apps.core.checks
+        import apps.core.signals
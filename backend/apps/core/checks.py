@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    """
+    Состояние circuit breaker OpenRouter, блокировки AI-рекомендаций и счётчики
+    хранятся в кэше Django: без общего кэша каждый воркер видит только своё.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if settings.DEBUG or not backend.endswith('LocMemCache'):
+        return []
+    return [Warning(
+        'Кэш по умолчанию локален для процесса (LocMemCache)',
+        hint='Задайте REDIS_URL: circuit breaker OpenRouter и блокировки AI-рекомендаций '
+             'должны быть общими для всех воркеров gunicorn.',
+        id='core.W001',
+    )]
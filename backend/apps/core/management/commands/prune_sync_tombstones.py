@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.core.services.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Удалить устаревшие отметки об удалении объектов (дельта-синхронизация)'
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено {deleted} отметок старше {settings.SYNC_TOMBSTONE_RETENTION_DAYS} дней'
+        ))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("accounts", "0002_alter_profile_avatar_alter_profile_bio"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserDataVersion",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="data_version",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                ("version", models.BigIntegerField(default=0, verbose_name="Версия")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Версия данных пользователя",
+                "verbose_name_plural": "Версии данных пользователей",
+                "db_table": "user_data_versions",
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_user_data_version"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entity",
+                    models.CharField(
+                        choices=[
+                            ("transaction", "Транзакция"),
+                            ("category", "Категория"),
+                        ],
+                        max_length=20,
+                        verbose_name="Тип объекта",
+                    ),
+                ),
+                ("object_id", models.BigIntegerField(verbose_name="ID объекта")),
+                (
+                    "deleted_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Удалён"),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sync_tombstones",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Удалённый объект",
+                "verbose_name_plural": "Удалённые объекты",
+                "db_table": "sync_tombstones",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "deleted_at"],
+                        name="sync_tombst_user_id_019028_idx",
+                    ),
+                    models.Index(
+                        fields=["deleted_at"], name="sync_tombst_deleted_f39b14_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
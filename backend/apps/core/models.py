@@ -1,3 +1,62 @@
 from django.db import models
+from django.conf import settings
 
-# Create your models here.
+
+class UserDataVersion(models.Model):
+    """
+    Версия данных пользователя.
+    Увеличивается при каждом изменении его транзакций и категорий;
+    входит в ключи кэша ответов, поэтому устаревшие ответы никогда не отдаются.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='data_version',
+        verbose_name='Пользователь'
+    )
+    version = models.BigIntegerField(default=0, verbose_name='Версия')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'user_data_versions'
+        verbose_name = 'Версия данных пользователя'
+        verbose_name_plural = 'Версии данных пользователей'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.version}'
+
+
+class SyncTombstone(models.Model):
+    """
+    Отметка об удалении объекта для дельта-синхронизации клиентов.
+    Для системных категорий user пустой - их удаление видят все пользователи.
+    """
+    ENTITY_TYPES = [
+        ('transaction', 'Транзакция'),
+        ('category', 'Категория'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='sync_tombstones',
+        verbose_name='Пользователь'
+    )
+    entity = models.CharField(max_length=20, choices=ENTITY_TYPES, verbose_name='Тип объекта')
+    object_id = models.BigIntegerField(verbose_name='ID объекта')
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name='Удалён')
+
+    class Meta:
+        db_table = 'sync_tombstones'
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.entity} {self.object_id} ({self.deleted_at})'
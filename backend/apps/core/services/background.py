@@ -0,0 +1,40 @@
+"""
+Фоновые задачи в пуле потоков веб-процесса.
+
+Долгие операции (импорт выписок, запросы к LLM) выполняются вне потока запроса:
+поток gunicorn сразу отвечает клиенту, а задача ставится в именованный пул
+после коммита транзакции БД, чтобы фоновый поток увидел созданные записи.
+Состояние задач хранится в БД, поэтому очередь переживает перезапуск процесса
+(незавершённые задачи подбирают management-команды).
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+from django.db import connection, transaction as db_transaction
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str, max_workers: int = 1) -> ThreadPoolExecutor:
+    """Пул потоков с заданным именем (создаётся при первом обращении)."""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix=name)
+            _executors[name] = executor
+        return executor
+
+
+def _run(func: Callable, *args):
+    try:
+        func(*args)
+    finally:
+        # Поток пула живёт дольше запроса - соединение с БД закрываем сами
+        connection.close()
+
+
+def submit_on_commit(name: str, max_workers: int, func: Callable, *args):
+    """Выполняет func(*args) в пуле name после коммита текущей транзакции БД."""
+    db_transaction.on_commit(lambda: get_executor(name, max_workers).submit(_run, func, *args))
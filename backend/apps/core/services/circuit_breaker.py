@@ -0,0 +1,120 @@
+"""
+Circuit breaker для внешних API.
+
+Доля ошибок и медленных ответов считается за скользящее окно из счётчиков
+в кэше (по корзинам в несколько секунд), поэтому при Redis все воркеры видят
+одно состояние. Если доля превышает порог - цепь размыкается: вызовы сразу
+отклоняются, внешний API не ждём. По истечении паузы один пробный запрос
+(half-open) решает, замкнуть цепь или разомкнуть снова.
+
+Нужен общий кэш (REDIS_URL): с LocMemCache у каждого воркера gunicorn своя цепь
+и своя статистика, и сервис деградирует в каждом воркере отдельно
+(проверка core.W001 предупреждает об этом).
+"""
+
+import time
+from typing import List
+from django.core.cache import cache
+
+
+class CircuitBreaker:
+    """
+    Args:
+        name: Префикс ключей в кэше
+        window: Длина скользящего окна, секунд
+        buckets: На сколько корзин делится окно
+        min_calls: Минимум вызовов в окне, чтобы судить о доле ошибок
+        failure_rate: Доля ошибок и медленных ответов, размыкающая цепь
+        slow_call: Ответ дольше стольких секунд считается неуспешным
+        open_seconds: Пауза до пробного запроса
+        probe_seconds: Сколько держится блокировка пробного запроса; не меньше
+            самого долгого вызова (по умолчанию slow_call)
+    """
+
+    def __init__(self, name: str, window: float = 60, buckets: int = 6, min_calls: int = 5,
+                 failure_rate: float = 0.5, slow_call: float = 60, open_seconds: float = 30,
+                 probe_seconds: float = None):
+        self.name = name
+        self.window = window
+        self.buckets = max(1, buckets)
+        self.bucket_seconds = max(1, int(window / self.buckets))
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.probe_seconds = slow_call if probe_seconds is None else probe_seconds
+
+    @property
+    def _open_until_key(self) -> str:
+        return f'circuit:{self.name}:open_until'
+
+    @property
+    def _probe_key(self) -> str:
+        return f'circuit:{self.name}:probe'
+
+    def _bucket_keys(self, kind: str) -> List[str]:
+        current = int(time.time() // self.bucket_seconds)
+        return [f'circuit:{self.name}:{kind}:{slot}' for slot in range(current - self.buckets + 1, current + 1)]
+
+    def _incr(self, kind: str):
+        key = self._bucket_keys(kind)[-1]
+        ttl = self.bucket_seconds * (self.buckets + 1)
+        cache.add(key, 0, ttl)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Ключ истёк между add и incr
+            cache.set(key, 1, ttl)
+
+    def _reset_window(self):
+        cache.delete_many(self._bucket_keys('calls') + self._bucket_keys('failures'))
+
+    @property
+    def state(self) -> str:
+        """closed, open или half_open."""
+        open_until = cache.get(self._open_until_key)
+        if open_until is None:
+            return 'closed'
+        return 'open' if time.time() < open_until else 'half_open'
+
+    def allow(self) -> bool:
+        """Можно ли сейчас вызывать API. В half-open пропускает один пробный вызов."""
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'open':
+            return False
+        # Пробный запрос может не завершиться - блокировка живёт не дольше probe_seconds
+        return cache.add(self._probe_key, 1, int(self.probe_seconds) + 1)
+
+    def record_success(self, latency: float):
+        """Учитывает успешный вызов; слишком медленный считается неуспешным."""
+        if latency > self.slow_call:
+            self.record_failure()
+            return
+        if self.state == 'half_open':
+            # Пробный запрос прошёл - замыкаем цепь с чистым окном
+            cache.delete_many([self._open_until_key, self._probe_key])
+            self._reset_window()
+            return
+        self._incr('calls')
+
+    def record_failure(self):
+        """Учитывает ошибку; размыкает цепь, если доля ошибок за окно выше порога."""
+        if self.state == 'half_open':
+            self._trip()
+            return
+        self._incr('calls')
+        self._incr('failures')
+
+        counts = cache.get_many(self._bucket_keys('calls') + self._bucket_keys('failures'))
+        calls = sum(value for key, value in counts.items() if ':calls:' in key)
+        failures = sum(value for key, value in counts.items() if ':failures:' in key)
+        if calls >= self.min_calls and failures / calls >= self.failure_rate:
+            self._trip()
+
+    def _trip(self):
+        # Ключ живёт дольше паузы: после неё цепь в half-open, пока пробный запрос не решит
+        cache.set(self._open_until_key, time.time() + self.open_seconds, int(self.open_seconds + self.window) + 1)
+        cache.delete(self._probe_key)
+        self._reset_window()
@@ -0,0 +1,49 @@
+"""
+Непрозрачные курсоры для keyset-пагинации и дельта-синхронизации.
+
+Курсор - base64 (urlsafe, без '=') от компактного JSON; моменты времени в нём -
+целые микросекунды от эпохи UTC. Любой повреждённый или подделанный курсор
+(в том числе с меткой времени вне диапазона datetime) даёт CursorError.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class CursorError(ValueError):
+    """Курсор повреждён или подделан."""
+
+
+def to_us(value: datetime) -> int:
+    """Микросекунды от эпохи (без потери точности float)."""
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_us(value: Any) -> datetime:
+    """Момент времени из микросекунд от эпохи."""
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise CursorError('Некорректная метка времени в курсоре')
+    try:
+        return EPOCH + timedelta(microseconds=value)
+    except OverflowError:
+        raise CursorError('Некорректная метка времени в курсоре')
+
+
+def encode_cursor(payload: Any) -> str:
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(value: Any) -> Any:
+    """Содержимое курсора; структуру проверяет вызывающий код."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        return json.loads(raw)
+    except (binascii.Error, ValueError, TypeError, RecursionError):
+        raise CursorError('Некорректный курсор')
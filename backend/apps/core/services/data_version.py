@@ -0,0 +1,58 @@
+"""
+Версия данных пользователя (UserDataVersion).
+Счётчик хранится в БД, а не в кэше: кэш по умолчанию локален для процесса,
+а версия должна быть одинаковой во всех воркерах.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from apps.core.models import UserDataVersion
+
+
+def get_data_version(user_id: int) -> int:
+    """Текущая версия данных пользователя (0 - данные ещё не менялись)."""
+    version = UserDataVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_data_version(user_id: int):
+    """Увеличивает версию данных пользователя."""
+    updated = UserDataVersion.objects.filter(user_id=user_id).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if updated:
+        return
+    try:
+        with db_transaction.atomic():
+            UserDataVersion.objects.create(user_id=user_id, version=1)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        UserDataVersion.objects.filter(user_id=user_id).update(
+            version=F('version') + 1, updated_at=timezone.now()
+        )
+
+
+def bump_all_data_versions():
+    """
+    Увеличивает версию данных всех пользователей (изменились общие системные категории).
+    Пользователям без строки версии она создаётся: иначе их версия осталась бы 0
+    и закэшированные ответы с системными категориями не сбросились бы.
+    """
+    missing = get_user_model().objects.filter(data_version__isnull=True).values_list('pk', flat=True)
+    UserDataVersion.objects.bulk_create(
+        [UserDataVersion(user_id=user_id) for user_id in missing.iterator()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    UserDataVersion.objects.update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def get_request_data_version(request) -> int:
+    """Версия данных текущего пользователя; читается один раз за HTTP-запрос."""
+    version = getattr(request, '_data_version', None)
+    if version is None:
+        version = get_data_version(request.user.id)
+        request._data_version = version
+    return version
@@ -0,0 +1,82 @@
+"""
+Условные GET-запросы (ETag / If-None-Match).
+ETag строится из версии данных пользователя и параметров запроса, без сериализации
+ответа: если данные не менялись, клиент получает 304 без тела и без запросов к данным.
+"""
+
+import hashlib
+import time
+from functools import wraps
+from typing import Any, Callable, Optional
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from apps.core.services.data_version import get_request_data_version
+from apps.core.services.response_cache import get_endpoint_ttl, normalize_params
+
+
+def make_etag(*parts: Any) -> str:
+    """Сильный ETag (в кавычках) из произвольных частей."""
+    return '"%s"' % hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def etag_matches(request, etag: str) -> bool:
+    """Совпадает ли ETag с If-None-Match (слабое сравнение, как требует RFC 9110)."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return True
+    # nginx при gzip превращает сильный ETag в слабый W/"..."
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in etags)
+
+
+def conditional_response(endpoint: str, time_window: bool = False,
+                         anonymous_state: Optional[Callable[[], Any]] = None):
+    """
+    Декоратор метода APIView/ViewSet: отдаёт 304, если данные пользователя не менялись.
+
+    Args:
+        endpoint: Имя эндпоинта (часть ETag)
+        time_window: Ответ зависит от текущего времени ("последние N дней") -
+                     ETag дополнительно меняется раз в TTL кэша эндпоинта
+        anonymous_state: Функция состояния данных для анонимного пользователя;
+                         без неё анонимные запросы обрабатываются без ETag
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_method(self, request, *args, **kwargs)
+
+            if request.user.is_authenticated:
+                state = ('user', request.user.id, get_request_data_version(request))
+            elif anonymous_state is not None:
+                state = ('anonymous', anonymous_state())
+            else:
+                return view_method(self, request, *args, **kwargs)
+
+            window = int(time.time() // max(1, get_endpoint_ttl(endpoint))) if time_window else None
+            renderer = getattr(request, 'accepted_renderer', None)
+            etag = make_etag(
+                endpoint,
+                *state,
+                normalize_params(request.query_params),
+                getattr(renderer, 'format', ''),
+                window,
+            )
+
+            if etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            response['ETag'] = etag
+            # Клиент может хранить ответ, но обязан перепроверять его через If-None-Match
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -1,18 +1,51 @@
 """
 OpenRouter AI Service for financial insights.
 Uses OpenRouter API to access various LLM models.
+
+Запросы идут через долгоживущую requests.Session (keep-alive), своя на каждый
+поток: Session не гарантирует потокобезопасность. Поток делает запросы по одному,
+поэтому в пуле сессии одно соединение; параллельность - число потоков.
+
+Circuit breaker (состояние в кэше, общее для воркеров при Redis) при деградации
+OpenRouter сразу отдаёт запасной ответ. У анализа есть общий дедлайн на основную
+и альтернативные модели; повторы при 429/5xx и паузы между ними тоже укладываются в него.
 """
 import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from apps.core.services.circuit_breaker import CircuitBreaker
 
 # Загружаем .env явно
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 load_dotenv(BASE_DIR / '.env')
 
 
+class DeadlineExceeded(Exception):
+    """Истёк общий бюджет времени на анализ."""
+
+
+# Ответы, после которых запрос повторяется
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Сбой на стороне OpenRouter: ошибка соединения, таймаут, дедлайн или ответ 429/5xx."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is None or error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, DeadlineExceeded))
+
+
+# Версия промпта: входит в ключ кэша рекомендаций, увеличивайте при правке _build_prompt
+PROMPT_VERSION = 1
+
+
 class OpenRouterService:
     """Сервис для работы с OpenRouter AI API."""
 
@@ -22,6 +55,116 @@ class OpenRouterService:
         self.model = os.getenv('AI_MODEL', 'arcee-ai/trinity-mini:free')
         self.site_url = os.getenv('SITE_URL', 'http://localhost:5173')
         self.site_name = os.getenv('SITE_NAME', 'Ks Financial App')
+        # Таймауты: установка соединения и ожидание ответа модели - отдельно
+        self.connect_timeout = float(os.getenv('OPENROUTER_CONNECT_TIMEOUT', 5))
+        self.read_timeout = float(os.getenv('OPENROUTER_READ_TIMEOUT', 120))
+        # Повторы при ошибке соединения и ответах 429/5xx с экспоненциальной паузой
+        # (или по Retry-After, но не дольше OPENROUTER_RETRY_AFTER_MAX)
+        self.max_retries = int(os.getenv('OPENROUTER_MAX_RETRIES', 2))
+        self.backoff_factor = float(os.getenv('OPENROUTER_BACKOFF_FACTOR', 1.0))
+        self.retry_after_max = float(os.getenv('OPENROUTER_RETRY_AFTER_MAX', 30))
+        # Общий бюджет времени на анализ: основная и альтернативные модели, секунд
+        self.deadline = float(os.getenv('OPENROUTER_DEADLINE', 150))
+        self.breaker = CircuitBreaker(
+            'openrouter',
+            window=float(os.getenv('OPENROUTER_BREAKER_WINDOW', 60)),
+            min_calls=int(os.getenv('OPENROUTER_BREAKER_MIN_CALLS', 5)),
+            failure_rate=float(os.getenv('OPENROUTER_BREAKER_FAILURE_RATE', 0.5)),
+            slow_call=float(os.getenv('OPENROUTER_BREAKER_SLOW_CALL', 60)),
+            open_seconds=float(os.getenv('OPENROUTER_BREAKER_OPEN_SECONDS', 30)),
+            # Пробный запрос в half-open может занять весь дедлайн анализа
+            probe_seconds=self.deadline,
+        )
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Сессия текущего потока: соединение с OpenRouter переиспользуется между запросами."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._create_session()
+        return session
+
+    def _create_session(self) -> requests.Session:
+        # Адаптер только переподключается; повторы по статусу и паузы - в _post_completion,
+        # где известен остаток дедлайна
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,  # Таймаут чтения не повторяем - модель уже могла думать 2 минуты
+            status=0,
+            other=0,
+            redirect=0,
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json',
+            'HTTP-Referer': self.site_url,
+            'X-Title': self.site_name,
+        })
+        return session
+
+    def _remaining(self) -> Optional[float]:
+        """Остаток дедлайна анализа в секундах (None - дедлайна нет)."""
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded('OpenRouter deadline exceeded')
+        return remaining
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> float:
+        """Пауза перед повтором: Retry-After (секунды или HTTP-дата) или экспоненциальная."""
+        retry_after = response.headers.get('Retry-After')
+        delay = None
+        if retry_after:
+            if retry_after.strip().isdigit():
+                delay = float(retry_after)
+            else:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+        if delay is None:
+            delay = self.backoff_factor * (2 ** attempt)
+        return max(0.0, min(delay, self.retry_after_max))
+
+    def _post_completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        POST /chat/completions через сессию потока; HTTPError, если повторы не помогли.
+        Таймауты и паузы между повторами урезаются до остатка дедлайна анализа:
+        если на паузу бюджета не хватает, сразу возвращается последняя ошибка.
+        """
+        for attempt in range(self.max_retries + 1):
+            connect_timeout, read_timeout = self.connect_timeout, self.read_timeout
+            remaining = self._remaining()
+            if remaining is not None:
+                connect_timeout, read_timeout = min(connect_timeout, remaining), min(read_timeout, remaining)
+
+            response = self.session.post(
+                f'{self.base_url}/chat/completions',
+                json=payload,
+                timeout=(connect_timeout, read_timeout),
+            )
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                break
+
+            delay = self._retry_delay(response, attempt)
+            remaining = self._remaining()
+            if remaining is not None and delay >= remaining:
+                break
+            print(f'[OpenRouter] HTTP {response.status_code}, retry in {delay:.1f}s')
+            time.sleep(delay)
+
+        response.raise_for_status()
+        return response.json()
     
     def analyze_financial_data(self, financial_data: Dict[str, Any]) -> List[Dict[str, str]]:
         """
@@ -37,7 +180,15 @@ class OpenRouterService:
             print('[OpenRouter] API key not set, using fallback insights')
             return self._get_fallback_insights(financial_data)
 
+        if not self.breaker.allow():
+            print('[OpenRouter] Circuit open, using fallback insights')
+            return self._get_fallback_insights(
+                financial_data, 'Сервис рекомендаций временно недоступен. Попробуйте позже.'
+            )
+
         prompt = self._build_prompt(financial_data)
+        started = time.monotonic()
+        self._local.deadline = started + self.deadline
 
         try:
             print(f'[OpenRouter] Sending request with model: {self.model}')
@@ -49,13 +200,20 @@ class OpenRouterService:
             # Постобработка: нормализация типов и количества
             insights = self._normalize_insights(insights, financial_data)
             print(f'[OpenRouter] Normalized to {len(insights)} insights')
-            
+
+            self.breaker.record_success(time.monotonic() - started)
             return insights[:5]  # Максимум 5 рекомендаций
 
         except requests.exceptions.HTTPError as e:
             error_msg = f'HTTP Error {e.response.status_code}: {e.response.text[:200] if e.response.text else "No details"}'
             print(f'[OpenRouter] {error_msg}')
 
+            # Ошибки на стороне OpenRouter размыкают цепь, ошибки конфигурации (401/404) - нет
+            if _is_upstream_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success(time.monotonic() - started)
+
             # Обработка rate limit (429)
             if e.response.status_code == 429:
                 retry_after = e.response.headers.get('Retry-After', '60')
@@ -69,7 +227,15 @@ class OpenRouterService:
             return self._get_fallback_insights(financial_data)
         except Exception as e:
             print(f'[OpenRouter] API error: {type(e).__name__}: {e}')
+            # Пустой или нечитаемый ответ - OpenRouter доступен, цепь размыкают только
+            # ошибки соединения, таймауты и 429/5xx
+            if _is_upstream_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success(time.monotonic() - started)
             return self._get_fallback_insights(financial_data)
+        finally:
+            self._local.deadline = None
     
     def _build_prompt(self, data: Dict[str, Any]) -> str:
         """Строит промпт для анализа финансовых данных."""
@@ -163,15 +329,6 @@ class OpenRouterService:
     
     def _make_request(self, prompt: str) -> str:
         """Делает запрос к OpenRouter API."""
-        url = f'{self.base_url}/chat/completions'
-
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json',
-            'HTTP-Referer': self.site_url,
-            'X-Title': self.site_name,
-        }
-
         payload = {
             'model': self.model,
             'messages': [
@@ -188,10 +345,7 @@ class OpenRouterService:
             'max_tokens': 1500,  # Увеличено для более полных ответов
         }
 
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
-        response.raise_for_status()
-
-        result = response.json()
+        result = self._post_completion(payload)
         print(f'[OpenRouter] Full response: {result}')
         
         # Проверяем наличие контента
@@ -214,16 +368,13 @@ class OpenRouterService:
             'mistralai/mistral-7b-instruct:free',
         ]
         
+        deadline = getattr(self._local, 'deadline', None)
+        last_error = None
         for model in alternative_models:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded('OpenRouter deadline exceeded')
             try:
                 print(f'[OpenRouter] Retrying with alternative model: {model}')
-                url = f'{self.base_url}/chat/completions'
-                headers = {
-                    'Authorization': f'Bearer {self.api_key}',
-                    'Content-Type': 'application/json',
-                    'HTTP-Referer': self.site_url,
-                    'X-Title': self.site_name,
-                }
                 payload = {
                     'model': model,
                     'messages': [
@@ -233,17 +384,19 @@ class OpenRouterService:
                     'temperature': 0.7,
                     'max_tokens': 1500,
                 }
-                response = requests.post(url, headers=headers, json=payload, timeout=120)
-                response.raise_for_status()
-                result = response.json()
+                result = self._post_completion(payload)
                 content = result.get('choices', [{}])[0].get('message', {}).get('content')
                 if content:
                     print(f'[OpenRouter] Alternative model {model} succeeded')
                     return content
             except Exception as e:
                 print(f'[OpenRouter] Alternative model {model} failed: {e}')
+                last_error = e
                 continue
-        
+
+        # Сбой OpenRouter пробрасываем как есть, чтобы его учёл circuit breaker
+        if last_error is not None and _is_upstream_failure(last_error):
+            raise last_error
         raise ValueError('All alternative models failed')
     
     def _parse_response(self, content: str, data: Dict[str, Any]) -> List[Dict[str, str]]:
@@ -0,0 +1,102 @@
+"""
+Кэш ответов API с версионированием по данным пользователя.
+Ключ: эндпоинт + пользователь + версия данных + нормализованные параметры запроса.
+Любое изменение транзакций/категорий увеличивает версию, поэтому старые ответы
+просто перестают запрашиваться и вытесняются по TTL - удаление по шаблону не нужно.
+"""
+
+import hashlib
+import threading
+from functools import wraps
+from typing import Dict
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+from apps.core.services.data_version import get_request_data_version
+
+# Параметры, не влияющие на данные ответа
+IGNORED_PARAMS = ('format',)
+
+
+class ResponseCacheStats:
+    """Счётчики попаданий/промахов кэша ответов текущего процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, endpoint: str, hit: bool):
+        with self._lock:
+            item = self._stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            item['hits' if hit else 'misses'] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            result = {}
+            for endpoint, item in self._stats.items():
+                total = item['hits'] + item['misses']
+                result[endpoint] = {
+                    **item,
+                    'hit_rate': round(item['hits'] / total, 3) if total else 0.0,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+
+response_cache_stats = ResponseCacheStats()
+
+
+def get_endpoint_ttl(endpoint: str) -> int:
+    """TTL эндпоинта из RESPONSE_CACHE_TTLS (0 - не кэшировать)."""
+    ttls = getattr(settings, 'RESPONSE_CACHE_TTLS', {})
+    return ttls.get(endpoint, getattr(settings, 'RESPONSE_CACHE_DEFAULT_TTL', 300))
+
+
+def normalize_params(query_params) -> str:
+    """Параметры запроса в каноничном виде: отсортированы, без служебных."""
+    items = sorted(
+        (key, value)
+        for key in query_params.keys() if key not in IGNORED_PARAMS
+        for value in query_params.getlist(key)
+    )
+    return '&'.join(f'{key}={value}' for key, value in items)
+
+
+def build_cache_key(endpoint: str, user_id: int, version: int, params: str) -> str:
+    params_hash = hashlib.md5(params.encode('utf-8')).hexdigest()
+    return f'response_cache:{endpoint}:{user_id}:{version}:{params_hash}'
+
+
+def cached_response(endpoint: str):
+    """
+    Декоратор метода APIView/ViewSet: кэширует успешные ответы
+    в разрезе пользователя, версии его данных и параметров запроса.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            ttl = get_endpoint_ttl(endpoint)
+            if ttl <= 0:
+                return view_method(self, request, *args, **kwargs)
+
+            key = build_cache_key(
+                endpoint,
+                request.user.id,
+                get_request_data_version(request),
+                normalize_params(request.query_params),
+            )
+            data = cache.get(key)
+            if data is not None:
+                response_cache_stats.record(endpoint, hit=True)
+                return Response(data)
+
+            response_cache_stats.record(endpoint, hit=False)
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, ttl)
+            return response
+        return wrapper
+    return decorator
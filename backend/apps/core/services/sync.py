@@ -0,0 +1,181 @@
+"""
+Дельта-синхронизация клиентов (Android-приложение).
+
+Клиент передаёт курсор из предыдущего ответа и получает только транзакции и категории,
+изменённые после него, плюс id удалённых объектов (SyncTombstone).
+
+Курсор - непрозрачная строка (base64 JSON):
+    s - нижняя граница updated_at (мкс), u - верхняя граница текущего раунда (мкс),
+    k/d - позиция keyset-пагинации транзакций/удалений внутри раунда,
+    r - раунд является полной перезагрузкой.
+Граница следующего раунда сдвигается назад на SYNC_OVERLAP_SECONDS: транзакции БД,
+начатые раньше, но закоммиченные позже, попадут в следующий ответ. Повторно присланные
+объекты клиент просто перезаписывает по id.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from apps.categories.models import Category
+from apps.core.models import SyncTombstone
+from apps.core.services.cursor import CursorError, decode_cursor as decode_raw_cursor, encode_cursor, from_us, to_us
+from apps.transactions.models import Transaction
+
+# Поля в ответе: объекты кодируются массивами в этом порядке
+TRANSACTION_FIELDS = ['id', 'category', 'amount', 'type', 'date', 'description', 'source', 'is_ai_parsed']
+CATEGORY_FIELDS = ['id', 'name', 'type', 'icon', 'color', 'is_system']
+
+
+class SyncCursorError(CursorError):
+    """Курсор синхронизации повреждён или подделан."""
+
+
+def _to_ms(value: datetime) -> int:
+    return to_us(value) // 1000
+
+
+def decode_cursor(value: str) -> Dict[str, Any]:
+    try:
+        state = decode_raw_cursor(value)
+        if not isinstance(state, dict):
+            raise CursorError('Некорректный курсор')
+        # Все метки времени должны укладываться в диапазон datetime
+        timestamps = [state.get('s')]
+        if state.get('u') is not None:
+            timestamps.append(state['u'])
+        for key in ('k', 'd'):
+            position = state.get(key)
+            if position is None:
+                continue
+            if not (isinstance(position, list) and len(position) == 2 and isinstance(position[1], int)):
+                raise CursorError('Некорректный курсор')
+            timestamps.append(position[0])
+        for value_us in timestamps:
+            from_us(value_us)
+    except CursorError:
+        raise SyncCursorError('Некорректный курсор синхронизации')
+    return state
+
+
+def _after(queryset, field: str, position: Optional[list]):
+    """Keyset-условие (field, id) > position."""
+    if not position:
+        return queryset
+    value = from_us(position[0])
+    return queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': position[1]}))
+
+
+def get_changes(user, cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Изменения данных пользователя после курсора.
+
+    Args:
+        user: Пользователь
+        cursor: Курсор из предыдущего ответа (None - полная загрузка)
+        limit: Максимум транзакций и удалений в одной странице
+
+    Returns:
+        {
+            'cursor': курсор для следующего запроса,
+            'has_more': есть ли ещё страницы этого раунда,
+            'reset': клиент должен очистить локальные данные перед применением,
+            'transactions': {'fields': [...], 'rows': [[...], ...]},
+            'categories': {'fields': [...], 'rows': [[...], ...]},
+            'deleted': {'transactions': [id, ...], 'categories': [id, ...]},
+        }
+    """
+    limit = max(1, min(limit or settings.SYNC_PAGE_SIZE, settings.SYNC_MAX_PAGE_SIZE))
+    now = timezone.now()
+    state = decode_cursor(cursor) if cursor else {'s': 0}
+
+    if state.get('u') is None:
+        # Новый раунд: фиксируем верхнюю границу, чтобы страницы не "плыли"
+        since = state['s']
+        horizon = to_us(now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS))
+        reset = since == 0 or since < horizon
+        state = {'s': 0 if reset else since, 'u': to_us(now), 'k': None, 'd': None, 'r': reset}
+
+    lower = from_us(state['s'])
+    upper = from_us(state['u'])
+    first_page = state.get('k') is None and state.get('d') is None
+
+    transactions = _after(
+        Transaction.objects.filter(user=user, updated_at__gte=lower, updated_at__lt=upper),
+        'updated_at',
+        state.get('k'),
+    ).order_by('updated_at', 'id').values_list(
+        'id', 'category_id', 'amount', 'type', 'date', 'description', 'source', 'is_ai_parsed', 'updated_at'
+    )
+    transaction_rows = list(transactions[:limit + 1])
+    transactions_more = len(transaction_rows) > limit
+    transaction_rows = transaction_rows[:limit]
+
+    category_rows = []
+    if first_page:
+        category_rows = list(
+            Category.objects.filter(
+                Q(is_system=True) | Q(user=user), updated_at__gte=lower, updated_at__lt=upper
+            ).order_by('id').values_list(*CATEGORY_FIELDS)
+        )
+
+    tombstone_rows = []
+    tombstones_more = False
+    # При полной перезагрузке клиент очищает данные сам - удаления не нужны
+    if not state.get('r'):
+        tombstones = _after(
+            SyncTombstone.objects.filter(
+                Q(user=user) | Q(user__isnull=True, entity='category'),
+                deleted_at__gte=lower,
+                deleted_at__lt=upper,
+            ),
+            'deleted_at',
+            state.get('d'),
+        ).order_by('deleted_at', 'id').values_list('id', 'entity', 'object_id', 'deleted_at')
+        tombstone_rows = list(tombstones[:limit + 1])
+        tombstones_more = len(tombstone_rows) > limit
+        tombstone_rows = tombstone_rows[:limit]
+
+    has_more = transactions_more or tombstones_more
+    if has_more:
+        next_state = dict(state)
+        if transaction_rows:
+            next_state['k'] = [to_us(transaction_rows[-1][-1]), transaction_rows[-1][0]]
+        if tombstone_rows:
+            next_state['d'] = [to_us(tombstone_rows[-1][3]), tombstone_rows[-1][0]]
+    else:
+        overlap = settings.SYNC_OVERLAP_SECONDS * 1000000
+        next_state = {'s': max(0, state['u'] - overlap)}
+
+    return {
+        'cursor': encode_cursor(next_state),
+        'has_more': has_more,
+        'reset': bool(state.get('r')) and first_page,
+        'transactions': {
+            'fields': TRANSACTION_FIELDS,
+            'rows': [
+                [
+                    transaction_id, category_id, str(amount), transaction_type, _to_ms(date),
+                    description, source, is_ai_parsed,
+                ]
+                for (transaction_id, category_id, amount, transaction_type, date,
+                     description, source, is_ai_parsed, _) in transaction_rows
+            ],
+        },
+        'categories': {
+            'fields': CATEGORY_FIELDS,
+            'rows': [list(row) for row in category_rows],
+        },
+        'deleted': {
+            'transactions': [row[2] for row in tombstone_rows if row[1] == 'transaction'],
+            'categories': [row[2] for row in tombstone_rows if row[1] == 'category'],
+        },
+    }
+
+
+def prune_tombstones() -> int:
+    """Удаляет отметки старше SYNC_TOMBSTONE_RETENTION_DAYS. Возвращает количество."""
+    horizon = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=horizon).delete()
+    return deleted
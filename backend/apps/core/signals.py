@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.categories.models import Category
+from apps.core.models import SyncTombstone
+from apps.core.services.data_version import bump_all_data_versions, bump_data_version
+from apps.transactions.models import Transaction
+
+
+def _is_own_deletion(origin, model):
+    # При удалении пользователя его данные удаляются каскадом - версия уже не нужна
+    return origin is None or isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(post_save, sender=Transaction)
+def bump_version_on_transaction_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_data_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Transaction)
+def track_transaction_delete(sender, instance, origin=None, **kwargs):
+    if _is_own_deletion(origin, Transaction):
+        bump_data_version(instance.user_id)
+        SyncTombstone.objects.create(user_id=instance.user_id, entity='transaction', object_id=instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def bump_version_on_category_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Системные категории видят все пользователи
+    if instance.is_system:
+        bump_all_data_versions()
+    elif instance.user_id:
+        bump_data_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Category)
+def track_category_delete(sender, instance, origin=None, **kwargs):
+    if not _is_own_deletion(origin, Category):
+        return
+    if instance.is_system:
+        bump_all_data_versions()
+    elif instance.user_id:
+        bump_data_version(instance.user_id)
+    SyncTombstone.objects.create(
+        user_id=None if instance.is_system else instance.user_id, entity='category', object_id=instance.pk
+    )
@@ -1,3 +1,454 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from email.utils import format_datetime
+import threading
+from unittest import mock
+import requests
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.categories.models import Category
+from apps.core.services.circuit_breaker import CircuitBreaker
+from apps.core.services.cursor import CursorError, decode_cursor, encode_cursor, from_us, to_us
+from apps.core.services.data_version import get_data_version
+from apps.core.services.openrouter_service import DeadlineExceeded, OpenRouterService
+from apps.core.services.response_cache import response_cache_stats
+from apps.transactions.models import Transaction
 
-# Create your tests here.
+
+def _create_user(name='user'):
+    return get_user_model().objects.create_user(username=name, email=f'{name}@example.com', password='password')
+
+
+class CursorCodecTests(TestCase):
+    """Общий кодек курсоров."""
+
+    def test_round_trip_keeps_microseconds(self):
+        moment = timezone.now().replace(microsecond=123457)
+        self.assertEqual(from_us(to_us(moment)), moment)
+        self.assertEqual(decode_cursor(encode_cursor({'s': to_us(moment)})), {'s': to_us(moment)})
+
+    def test_broken_cursors(self):
+        for value in ('***', 'bm90IGpzb24', 'ew', None, ['a']):
+            with self.subTest(value=value):
+                with self.assertRaises(CursorError):
+                    decode_cursor(value)
+        for value in (10 ** 30, -10 ** 30, '1', 1.5, [1], None, True):
+            with self.subTest(value=value):
+                with self.assertRaises(CursorError):
+                    from_us(value)
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class SyncTests(TestCase):
+    """Дельта-синхронизация: курсор, удаления и полная перезагрузка."""
+
+    url = '/api/v1/sync/'
+
+    def setUp(self):
+        self.user = _create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _transaction(self, amount='10.00'):
+        return Transaction.objects.create(
+            user=self.user, amount=Decimal(amount), type='expense', date=timezone.now()
+        )
+
+    def _sync(self, cursor=None, limit=None):
+        params = {}
+        if cursor:
+            params['since'] = cursor
+        if limit:
+            params['limit'] = limit
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def _transaction_ids(self, data):
+        id_index = data['transactions']['fields'].index('id')
+        return [row[id_index] for row in data['transactions']['rows']]
+
+    def test_full_load_then_delta(self):
+        first = self._transaction()
+        other = _create_user('other')
+        Transaction.objects.create(user=other, amount=Decimal('1'), type='expense', date=timezone.now())
+
+        data = self._sync()
+        self.assertTrue(data['reset'])
+        self.assertFalse(data['has_more'])
+        self.assertEqual(self._transaction_ids(data), [first.id])
+
+        second = self._transaction('20.00')
+        data = self._sync(data['cursor'])
+        self.assertFalse(data['reset'])
+        self.assertEqual(self._transaction_ids(data), [second.id])
+
+        # Без изменений - пустой ответ
+        data = self._sync(data['cursor'])
+        self.assertEqual(self._transaction_ids(data), [])
+
+    def test_pages_inside_round(self):
+        created = [self._transaction(str(amount)).id for amount in range(1, 8)]
+        ids = []
+        data = self._sync(limit=3)
+        ids.extend(self._transaction_ids(data))
+        while data['has_more']:
+            data = self._sync(data['cursor'], limit=3)
+            self.assertFalse(data['reset'])
+            ids.extend(self._transaction_ids(data))
+        self.assertEqual(sorted(ids), created)
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_tombstones(self):
+        transaction = self._transaction()
+        category = Category.objects.create(user=self.user, name='Кафе', type='expense')
+        data = self._sync()
+
+        transaction_id, category_id = transaction.id, category.id
+        transaction.delete()
+        category.delete()
+        data = self._sync(data['cursor'])
+        self.assertEqual(data['deleted']['transactions'], [transaction_id])
+        self.assertEqual(data['deleted']['categories'], [category_id])
+
+    def test_cursor_older_than_retention_resets(self):
+        self._transaction()
+        with self.settings(SYNC_TOMBSTONE_RETENTION_DAYS=30):
+            old = encode_cursor({'s': to_us(timezone.now() - timedelta(days=31))})
+            data = self._sync(old)
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['transactions']['rows']), 1)
+        self.assertEqual(data['deleted'], {'transactions': [], 'categories': []})
+
+    def test_invalid_cursors_return_400(self):
+        moment = to_us(datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        for cursor in (
+            'not-a-cursor',
+            encode_cursor(['s']),
+            encode_cursor({'s': [1]}),
+            encode_cursor({'s': 10 ** 30}),
+            encode_cursor({'s': moment, 'u': -10 ** 30}),
+            encode_cursor({'s': moment, 'u': moment, 'k': [10 ** 30, 1]}),
+            encode_cursor({'s': moment, 'u': moment, 'd': 'x'}),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'since': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+
+class ResponseCacheTests(TestCase):
+    """Кэш ответов аналитики: попадание, промах и сброс по версии данных."""
+
+    url = '/api/v1/analytics/summary/'
+
+    def setUp(self):
+        cache.clear()
+        response_cache_stats.reset()
+        self.user = _create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self._transaction('100.00')
+
+    def _transaction(self, amount, user=None):
+        return Transaction.objects.create(
+            user=user or self.user, amount=Decimal(amount), type='expense', date=timezone.now() - timedelta(hours=1)
+        )
+
+    def _get(self, params=None, client=None):
+        response = (client or self.client).get(self.url, params or {'days': 30})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_hit_skips_queries(self):
+        first = self._get()
+        # Попадание: только чтение версии данных
+        with self.assertNumQueries(1):
+            second = self._get()
+        self.assertEqual(second, first)
+        self.assertEqual(response_cache_stats.snapshot()['analytics.summary'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_params_are_normalized(self):
+        self._get({'days': 30, 'format': 'json'})
+        self._get({'days': 30})
+        self._get({'days': 7})
+        self.assertEqual(response_cache_stats.snapshot()['analytics.summary']['misses'], 2)
+
+    def test_write_invalidates(self):
+        self.assertEqual(self._get()['total_expenses'], 100.0)
+        transaction = self._transaction('50.00')
+        self.assertEqual(self._get()['total_expenses'], 150.0)
+        transaction.delete()
+        self.assertEqual(self._get()['total_expenses'], 100.0)
+        self.assertEqual(response_cache_stats.snapshot()['analytics.summary']['hits'], 0)
+
+    def test_users_do_not_share_entries(self):
+        self._get()
+        other = _create_user('other')
+        self._transaction('7.00', user=other)
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(self._get(client=client)['total_expenses'], 7.0)
+        # Запись другого пользователя не сбрасывает кэш первого
+        with self.assertNumQueries(1):
+            self.assertEqual(self._get()['total_expenses'], 100.0)
+
+    def test_system_category_change_bumps_every_user(self):
+        without_row = _create_user('fresh')
+        version = get_data_version(self.user.id)
+        category = Category.objects.filter(is_system=True).first()
+        category.color = '#000000'
+        category.save()
+        self.assertGreater(get_data_version(self.user.id), version)
+        self.assertGreater(get_data_version(without_row.id), 0)
+
+    @override_settings(RESPONSE_CACHE_TTLS={'analytics.summary': 0})
+    def test_zero_ttl_disables_cache(self):
+        self._get()
+        self._get()
+        self.assertNotIn('analytics.summary', response_cache_stats.snapshot())
+
+
+class ConditionalResponseTests(TestCase):
+    """ETag / If-None-Match: 304 без тела и новый ETag после записи."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = _create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Transaction.objects.create(user=self.user, amount=Decimal('10.00'), type='expense', date=timezone.now())
+
+    def _etag(self, url, params=None, client=None):
+        response = (client or self.client).get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        return response['ETag']
+
+    def test_not_modified(self):
+        etag = self._etag('/api/v1/transactions/')
+        # 304 - после одного чтения версии данных
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/v1/transactions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.content)
+        self.assertEqual(response['ETag'], etag)
+
+        for header in (f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(header=header):
+                response = self.client.get('/api/v1/transactions/', HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/api/v1/transactions/', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_etag_changes_after_write(self):
+        etag = self._etag('/api/v1/transactions/')
+        Transaction.objects.create(user=self.user, amount=Decimal('5.00'), type='expense', date=timezone.now())
+        response = self.client.get('/api/v1/transactions/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        categories_etag = self._etag('/api/v1/categories/my/')
+        Category.objects.create(user=self.user, name='Кафе', type='expense')
+        self.assertNotEqual(self._etag('/api/v1/categories/my/'), categories_etag)
+
+    def test_etag_depends_on_params_and_user(self):
+        etag = self._etag('/api/v1/transactions/')
+        self.assertNotEqual(self._etag('/api/v1/transactions/', {'type': 'income'}), etag)
+        self.assertEqual(self._etag('/api/v1/transactions/', {'format': 'json'}), etag)
+
+        other = APIClient()
+        other.force_authenticate(_create_user('other'))
+        self.assertNotEqual(self._etag('/api/v1/transactions/', client=other), etag)
+
+    def test_time_window_rolls_over(self):
+        url = '/api/v1/analytics/summary/'
+        with mock.patch('apps.core.services.etag.time') as etag_time:
+            etag_time.time.return_value = 1_000_000
+            etag = self._etag(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            # "Последние 30 дней" сдвинулись - ETag меняется раз в TTL эндпоинта
+            etag_time.time.return_value += 3600
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_anonymous_system_categories(self):
+        client = APIClient()
+        etag = self._etag('/api/v1/categories/system/', client=client)
+        self.assertEqual(client.get('/api/v1/categories/system/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        category = Category.objects.filter(is_system=True).first()
+        category.color = '#000000'
+        category.save()
+        self.assertEqual(client.get('/api/v1/categories/system/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_errors_have_no_etag(self):
+        response = self.client.get('/api/v1/transactions/', {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class CircuitBreakerTests(TestCase):
+    """Размыкание цепи по доле ошибок, пробный запрос и замыкание."""
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        patcher = mock.patch('apps.core.services.circuit_breaker.time')
+        self.addCleanup(patcher.stop)
+        patcher.start().time.side_effect = lambda: self.now
+        self.breaker = CircuitBreaker('test', min_calls=4, failure_rate=0.5, slow_call=10, open_seconds=30)
+
+    def _open(self):
+        for _ in range(2):
+            self.breaker.record_success(1)
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_opens_when_failure_rate_reached(self):
+        self.breaker.record_failure()
+        self.breaker.record_success(1)
+        self.breaker.record_success(1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_slow_call_counts_as_failure(self):
+        for _ in range(4):
+            self.breaker.record_success(11)
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_half_open_probe_closes_circuit(self):
+        self._open()
+        self.now += 31
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertTrue(self.breaker.allow())
+        # Пока пробный запрос не завершился, остальные отклоняются
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success(1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_half_open_failure_reopens_circuit(self):
+        self._open()
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_lock_lives_as_long_as_probe(self):
+        breaker = CircuitBreaker('probe', slow_call=10, open_seconds=30, probe_seconds=150)
+        breaker._trip()
+        self.now += 31
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            self.assertTrue(breaker.allow())
+        self.assertEqual(add.call_args.args[2], 151)
+        self.assertGreaterEqual(OpenRouterService().breaker.probe_seconds, OpenRouterService().deadline)
+
+
+class OpenRouterServiceTests(TestCase):
+    """Повторы по Retry-After в пределах дедлайна и учёт ошибок в circuit breaker."""
+
+    def setUp(self):
+        cache.clear()
+        self.service = OpenRouterService()
+        self.service.api_key = 'key'
+        self.service.max_retries = 2
+        self.service.retry_after_max = 30
+        self.service.deadline = 150
+        self.service.connect_timeout = 5
+        self.session = self.service._local.session = mock.Mock()
+        self.service.breaker = mock.Mock(allow=mock.Mock(return_value=True))
+
+    @staticmethod
+    def _response(status=200, headers=None, body=None):
+        response = mock.Mock(status_code=status, headers=headers or {}, text='')
+        response.json.return_value = body if body is not None else {}
+        if status >= 400:
+            response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=response)
+        return response
+
+    def test_session_per_thread(self):
+        service = OpenRouterService()
+        session = service.session
+        self.assertIs(service.session, session)
+        self.assertEqual(session.headers['Authorization'], f'Bearer {service.api_key}')
+
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(service.session))
+        thread.start()
+        thread.join()
+        self.assertIsNot(sessions[0], session)
+
+    def test_retry_after_header(self):
+        self.assertEqual(self.service._retry_delay(self._response(503, {'Retry-After': '3'}), 0), 3)
+        self.assertEqual(self.service._retry_delay(self._response(503, {'Retry-After': '600'}), 0), 30)
+        http_date = format_datetime(datetime.now(dt_timezone.utc) + timedelta(seconds=20), usegmt=True)
+        self.assertAlmostEqual(self.service._retry_delay(self._response(503, {'Retry-After': http_date}), 0), 20, delta=2)
+        self.service.backoff_factor = 1.0
+        self.assertEqual(self.service._retry_delay(self._response(503, {'Retry-After': 'soon'}), 2), 4)
+
+    @mock.patch('apps.core.services.openrouter_service.time.sleep')
+    def test_retries_respect_deadline(self, sleep):
+        self.session.post.side_effect = [
+            self._response(429, {'Retry-After': '2'}),
+            self._response(503, {'Retry-After': '20'}),
+        ]
+        with mock.patch.object(self.service, '_remaining', side_effect=[10, 10, 9, 8]):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.service._post_completion({})
+        # Первая пауза укладывается в бюджет, на вторую остатка не хватает
+        sleep.assert_called_once_with(2)
+        self.assertEqual(self.session.post.call_count, 2)
+        self.assertEqual(self.session.post.call_args.kwargs['timeout'], (5, 9))
+
+    def test_expired_deadline(self):
+        self.service._local.deadline = 0
+        with self.assertRaises(DeadlineExceeded):
+            self.service._remaining()
+
+    def test_transport_errors_open_circuit(self):
+        for error in (requests.exceptions.ConnectionError(), requests.exceptions.ReadTimeout(), DeadlineExceeded()):
+            with self.subTest(error=type(error).__name__):
+                self.service.breaker.reset_mock()
+                self.session.post.side_effect = error
+                self.assertEqual(self.service.analyze_financial_data({}), [])
+                self.service.breaker.record_failure.assert_called_once_with()
+                self.service.breaker.record_success.assert_not_called()
+
+    def test_server_errors_open_circuit(self):
+        self.service.max_retries = 0
+        self.session.post.side_effect = None
+        self.session.post.return_value = self._response(502)
+        self.service.analyze_financial_data({})
+        self.service.breaker.record_failure.assert_called_once_with()
+
+    def test_bad_content_does_not_open_circuit(self):
+        self.service.max_retries = 0
+        for response in (
+            self._response(body={'choices': []}),
+            self._response(body={'choices': [{'message': {'content': 'не JSON'}}]}),
+            self._response(401),
+        ):
+            with self.subTest(status=response.status_code, body=response.json.return_value):
+                self.service.breaker.reset_mock()
+                self.session.post.return_value = response
+                self.service.analyze_financial_data({})
+                self.service.breaker.record_failure.assert_not_called()
+                self.service.breaker.record_success.assert_called_once()
+
+    def test_alternative_models_server_errors_open_circuit(self):
+        self.service.max_retries = 0
+        self.session.post.side_effect = [
+            self._response(body={'choices': [{'message': {'content': ''}}]}),
+            self._response(503),
+            self._response(503),
+        ]
+        self.service.analyze_financial_data({})
+        self.service.breaker.record_failure.assert_called_once_with()
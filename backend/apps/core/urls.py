@@ -1,5 +1,6 @@
 from django.urls import path
 from .views_health import health_check, readiness_check
+from .views_sync import SyncView
 
 app_name = 'core'
 
@@ -7,4 +8,7 @@ urlpatterns = [
     # Health checks at api/v1/ level
     path('health/', health_check, name='health'),
     path('ready/', readiness_check, name='readiness'),
+
+    # Дельта-синхронизация мобильного клиента
+    path('sync/', SyncView.as_view(), name='sync'),
 ]
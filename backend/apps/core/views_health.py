@@ -3,6 +3,7 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.db import connection
 from django.core.cache import cache
+from apps.core.services.response_cache import response_cache_stats
 import datetime
 
 
@@ -39,7 +40,9 @@ def health_check(request):
     try:
         cache.get('health_check')
         health_status['dependencies']['cache'] = {
-            'status': 'healthy'
+            'status': 'healthy',
+            # Попадания/промахи кэша ответов аналитики в этом воркере
+            'response_cache': response_cache_stats.snapshot()
         }
     except Exception as e:
         health_status['dependencies']['cache'] = {
@@ -0,0 +1,30 @@
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from apps.core.services.sync import SyncCursorError, get_changes
+
+
+class SyncView(APIView):
+    """
+    Дельта-синхронизация для мобильного клиента.
+    GET /api/v1/sync/?since=<cursor>&limit=1000
+
+    Без since - полная загрузка (reset=true). Клиент повторяет запрос с cursor из ответа,
+    пока has_more=true, и сохраняет последний cursor для следующей синхронизации.
+    Объекты приходят массивами в порядке fields; удалённые - списками id в deleted.
+    При удалении категории её транзакции остаются без категории - клиент обнуляет ссылки сам.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            return Response({'error': 'limit должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            changes = get_changes(request.user, request.query_params.get('since') or None, limit)
+        except SyncCursorError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(changes)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.transactions.models import Transaction
+from apps.transactions.models import ImportJob, Transaction
 
 
 @admin.register(Transaction)
@@ -7,8 +7,22 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'amount', 'type', 'category', 'source', 'date']
     list_filter = ['type', 'source', 'is_ai_parsed', 'date']
     search_fields = ['description', 'user__email']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['fingerprint', 'created_at', 'updated_at']
     date_hierarchy = 'date'
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'category')
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'format', 'status', 'rows_processed', 'created_count', 'created_at']
+    list_filter = ['status', 'format']
+    search_fields = ['original_name', 'user__email']
+    readonly_fields = [
+        'size_bytes', 'processed_bytes', 'rows_processed', 'created_count', 'duplicate_count',
+        'error_count', 'errors', 'error', 'created_at', 'started_at', 'finished_at',
+    ]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions.services.sms_parser import BankTemplateError, load_registry
+
+
+class Command(BaseCommand):
+    help = 'Проверить файл шаблонов банков (компиляция regex и self-test на примерах SMS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            help='Путь к файлу шаблонов (по умолчанию SMS_BANK_TEMPLATES_PATH)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            registry = load_registry(options.get('file'))
+        except BankTemplateError as e:
+            raise CommandError(str(e))
+
+        banks = ', '.join(registry.bank_order)
+        self.stdout.write(f'Версия шаблонов: {registry.version}')
+        self.stdout.write(f'Банки (по приоритету): {banks}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Все примеры SMS распознаны ({len(registry.samples)} шт.)'
+        ))
+        self.stdout.write(
+            'Запущенные воркеры подхватят файл автоматически '
+            'в течение SMS_TEMPLATES_RELOAD_INTERVAL секунд.'
+        )
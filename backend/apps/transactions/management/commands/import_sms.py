@@ -0,0 +1,173 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions.services.sms_ingest import save_parsed_sms
+from apps.transactions.services.sms_parser import parse_sms_batch
+
+User = get_user_model()
+
+
+def _init_worker():
+    """Инициализация процесса-воркера (нужна при spawn, при fork Django уже загружен)."""
+    import django
+    django.setup()
+
+
+def _parse_chunk(messages):
+    return parse_sms_batch(messages)
+
+
+class Command(BaseCommand):
+    help = (
+        'Импорт SMS из JSONL-дампа (по одной SMS в строке: {"text", "phone", "date", "idempotency_key"}). '
+        'Парсинг выполняется в пуле процессов, запись - пачками через bulk_create. '
+        'Повтор SMS распознаётся по idempotency_key или по тексту и date.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', required=True, help='Путь к JSONL-файлу с SMS')
+        parser.add_argument('--user', required=True, help='Email или id пользователя')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Количество процессов для парсинга (0 - парсить в текущем процессе)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество SMS в одной задаче воркера и в одной записи в БД',
+        )
+        parser.add_argument(
+            '--max-pending',
+            type=int,
+            default=0,
+            help='Максимум пачек в обработке одновременно (по умолчанию 2 x workers)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию <file>.checkpoint)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Игнорировать контрольную точку и начать с начала файла',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['file'])
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+
+        user = self._get_user(options['user'])
+        chunk_size = max(1, options['chunk_size'])
+        workers = max(0, options['workers'])
+        max_pending = options['max_pending'] or max(2, workers * 2)
+        checkpoint_path = Path(options['checkpoint'] or f'{path}.checkpoint')
+
+        self.stats = {'line': 0, 'accepted': 0, 'rejected': 0, 'duplicates': 0, 'invalid': 0}
+        if checkpoint_path.exists() and not options['restart']:
+            self.stats.update(json.loads(checkpoint_path.read_text()))
+            self.stdout.write(f'Продолжаем с контрольной точки: строка {self.stats["line"]}')
+
+        self.user = user
+        self.checkpoint_path = checkpoint_path
+        self.started = time.monotonic()
+        self.processed = 0
+        self.stdout.write(f'Импорт SMS из {path} для {user.email} (воркеров: {workers})')
+
+        chunks = self._read_chunks(path, self.stats['line'], chunk_size)
+        if workers == 0:
+            for chunk in chunks:
+                self._save_chunk(chunk, parse_sms_batch(chunk[1]))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                # Ограниченное окно задач: чтение файла не убегает вперёд записи в БД,
+                # а результаты сохраняются строго в порядке строк файла.
+                pending = deque()
+                for chunk in chunks:
+                    if len(pending) >= max_pending:
+                        done_chunk, future = pending.popleft()
+                        self._save_chunk(done_chunk, future.result())
+                    pending.append((chunk, executor.submit(_parse_chunk, chunk[1])))
+                while pending:
+                    done_chunk, future = pending.popleft()
+                    self._save_chunk(done_chunk, future.result())
+
+        self._report(final=True)
+        checkpoint_path.unlink(missing_ok=True)
+
+    def _get_user(self, value):
+        lookup = {'id': value} if value.isdigit() else {'email': value}
+        try:
+            return User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь не найден: {value}')
+
+    def _read_chunks(self, path, skip_lines, chunk_size):
+        """
+        Потоково читает файл пачками.
+        Возвращает (номер строки после пачки, SMS пачки, число невалидных строк).
+        """
+        messages = []
+        invalid = 0
+        line_number = 0
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if line_number <= skip_lines:
+                    continue
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    message = None
+                if not isinstance(message, dict) or not message.get('text'):
+                    invalid += 1
+                else:
+                    messages.append(message)
+
+                if len(messages) >= chunk_size:
+                    yield line_number, messages, invalid
+                    messages = []
+                    invalid = 0
+        if messages or invalid:
+            yield line_number, messages, invalid
+
+    def _save_chunk(self, chunk, parsed):
+        line_number, messages, invalid = chunk
+        result = save_parsed_sms(self.user, messages, parsed)
+
+        self.stats['line'] = line_number
+        self.stats['accepted'] += len(result['accepted'])
+        self.stats['rejected'] += len(result['rejected'])
+        self.stats['duplicates'] += len(result['duplicates'])
+        self.stats['invalid'] += invalid
+        self.processed += len(messages) + invalid
+
+        # Контрольная точка пишется атомарно; при повторном запуске уже записанная
+        # пачка отбрасывается уникальным индексом отпечатков (SMS с date или idempotency_key).
+        tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + '.tmp')
+        tmp_path.write_text(json.dumps(self.stats))
+        os.replace(tmp_path, self.checkpoint_path)
+        self._report()
+
+    def _report(self, final=False):
+        elapsed = time.monotonic() - self.started
+        rate = self.processed / elapsed if elapsed > 0 else 0
+        message = (
+            f'строка {self.stats["line"]}: принято {self.stats["accepted"]}, '
+            f'не распознано {self.stats["rejected"]}, дублей {self.stats["duplicates"]}, '
+            f'невалидных строк {self.stats["invalid"]} ({rate:.0f} SMS/сек)'
+        )
+        if final:
+            self.stdout.write(self.style.SUCCESS(f'Готово! {message}'))
+        else:
+            self.stdout.write(message)
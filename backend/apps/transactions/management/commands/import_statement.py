@@ -0,0 +1,94 @@
+from pathlib import Path
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions.models import ImportJob
+from apps.transactions.services.statement_import import (
+    process_import_job, requeue_stale_import_jobs, run_statement_import
+)
+from apps.transactions.services.statement_parser import detect_format
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Импорт банковской выписки (CSV/OFX). Файл читается потоково, '
+        'запись - пачками через bulk_create. С --pending обрабатывает выписки, загруженные через API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Путь к файлу выписки')
+        parser.add_argument('--user', help='Email или id пользователя')
+        parser.add_argument('--format', choices=['csv', 'ofx'], help='Формат (по умолчанию - по файлу)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=0,
+            help='Операций в одной пачке записи (по умолчанию STATEMENT_IMPORT_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Обработать задачи импорта в очереди (загруженные через API)',
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            self._process_pending()
+            return
+
+        if not options['file'] or not options['user']:
+            raise CommandError('Укажите --file и --user (или --pending)')
+        path = Path(options['file'])
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+        user = self._get_user(options['user'])
+
+        with open(path, 'rb') as f:
+            statement_format = options['format'] or detect_format(f.read(4096), path.name)
+            f.seek(0)
+            job = ImportJob.objects.create(
+                user=user,
+                format=statement_format,
+                original_name=path.name,
+                size_bytes=path.stat().st_size,
+            )
+            self.stdout.write(f'Импорт {path} ({statement_format}) для {user.email}, задача #{job.pk}')
+            job = run_statement_import(job, f, options['chunk_size'] or None, progress=self._report)
+
+        self._finish(job)
+
+    def _process_pending(self):
+        requeued = requeue_stale_import_jobs()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Прерванных импортов возвращено в очередь: {len(requeued)}'))
+        job_ids = list(ImportJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True))
+        self.stdout.write(f'Задач в очереди: {len(job_ids)}')
+        for job_id in job_ids:
+            job = process_import_job(job_id)
+            if job is not None:
+                self._finish(job)
+
+    def _get_user(self, value):
+        lookup = {'id': value} if value.isdigit() else {'email': value}
+        try:
+            return User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь не найден: {value}')
+
+    def _report(self, job):
+        self.stdout.write(
+            f'  {job.progress}%: строк {job.rows_processed}, создано {job.created_count}, '
+            f'дублей {job.duplicate_count}, ошибок {job.error_count}'
+        )
+
+    def _finish(self, job):
+        if job.status == 'failed':
+            self.stdout.write(self.style.ERROR(f'Задача #{job.pk}: ошибка импорта: {job.error}'))
+            return
+        for message in job.errors:
+            self.stdout.write(self.style.WARNING(f'  {message}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Задача #{job.pk} готова! Строк: {job.rows_processed}, создано: {job.created_count}, '
+            f'дублей: {job.duplicate_count}, ошибок: {job.error_count}'
+        ))
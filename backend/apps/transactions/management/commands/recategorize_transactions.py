@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.transactions.models import Transaction
+from apps.transactions.services.category_suggester import recategorize_transactions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Автоматически проставить категории транзакциям без категории (по ключевым словам)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email или id пользователя (по умолчанию - все пользователи)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Размер пачки чтения/записи',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать, ничего не записывая',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Transaction.objects.all()
+        if options['user']:
+            value = options['user']
+            lookup = {'id': value} if value.isdigit() else {'email': value}
+            try:
+                user = User.objects.get(**lookup)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь не найден: {value}')
+            queryset = queryset.filter(user=user)
+
+        result = recategorize_transactions(
+            queryset,
+            chunk_size=max(1, options['chunk_size']),
+            dry_run=options['dry_run'],
+        )
+
+        for category_name, count in sorted(result['by_category'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f'  {category_name}: {count}')
+
+        verb = 'Будет категоризировано' if options['dry_run'] else 'Категоризировано'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result["categorized"]} из {result["scanned"]} транзакций без категории'
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("categories", "0002_create_system_categories"),
+        ("transactions", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Ключ идемпотентности или отпечаток содержимого для защиты от дублей",
+                max_length=64,
+                null=True,
+                verbose_name="Отпечаток",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("fingerprint__isnull", False)),
+                fields=("user", "fingerprint"),
+                name="unique_user_transaction_fingerprint",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("categories", "0003_merchant_category_rule"),
+        ("transactions", "0002_transaction_fingerprint"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["user", "updated_at"], name="transaction_user_id_5a83ed_idx"
+            ),
+        ),
+    ]
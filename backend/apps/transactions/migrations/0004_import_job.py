@@ -0,0 +1,151 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0003_transaction_user_updated_at_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="transaction",
+            name="source",
+            field=models.CharField(
+                choices=[
+                    ("manual", "Вручную"),
+                    ("sms", "SMS"),
+                    ("statement", "Выписка"),
+                ],
+                default="manual",
+                max_length=10,
+                verbose_name="Источник",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ImportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("done", "Завершён"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("csv", "CSV"), ("ofx", "OFX")],
+                        max_length=10,
+                        verbose_name="Формат",
+                    ),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True, upload_to="imports/%Y/%m/", verbose_name="Файл"
+                    ),
+                ),
+                (
+                    "original_name",
+                    models.CharField(
+                        blank=True, max_length=255, verbose_name="Имя файла"
+                    ),
+                ),
+                (
+                    "column_map",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Поле транзакции -> заголовок колонки CSV (если не распознаны автоматически)",
+                        verbose_name="Сопоставление колонок",
+                    ),
+                ),
+                (
+                    "size_bytes",
+                    models.BigIntegerField(default=0, verbose_name="Размер файла"),
+                ),
+                (
+                    "processed_bytes",
+                    models.BigIntegerField(default=0, verbose_name="Обработано байт"),
+                ),
+                (
+                    "rows_processed",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Обработано строк"
+                    ),
+                ),
+                (
+                    "created_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Создано транзакций"
+                    ),
+                ),
+                (
+                    "duplicate_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Дубликатов"),
+                ),
+                (
+                    "error_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Строк с ошибками"
+                    ),
+                ),
+                (
+                    "errors",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="Первые ошибки"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка импорта")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="import_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Импорт выписки",
+                "verbose_name_plural": "Импорт выписок",
+                "db_table": "import_jobs",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-created_at"],
+                        name="import_jobs_user_id_0c423e_idx",
+                    ),
+                    models.Index(
+                        fields=["status"], name="import_jobs_status_46b7f9_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -15,6 +15,7 @@ class Transaction(models.Model):
     SOURCE_TYPES = [
         ('manual', 'Вручную'),
         ('sms', 'SMS'),
+        ('statement', 'Выписка'),
     ]
 
     user = models.ForeignKey(
@@ -50,6 +51,14 @@ class Transaction(models.Model):
         verbose_name='Источник'
     )
     is_ai_parsed = models.BooleanField(default=False, verbose_name='Обработано AI')
+    fingerprint = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Отпечаток',
+        help_text='Ключ идемпотентности или отпечаток содержимого для защиты от дублей'
+    )
     date = models.DateTimeField(verbose_name='Дата')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -62,7 +71,86 @@ class Transaction(models.Model):
         indexes = [
             models.Index(fields=['user', '-date']),
             models.Index(fields=['user', 'type', '-date']),
+            # Дельта-синхронизация: изменения пользователя после курсора
+            models.Index(fields=['user', 'updated_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'fingerprint'],
+                condition=models.Q(fingerprint__isnull=False),
+                name='unique_user_transaction_fingerprint'
+            )
         ]
 
     def __str__(self):
         return f'{self.get_type_display()}: {self.amount} ({self.date})'
+
+
+class ImportJob(models.Model):
+    """
+    Импорт банковской выписки (CSV/OFX).
+    Файл разбирается потоково в фоне, прогресс пишется после каждой пачки.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Завершён'),
+        ('failed', 'Ошибка'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ofx', 'OFX'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='import_jobs',
+        verbose_name='Пользователь'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, verbose_name='Формат')
+    file = models.FileField(upload_to='imports/%Y/%m/', blank=True, verbose_name='Файл')
+    original_name = models.CharField(max_length=255, blank=True, verbose_name='Имя файла')
+    column_map = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Сопоставление колонок',
+        help_text='Поле транзакции -> заголовок колонки CSV (если не распознаны автоматически)'
+    )
+    size_bytes = models.BigIntegerField(default=0, verbose_name='Размер файла')
+    processed_bytes = models.BigIntegerField(default=0, verbose_name='Обработано байт')
+    rows_processed = models.PositiveIntegerField(default=0, verbose_name='Обработано строк')
+    created_count = models.PositiveIntegerField(default=0, verbose_name='Создано транзакций')
+    duplicate_count = models.PositiveIntegerField(default=0, verbose_name='Дубликатов')
+    error_count = models.PositiveIntegerField(default=0, verbose_name='Строк с ошибками')
+    errors = models.JSONField(default=list, blank=True, verbose_name='Первые ошибки')
+    error = models.TextField(blank=True, verbose_name='Ошибка импорта')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Обновляется при каждой записанной пачке - по нему находятся прерванные импорты
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'import_jobs'
+        verbose_name = 'Импорт выписки'
+        verbose_name_plural = 'Импорт выписок'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['status']),
+        ]
+
+    def __str__(self):
+        return f'{self.original_name or self.format} ({self.get_status_display()})'
+
+    @property
+    def progress(self):
+        """Доля обработанного файла, 0-100."""
+        if self.status == 'done':
+            return 100
+        if not self.size_bytes:
+            return 0
+        return min(99, int(self.processed_bytes * 100 / self.size_bytes))
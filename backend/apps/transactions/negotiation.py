@@ -0,0 +1,16 @@
+"""
+Согласование контента для выгрузки.
+В /transactions/export/ параметр ?format= выбирает формат файла (csv, jsonl, parquet),
+а не рендерер ответа: сам файл отдаётся потоком StreamingHttpResponse, а ошибки
+всегда приходят обычным JSON DRF.
+"""
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """Всегда первый рендерер (JSON), без учёта ?format= и Accept."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
@@ -0,0 +1,124 @@
+"""
+Пагинация списка транзакций.
+
+По умолчанию - номера страниц, как раньше (?page=N), с возможностью отключить
+COUNT(*) по всей истории пользователя (?count=false).
+Для бесконечной прокрутки - keyset-пагинация по (date, id) (?pagination=cursor,
+затем ?cursor=<next_cursor>): каждая страница - один диапазонный запрос по индексу
+(user, -date), без OFFSET, стоимость не растёт с глубиной.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from apps.core.services.cursor import CursorError, decode_cursor, encode_cursor, from_us, to_us
+
+
+class TransactionPagination(PageNumberPagination):
+    """Номера страниц (с опциональным COUNT) или keyset-курсор по (date, id)."""
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = 'page'
+        if self.cursor_query_param in request.query_params or request.query_params.get(self.mode_query_param) == 'cursor':
+            self.mode = 'cursor'
+            return self._paginate_cursor(queryset, request)
+        if request.query_params.get(self.count_query_param, '').lower() in ('0', 'false', 'no'):
+            self.mode = 'nocount'
+            return self._paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'cursor':
+            return Response(OrderedDict([
+                ('next_cursor', self.next_cursor),
+                ('next', self._cursor_url(self.next_cursor)),
+                ('results', data),
+            ]))
+        if self.mode == 'nocount':
+            return Response(OrderedDict([
+                ('count', None),
+                ('next', self._page_url(self.page_number + 1) if self.has_next else None),
+                ('previous', self._page_url(self.page_number - 1) if self.page_number > 1 else None),
+                ('results', data),
+            ]))
+        return super().get_paginated_response(data)
+
+    # Keyset
+
+    def _ordering(self, request):
+        """Направление по дате: поддерживается только сортировка по date."""
+        ordering = request.query_params.get('ordering', '-date')
+        if ordering not in ('date', '-date'):
+            raise ValidationError({'ordering': 'Курсорная пагинация поддерживает только ordering=date или -date'})
+        return ordering == '-date'
+
+    def _encode_cursor(self, date: datetime, pk: int) -> str:
+        return encode_cursor([to_us(date), pk])
+
+    def _decode_cursor(self, value: str):
+        try:
+            position = decode_cursor(value)
+            if not isinstance(position, list) or len(position) != 2 or not isinstance(position[1], int):
+                raise CursorError('Некорректный курсор')
+            return from_us(position[0]), position[1]
+        except CursorError:
+            raise NotFound('Некорректный курсор')
+
+    def _paginate_cursor(self, queryset, request):
+        page_size = self.get_page_size(request)
+        descending = self._ordering(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if descending:
+            queryset = queryset.order_by('-date', '-id')
+        else:
+            queryset = queryset.order_by('date', 'id')
+        if cursor:
+            date, pk = self._decode_cursor(cursor)
+            if descending:
+                queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+            else:
+                queryset = queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=pk))
+
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = self._encode_cursor(page[-1].date, page[-1].pk) if len(rows) > page_size else None
+        return page
+
+    def _cursor_url(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    # Номера страниц без COUNT(*)
+
+    def _paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound('Некорректный номер страницы')
+        if self.page_number < 1:
+            raise NotFound('Некорректный номер страницы')
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def _page_url(self, page_number):
+        url = self.request.build_absolute_uri()
+        if page_number == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page_number)
@@ -1,5 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers
-from apps.transactions.models import Transaction
+from apps.categories.models import Category
+from apps.categories.services.merchant_rules import learn_category
+from apps.transactions.models import ImportJob, Transaction
+from apps.transactions.services.bulk_writer import bulk_create_transactions
+from apps.transactions.services.sms_ingest import DATE_ONLY_RE
 
 
 class TransactionSerializer(serializers.ModelSerializer):
@@ -37,31 +42,182 @@ class TransactionUpdateSerializer(serializers.ModelSerializer):
         model = Transaction
         fields = ['category', 'amount', 'description', 'type', 'date']
 
+    def update(self, instance, validated_data):
+        previous_category_id = instance.category_id
+        instance = super().update(instance, validated_data)
+        # Пользователь вручную сменил категорию - запоминаем продавца,
+        # чтобы следующие его транзакции категоризировались сами
+        if 'category' in validated_data and instance.category_id and instance.category_id != previous_category_id:
+            learn_category(instance.user_id, instance.description, instance.type, instance.category)
+        return instance
+
+
+class BulkCategoryField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField с запоминанием найденных категорий.
+    В пачке обычно несколько разных категорий, поэтому одна категория - один запрос.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._resolved = {}
+
+    def to_internal_value(self, data):
+        key = str(data)
+        if key not in self._resolved:
+            self._resolved[key] = super().to_internal_value(data)
+        return self._resolved[key]
+
+
+class TransactionBulkItemSerializer(serializers.ModelSerializer):
+    """Serializer для одной строки массового создания."""
+    category = BulkCategoryField(
+        queryset=Category.objects.all(), required=False, allow_null=True
+    )
+    idempotency_key = serializers.CharField(
+        max_length=128, required=False, write_only=True, label='Ключ идемпотентности'
+    )
+
+    class Meta:
+        model = Transaction
+        fields = ['category', 'amount', 'description', 'type', 'date', 'idempotency_key']
+
 
 class TransactionBulkSerializer(serializers.Serializer):
-    """Serializer для массового создания транзакций."""
-    transactions = TransactionCreateSerializer(many=True)
+    """
+    Serializer для массового создания транзакций.
+    Вся пачка валидируется до записи; при allow_partial=True строки с ошибками
+    пропускаются, а остальные сохраняются. Повторно присланные строки
+    (тот же idempotency_key или то же содержимое) не создают дублей.
+    """
+    transactions = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+    allow_partial = serializers.BooleanField(default=False, label='Сохранять корректные строки')
+
+    def validate_transactions(self, value):
+        max_batch = settings.TRANSACTIONS_BULK_MAX_BATCH
+        if len(value) > max_batch:
+            raise serializers.ValidationError(
+                f'Слишком много транзакций в запросе: {len(value)} (максимум {max_batch})'
+            )
+        return value
+
+    def validate(self, attrs):
+        item_serializer = TransactionBulkItemSerializer(context=self.context)
+        valid_rows = []
+        valid_indexes = []
+        row_errors = []
+
+        for index, row in enumerate(attrs['transactions']):
+            try:
+                valid_rows.append(item_serializer.run_validation(row))
+                valid_indexes.append(index)
+            except serializers.ValidationError as exc:
+                row_errors.append({'index': index, 'errors': exc.detail})
+
+        if row_errors and not attrs['allow_partial']:
+            raise serializers.ValidationError({
+                'transactions': {error['index']: error['errors'] for error in row_errors}
+            })
+
+        attrs['valid_rows'] = valid_rows
+        attrs['valid_indexes'] = valid_indexes
+        attrs['row_errors'] = row_errors
+        return attrs
 
     def create(self, validated_data):
-        transactions_data = validated_data['transactions']
         user = self.context['request'].user
-        created_transactions = []
-        
-        for tx_data in transactions_data:
-            tx_data['user'] = user
-            tx_data['source'] = 'sms'
-            tx = Transaction.objects.create(**tx_data)
-            created_transactions.append(tx)
-        
-        return created_transactions
+        created, duplicates = bulk_create_transactions(user, validated_data['valid_rows'], source='sms')
+        # Индексы дублей переводим в индексы исходного запроса
+        self.duplicate_indexes = [validated_data['valid_indexes'][i] for i in duplicates]
+        return created
 
 
 class SMSParseSerializer(serializers.Serializer):
     """Serializer для парсинга SMS."""
     sms_text = serializers.CharField(label='Текст SMS')
     bank_phone = serializers.CharField(label='Номер банка', required=False, allow_blank=True)
+    idempotency_key = serializers.CharField(
+        label='Ключ идемпотентности', max_length=128, required=False, allow_blank=True
+    )
+    date = serializers.DateTimeField(label='Время получения SMS', required=False)
 
     def validate_sms_text(self, value):
         if not value.strip():
             raise serializers.ValidationError('Текст SMS не может быть пустым')
         return value.strip()
+
+
+class SMSBatchItemSerializer(serializers.Serializer):
+    """Одна SMS пакета. Пустой text не ошибка - такая SMS попадает в rejected."""
+    text = serializers.CharField(label='Текст SMS', allow_blank=True, trim_whitespace=False)
+    phone = serializers.CharField(label='Номер банка', required=False, allow_blank=True)
+    date = serializers.DateTimeField(label='Время получения SMS', required=False)
+    idempotency_key = serializers.CharField(
+        label='Ключ идемпотентности', max_length=128, required=False, allow_blank=True
+    )
+
+    def to_internal_value(self, data):
+        # DateTimeField принимает и дату без времени (полночь), но по ней
+        # повтор SMS не отличить от новой SMS с тем же текстом
+        date = data.get('date') if isinstance(data, dict) else None
+        if isinstance(date, str) and DATE_ONLY_RE.fullmatch(date.strip()):
+            raise serializers.ValidationError({'date': 'Укажите время получения SMS, а не только дату'})
+        return super().to_internal_value(data)
+
+
+class SMSBatchParseSerializer(serializers.Serializer):
+    """
+    Serializer для пакетного парсинга SMS.
+    Элементы: {"text": str, "phone": str, "date": ISO datetime, "idempotency_key": str};
+    обязателен только text, пустые SMS попадают в rejected при обработке.
+    Повтор SMS распознаётся по idempotency_key или по паре text + date.
+    """
+    messages = serializers.ListField(child=SMSBatchItemSerializer(), allow_empty=False)
+
+    def validate_messages(self, value):
+        max_batch = settings.TRANSACTIONS_SMS_BATCH_MAX
+        if len(value) > max_batch:
+            raise serializers.ValidationError(
+                f'Слишком много SMS в запросе: {len(value)} (максимум {max_batch})'
+            )
+        return value
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    """Serializer для статуса импорта выписки."""
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'status', 'format', 'original_name', 'size_bytes', 'processed_bytes', 'progress',
+            'rows_processed', 'created_count', 'duplicate_count', 'error_count', 'errors', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class ImportJobCreateSerializer(serializers.Serializer):
+    """
+    Serializer для загрузки выписки.
+    column_map - сопоставление полей (date, amount, expense, income, description, type)
+    с заголовками колонок CSV, если банк использует нестандартные названия.
+    """
+    file = serializers.FileField(label='Файл выписки')
+    format = serializers.ChoiceField(choices=ImportJob.FORMAT_CHOICES, required=False, label='Формат')
+    column_map = serializers.JSONField(required=False, label='Сопоставление колонок')
+
+    def validate_file(self, value):
+        max_size = settings.STATEMENT_IMPORT_MAX_SIZE
+        if value.size > max_size:
+            raise serializers.ValidationError(
+                f'Файл слишком большой: {value.size} байт (максимум {max_size})'
+            )
+        return value
+
+    def validate_column_map(self, value):
+        if not isinstance(value, dict) or not all(
+            isinstance(key, str) and isinstance(item, str) for key, item in value.items()
+        ):
+            raise serializers.ValidationError('Ожидается объект {"поле": "заголовок колонки"}')
+        return value
@@ -0,0 +1,166 @@
+"""
+Сервис для массовой записи транзакций.
+Пишет провалидированные строки пачками внутри одной транзакции БД.
+Дубли (по ключу идемпотентности или отпечатку содержимого) отбрасываются
+уникальным индексом (user, fingerprint) без предварительного SELECT.
+Какие строки вставил именно этот запрос, сообщает сама БД: на PostgreSQL
+и SQLite - INSERT ... ON CONFLICT DO NOTHING RETURNING, на остальных БД - вставка
+по одной строке в точке сохранения. Поэтому параллельные ретраи клиента не считают
+чужую вставку своей.
+Массовая вставка не шлёт сигналы, поэтому дневные агрегаты аналитики
+за затронутые дни, баланс и версия данных пользователя обновляются здесь же,
+в той же транзакции.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction as db_transaction
+from apps.analytics.services.balance import add_transactions_to_balance
+from apps.analytics.services.rollups import refresh_transactions_days
+from apps.core.services.data_version import bump_data_version
+from apps.transactions.models import Transaction
+from apps.transactions.services.fingerprint import content_fingerprint, idempotency_fingerprint
+
+
+def get_chunk_size(chunk_size: Optional[int] = None) -> int:
+    """Возвращает размер пачки для bulk_create."""
+    return max(1, chunk_size or getattr(settings, 'TRANSACTIONS_BULK_CHUNK_SIZE', 500))
+
+
+def build_fingerprint(user_id: int, row: Dict[str, Any]) -> str:
+    """
+    Отпечаток строки: явный fingerprint, ключ идемпотентности клиента
+    или отпечаток содержимого (сумма + дата + описание).
+    """
+    if row.get('fingerprint'):
+        return row['fingerprint']
+    if row.get('idempotency_key'):
+        return idempotency_fingerprint(user_id, row['idempotency_key'])
+    return content_fingerprint(
+        user_id, row['amount'], row['date'], row.get('description'), row.get('type', 'expense')
+    )
+
+
+def _supports_insert_returning() -> bool:
+    return connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_rows_from_bulk_insert
+
+
+def _insert_returning(objs: List[Transaction]) -> Dict[str, int]:
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING (PostgreSQL, SQLite 3.35+).
+    Возвращает {отпечаток: id} только для строк, вставленных этим запросом.
+    Строки делятся на запросы по bulk_batch_size БД (лимит параметров SQLite).
+    """
+    meta = Transaction._meta
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    user_column = quote(meta.get_field('user').column)
+    fingerprint_column = quote(meta.get_field('fingerprint').column)
+    row_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    batch_size = max(1, connection.ops.bulk_batch_size(fields, objs))
+
+    inserted = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            params = []
+            for obj in batch:
+                params.extend(field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+            sql = (
+                f'INSERT INTO {quote(meta.db_table)} ({", ".join(quote(field.column) for field in fields)}) '
+                f'VALUES {", ".join([row_sql] * len(batch))} '
+                # Условие частичного уникального индекса unique_user_transaction_fingerprint
+                f'ON CONFLICT ({user_column}, {fingerprint_column}) WHERE {fingerprint_column} IS NOT NULL '
+                f'DO NOTHING RETURNING {quote(meta.pk.column)}, {fingerprint_column}'
+            )
+            cursor.execute(sql, params)
+            inserted.update({fingerprint: pk for pk, fingerprint in cursor.fetchall()})
+    return inserted
+
+
+def _insert_one_by_one(objs: List[Transaction]) -> Dict[str, int]:
+    """Вставка по одной строке в точке сохранения; дубль - IntegrityError. {отпечаток: id}."""
+    inserted = {}
+    for obj in objs:
+        try:
+            with db_transaction.atomic():
+                Transaction.objects.bulk_create([obj])
+        except IntegrityError:
+            continue
+        if obj.pk is None:
+            # БД без RETURNING: строка вставлена в этой же транзакции, значит она наша
+            obj.pk = Transaction.objects.filter(
+                user_id=obj.user_id, fingerprint=obj.fingerprint
+            ).values_list('pk', flat=True).get()
+        inserted[obj.fingerprint] = obj.pk
+    return inserted
+
+
+def bulk_create_transactions(
+    user,
+    rows: Iterable[Dict[str, Any]],
+    source: str = 'sms',
+    chunk_size: Optional[int] = None,
+) -> Tuple[List[Transaction], List[int]]:
+    """
+    Массовое идемпотентное создание транзакций.
+
+    Args:
+        user: Владелец транзакций
+        rows: Провалидированные данные транзакций (category, amount, description, type, date,
+              опционально idempotency_key или fingerprint)
+        source: Источник транзакций по умолчанию (manual/sms)
+        chunk_size: Размер пачки для одного INSERT
+
+    Returns:
+        (созданные транзакции, индексы строк-дублей во входном списке)
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    objs = []
+    positions = []
+    duplicates = []
+    seen = set()
+
+    for index, row in enumerate(rows):
+        fingerprint = build_fingerprint(user.id, row)
+        # Дубли внутри самой пачки отсекаем сразу
+        if fingerprint in seen:
+            duplicates.append(index)
+            continue
+        seen.add(fingerprint)
+
+        data = {key: value for key, value in row.items() if key not in ('idempotency_key', 'fingerprint')}
+        data.setdefault('source', source)
+        objs.append(Transaction(user=user, fingerprint=fingerprint, **data))
+        positions.append(index)
+
+    if not objs:
+        return [], duplicates
+
+    created = []
+    with db_transaction.atomic():
+        inserted_ids = {}
+        for start in range(0, len(objs), chunk_size):
+            chunk = objs[start:start + chunk_size]
+            if _supports_insert_returning():
+                inserted_ids.update(_insert_returning(chunk))
+            else:
+                inserted_ids.update(_insert_one_by_one(chunk))
+
+        for index, obj in zip(positions, objs):
+            obj_id = inserted_ids.get(obj.fingerprint)
+            if obj_id is None:
+                duplicates.append(index)
+                continue
+            obj.pk = obj_id
+            obj._state.adding = False
+            created.append(obj)
+
+        # Агрегаты, баланс и версия фиксируются вместе со строками
+        if created:
+            refresh_transactions_days(created)
+            add_transactions_to_balance(created)
+            bump_data_version(user.id)
+
+    duplicates.sort()
+    return created, duplicates
@@ -1,10 +1,18 @@
 """
 Сервис для автоматической категоризации транзакций.
-Использует ключевые слова для определения категории.
+Сначала проверяются выученные правила пользователя (продавец -> категория),
+затем ключевые слова для определения категории.
 """
 
-from typing import Optional
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from django.utils import timezone
+from apps.analytics.services.rollups import refresh_user_days, transaction_day
 from apps.categories.models import Category
+from apps.categories.services.merchant_rules import get_user_rules, match_rules, match_user_category
+from apps.categories.services.system_categories import system_category_cache
+from apps.core.services.data_version import bump_data_version
+from apps.transactions.models import Transaction
 
 
 # Словарь ключевых слов для категорий
@@ -60,42 +68,148 @@ CATEGORY_KEYWORDS = {
 }
 
 
-def suggest_category(description: str, transaction_type: str = 'expense') -> Optional[Category]:
+class KeywordMatcher:
+    """
+    Автомат для поиска ключевых слов категорий за один проход по описанию.
+
+    Для каждого типа транзакции все ключевые слова собираются в одно регулярное
+    выражение-альтернацию внутри lookahead, поэтому находятся совпадения,
+    начинающиеся в каждой позиции описания (включая перекрывающиеся).
+    Альтернативы упорядочены по приоритету категории (порядок в CATEGORY_KEYWORDS),
+    затем по длине ключевого слова, и побеждает совпадение категории
+    с наивысшим приоритетом - то же правило, что и у прежнего перебора.
+    """
+
+    def __init__(self, category_keywords: Dict[str, Dict[str, Any]]):
+        self._patterns = {}
+        self._keywords = {}
+
+        by_type = {}
+        for priority, (category_name, data) in enumerate(category_keywords.items()):
+            keywords = self._keywords.setdefault(data['type'], {})
+            for keyword in data['keywords']:
+                keyword = keyword.lower()
+                if keyword and keyword not in keywords:
+                    keywords[keyword] = (priority, category_name)
+                    by_type.setdefault(data['type'], []).append(keyword)
+
+        for transaction_type, keywords in by_type.items():
+            ordered = sorted(keywords, key=lambda kw: (self._keywords[transaction_type][kw][0], -len(kw)))
+            self._patterns[transaction_type] = re.compile(
+                '(?=(' + '|'.join(re.escape(keyword) for keyword in ordered) + '))'
+            )
+
+    def match(self, description: str, transaction_type: str) -> Optional[str]:
+        """Возвращает название категории с наивысшим приоритетом среди найденных ключевых слов."""
+        pattern = self._patterns.get(transaction_type)
+        if pattern is None or not description:
+            return None
+
+        keywords = self._keywords[transaction_type]
+        best = None
+        for match in pattern.finditer(description.lower()):
+            hit = keywords[match.group(1)]
+            if best is None or hit[0] < best[0]:
+                best = hit
+                if best[0] == 0:
+                    break
+        return best[1] if best else None
+
+
+_keyword_matcher = KeywordMatcher(CATEGORY_KEYWORDS)
+
+
+def match_category_name(description: str, transaction_type: str = 'expense') -> Optional[str]:
+    """
+    Найти название категории по ключевым словам (без запросов к БД).
+
+    Args:
+        description: Описание транзакции
+        transaction_type: Тип транзакции (expense/income)
+
+    Returns:
+        Название категории из CATEGORY_KEYWORDS или None
+    """
+    return _keyword_matcher.match(description, transaction_type)
+
+
+def get_system_category(category_name: str, transaction_type: str) -> Category:
+    """
+    Ищет системную категорию или создаёт её.
+    Поиск идёт по кэшу системных категорий процесса, запрос к БД нужен только при создании.
+    """
+    category = system_category_cache.get(category_name, transaction_type)
+    if category is not None:
+        return category
+
+    category, created = Category.objects.get_or_create(
+        name=category_name,
+        type=transaction_type,
+        is_system=True,
+        defaults={
+            'icon': get_default_icon(category_name),
+            'color': get_default_color(category_name)
+        }
+    )
+    return category
+
+
+def suggest_category(description: str, transaction_type: str = 'expense', user=None) -> Optional[Category]:
     """
     Предложить категорию на основе описания транзакции.
     
     Args:
         description: Описание транзакции
         transaction_type: Тип транзакции (expense/income)
+        user: Пользователь - если передан, сначала проверяются его правила
     
     Returns:
         Category или None
     """
-    if not description:
+    if user is not None:
+        category = match_user_category(user.id, description, transaction_type)
+        if category is not None:
+            return category
+
+    category_name = match_category_name(description, transaction_type)
+    if not category_name:
         return None
-    
-    description_lower = description.lower()
-    
-    for category_name, data in CATEGORY_KEYWORDS.items():
-        # Пропускаем категории с неподходящим типом
-        if data['type'] != transaction_type:
+    return get_system_category(category_name, transaction_type)
+
+
+def suggest_categories(items: List[Tuple[str, str]], user=None) -> List[Optional[Category]]:
+    """
+    Массовый подбор категорий.
+    Описания сопоставляются в памяти, категории берутся из кэша правил пользователя
+    и кэша системных категорий.
+
+    Args:
+        items: Список пар (описание, тип транзакции)
+        user: Пользователь - если передан, сначала проверяются его правила
+
+    Returns:
+        Список Category или None в том же порядке
+    """
+    categories = {}
+    result = []
+    # Правила пользователя читаются один раз на пачку
+    rules = get_user_rules(user.id) if user is not None and items else None
+    for description, transaction_type in items:
+        if rules is not None:
+            category = match_rules(rules, description, transaction_type)
+            if category is not None:
+                result.append(category)
+                continue
+
+        category_name = match_category_name(description, transaction_type)
+        if not category_name:
+            result.append(None)
             continue
-        
-        for keyword in data['keywords']:
-            if keyword.lower() in description_lower:
-                # Ищем системную категорию или создаём
-                category, created = Category.objects.get_or_create(
-                    name=category_name,
-                    type=transaction_type,
-                    defaults={
-                        'is_system': True,
-                        'icon': get_default_icon(category_name),
-                        'color': get_default_color(category_name)
-                    }
-                )
-                return category
-    
-    return None
+        key = (category_name, transaction_type)
+        if key not in categories:
+            categories[key] = get_system_category(category_name, transaction_type)
+        result.append(categories[key])
+    return result
 
 
 def get_default_icon(category_name: str) -> str:
@@ -132,6 +246,81 @@ def get_default_color(category_name: str) -> str:
     return colors.get(category_name, '#9E9E9E')
 
 
+def recategorize_transactions(transactions_queryset, chunk_size: int = 2000, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Массовая категоризация транзакций без категории.
+
+    Для каждой транзакции сначала проверяются правила её владельца, затем ключевые слова.
+    Читает только id/user_id/description/type пачками по возрастанию id (keyset, без OFFSET),
+    сопоставляет описания в памяти и записывает результат одним
+    UPDATE ... WHERE id IN (...) на каждую категорию пачки.
+
+    Args:
+        transactions_queryset: QuerySet транзакций (будут обработаны только строки без категории)
+        chunk_size: Размер пачки чтения/записи
+        dry_run: Только посчитать, сколько транзакций получит категорию
+
+    Returns:
+        {'scanned': int, 'categorized': int, 'by_category': {название: количество}}
+    """
+    queryset = transactions_queryset.filter(category__isnull=True).exclude(
+        description__isnull=True
+    ).exclude(description='').order_by('id')
+
+    scanned = 0
+    categorized = 0
+    by_category = {}
+    last_id = 0
+
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id).values_list('id', 'user_id', 'description', 'type', 'date')[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        scanned += len(rows)
+
+        # Ключ - выученная категория пользователя либо (название, тип) системной категории
+        ids_by_category = {}
+        days_by_user = {}
+        rules_by_user = {user_id: get_user_rules(user_id) for user_id in {row[1] for row in rows}}
+        for transaction_id, user_id, description, transaction_type, date in rows:
+            key = match_rules(rules_by_user[user_id], description, transaction_type)
+            if key is None:
+                category_name = match_category_name(description, transaction_type)
+                if not category_name:
+                    continue
+                key = (category_name, transaction_type)
+            ids_by_category.setdefault(key, []).append(transaction_id)
+            days_by_user.setdefault(user_id, set()).add(transaction_day(date))
+
+        for key, ids in ids_by_category.items():
+            category_name = key.name if isinstance(key, Category) else key[0]
+            if dry_run:
+                updated = len(ids)
+            else:
+                category = key if isinstance(key, Category) else get_system_category(*key)
+                # category__isnull повторно - чтобы не перезаписать категорию, которую
+                # пользователь успел выставить вручную между чтением и записью
+                updated = Transaction.objects.filter(id__in=ids, category__isnull=True).update(
+                    category_id=category.id,
+                    is_ai_parsed=True,
+                    updated_at=timezone.now(),
+                )
+            categorized += updated
+            by_category[category_name] = by_category.get(category_name, 0) + updated
+
+        # update() не шлёт сигналы - пересчитываем дневные агрегаты затронутых дней
+        # и обновляем версию данных пользователей
+        if not dry_run:
+            for user_id, days in days_by_user.items():
+                refresh_user_days(user_id, days)
+                bump_data_version(user_id)
+
+    return {'scanned': scanned, 'categorized': categorized, 'by_category': by_category}
+
+
 def categorize_transactions(transactions_queryset):
     """
     Массовая категоризация транзакций.
@@ -142,13 +331,4 @@ def categorize_transactions(transactions_queryset):
     Returns:
         Количество категоризированных транзакций
     """
-    count = 0
-    for transaction in transactions_queryset:
-        if not transaction.category and transaction.description:
-            category = suggest_category(transaction.description, transaction.type)
-            if category:
-                transaction.category = category
-                transaction.is_ai_parsed = True
-                transaction.save(update_fields=['category', 'is_ai_parsed'])
-                count += 1
-    return count
+    return recategorize_transactions(transactions_queryset)['categorized']
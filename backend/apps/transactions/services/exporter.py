@@ -0,0 +1,197 @@
+"""
+Потоковый экспорт транзакций пользователя (CSV, JSON Lines, Parquet).
+
+Строки читаются из БД серверным курсором (values_list().iterator()) и сразу
+кодируются кусками - ни queryset, ни сериализованный список целиком в памяти
+не собираются, расход памяти не зависит от размера истории.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+from django.conf import settings
+from apps.transactions.models import Transaction
+
+EXPORT_FORMATS = ('csv', 'jsonl', 'parquet')
+
+EXPORT_FIELDS = ['id', 'date', 'type', 'amount', 'description', 'source', 'category_id']
+CATEGORY_FIELDS = ['category__name']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ExportFormatError(ValueError):
+    """Формат экспорта не поддерживается (или не установлена нужная библиотека)."""
+
+
+def get_chunk_size() -> int:
+    """Сколько строк читается из курсора и кодируется за раз."""
+    return max(1, getattr(settings, 'TRANSACTIONS_EXPORT_CHUNK_SIZE', 2000))
+
+
+def export_columns(with_category: bool = False) -> List[str]:
+    """Названия колонок выгрузки."""
+    columns = list(EXPORT_FIELDS)
+    if with_category:
+        columns.append('category_name')
+    return columns
+
+
+def export_rows(user, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                with_category: bool = False) -> Iterator[tuple]:
+    """Кортежи транзакций пользователя по возрастанию даты (серверный курсор)."""
+    queryset = Transaction.objects.filter(user=user)
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+
+    fields = EXPORT_FIELDS + CATEGORY_FIELDS if with_category else EXPORT_FIELDS
+    # LEFT JOIN categories только при запросе названий категорий
+    return queryset.order_by('date', 'id').values_list(*fields).iterator(chunk_size=get_chunk_size())
+
+
+def _chunks(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows: Iterable[tuple], columns: Sequence[str]) -> Iterator[bytes]:
+    """CSV с заголовком; BOM в начале - чтобы Excel открыл кириллицу."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+
+    for chunk in _chunks(rows, get_chunk_size()):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_json_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_jsonl(rows: Iterable[tuple], columns: Sequence[str]) -> Iterator[bytes]:
+    """Один JSON-объект на строку."""
+    for chunk in _chunks(rows, get_chunk_size()):
+        yield ''.join(
+            json.dumps(
+                {column: _json_value(value) for column, value in zip(columns, row)},
+                ensure_ascii=False,
+            ) + '\n'
+            for row in chunk
+        ).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл только на запись: накопленные байты забираются после каждой группы строк."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def iter_parquet(rows: Iterable[tuple], columns: Sequence[str]) -> Iterator[bytes]:
+    """Parquet: каждая пачка строк - отдельная row group, отдаётся сразу после записи."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportFormatError('Экспорт в Parquet недоступен: не установлен pyarrow')
+
+    types = {
+        'id': pa.int64(),
+        'date': pa.timestamp('us', tz='UTC'),
+        'type': pa.string(),
+        'amount': pa.decimal128(15, 2),
+        'description': pa.string(),
+        'source': pa.string(),
+        'category_id': pa.int64(),
+        'category_name': pa.string(),
+    }
+    schema = pa.schema([(column, types[column]) for column in columns])
+
+    def generate():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+        try:
+            for chunk in _chunks(rows, get_chunk_size()):
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=schema.field(index).type) for index, values in enumerate(zip(*chunk))],
+                    schema=schema,
+                ))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Сжимает поток кусков в gzip на лету."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(rows: Iterable[tuple], export_format: str, columns: Sequence[str],
+                  gzip: bool = False) -> Iterator[bytes]:
+    """
+    Поток байтов выгрузки.
+
+    Raises:
+        ExportFormatError: неизвестный формат или нет pyarrow для Parquet
+            (проверяется до чтения первой строки)
+    """
+    if export_format == 'csv':
+        stream = iter_csv(rows, columns)
+    elif export_format == 'jsonl':
+        stream = iter_jsonl(rows, columns)
+    elif export_format == 'parquet':
+        stream = iter_parquet(rows, columns)
+    else:
+        raise ExportFormatError(f'Неизвестный формат экспорта: {export_format}')
+    return iter_gzip(stream) if gzip else stream
@@ -0,0 +1,82 @@
+"""
+Отпечатки транзакций для идемпотентной загрузки.
+Отпечаток хранится в Transaction.fingerprint и защищён уникальным индексом (user, fingerprint),
+поэтому повторная вставка той же транзакции становится no-op (ON CONFLICT DO NOTHING).
+"""
+
+import hashlib
+import re
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from typing import Any, Optional
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_description(description: Optional[str]) -> str:
+    """Нормализует описание: нижний регистр, схлопнутые пробелы."""
+    if not description:
+        return ''
+    return _WHITESPACE_RE.sub(' ', description).strip().lower()
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _normalize_amount(amount: Any) -> str:
+    return str(Decimal(str(amount)).quantize(Decimal('0.01')))
+
+
+def _normalize_date(date: Any) -> str:
+    if isinstance(date, datetime):
+        if date.tzinfo is not None:
+            date = date.astimezone(dt_timezone.utc)
+        return date.replace(tzinfo=None).isoformat()
+    return str(date)
+
+
+def idempotency_fingerprint(user_id: int, key: str) -> str:
+    """Отпечаток по ключу идемпотентности, переданному клиентом."""
+    return _digest('key', user_id, key.strip())
+
+
+def content_fingerprint(user_id: int, amount: Any, date: Any, description: Optional[str],
+                        transaction_type: str = 'expense') -> str:
+    """Отпечаток по содержимому: пользователь + сумма + дата + нормализованное описание."""
+    return _digest(
+        'content',
+        user_id,
+        transaction_type,
+        _normalize_amount(amount),
+        _normalize_date(date),
+        normalize_description(description),
+    )
+
+
+def sms_fingerprint(user_id: int, sms_text: str, date: Any) -> str:
+    """
+    Отпечаток SMS: текст и время получения SMS на устройстве (передаёт клиент).
+    Повтор той же SMS совпадёт, а одинаковые SMS в разное время (ежемесячная
+    подписка, один и тот же перевод дважды) останутся разными транзакциями.
+    """
+    return _digest('sms', user_id, normalize_description(sms_text), _normalize_date(date))
+
+
+def statement_fingerprint(user_id: int, amount: Any, date: Any, description: Optional[str],
+                          transaction_type: str = 'expense', fitid: Optional[str] = None,
+                          account: Optional[str] = None, occurrence: int = 0) -> str:
+    """
+    Отпечаток строки банковской выписки.
+    OFX даёт банковский id операции (FITID) - он уникален в пределах счёта.
+    Для CSV берётся отпечаток содержимого, поэтому строка совпадёт и с той же
+    транзакцией, загруженной вручную; одинаковые строки одного дня различаются
+    порядковым номером occurrence.
+    """
+    if fitid:
+        return _digest('statement', user_id, account or '', fitid.strip())
+    fingerprint = content_fingerprint(user_id, amount, date, description, transaction_type)
+    if occurrence:
+        return _digest(fingerprint, occurrence)
+    return fingerprint
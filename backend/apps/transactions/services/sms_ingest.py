@@ -0,0 +1,112 @@
+"""
+Сервис пакетной загрузки SMS.
+Парсит пачку SMS за один проход, подбирает категории одним запросом
+и записывает транзакции через массовую идемпотентную вставку.
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.transactions.services.bulk_writer import bulk_create_transactions
+from apps.transactions.services.category_suggester import suggest_categories
+from apps.transactions.services.fingerprint import idempotency_fingerprint, sms_fingerprint
+from apps.transactions.services.sms_parser import parse_sms_batch
+
+
+DATE_ONLY_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _aware(date: datetime) -> datetime:
+    return timezone.make_aware(date) if timezone.is_naive(date) else date
+
+
+def parse_client_date(value: Any) -> Optional[datetime]:
+    """
+    Время получения SMS, переданное клиентом (datetime или строка ISO 8601).
+    Пустое значение - None. Дата без времени или нераспознанная строка - ValueError:
+    по ней нельзя отличить повтор SMS от новой SMS с тем же текстом.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return _aware(value)
+    if not isinstance(value, str) or DATE_ONLY_RE.fullmatch(value.strip()):
+        raise ValueError(f'Некорректное время SMS: {value!r}')
+    date = parse_datetime(value.strip())
+    if date is None:
+        raise ValueError(f'Некорректное время SMS: {value!r}')
+    return _aware(date)
+
+
+def save_parsed_sms(user, messages: List[Dict[str, Any]], parsed: List[Optional[Dict[str, Any]]],
+                    chunk_size: Optional[int] = None) -> Dict[str, list]:
+    """
+    Сохраняет уже распарсенные SMS.
+
+    Args:
+        user: Владелец транзакций
+        messages: Исходные SMS [{'text', 'phone', 'date', 'idempotency_key'}, ...].
+            Повтор SMS распознаётся по idempotency_key или по тексту и date;
+            без них каждая SMS записывается как новая транзакция
+        parsed: Результаты parse_sms для каждой SMS (None - не распознана)
+        chunk_size: Размер пачки для одного INSERT
+
+    Returns:
+        {'accepted': [{'index', 'id'}], 'rejected': [index], 'duplicates': [index]}
+        В rejected - нераспознанные SMS и SMS с некорректным date (в том числе без времени).
+    """
+    rejected = []
+    indexes = []
+    rows = []
+
+    for index, (message, parsed_data) in enumerate(zip(messages, parsed)):
+        try:
+            client_date = parse_client_date(message.get('date'))
+        except ValueError:
+            rejected.append(index)
+            continue
+        if not parsed_data:
+            rejected.append(index)
+            continue
+
+        idempotency_key = message.get('idempotency_key')
+        row = {
+            'amount': parsed_data['amount'],
+            'description': parsed_data['description'],
+            'type': parsed_data['type'],
+            'date': client_date or _aware(parsed_data['date']),
+        }
+        if idempotency_key:
+            row['fingerprint'] = idempotency_fingerprint(user.id, str(idempotency_key))
+        elif client_date:
+            row['fingerprint'] = sms_fingerprint(user.id, message.get('text') or '', client_date)
+        indexes.append(index)
+        rows.append(row)
+
+    categories = suggest_categories([(row['description'], row['type']) for row in rows], user=user)
+    for row, category in zip(rows, categories):
+        row['category'] = category
+        row['is_ai_parsed'] = bool(category)
+
+    created, duplicates = bulk_create_transactions(user, rows, source='sms', chunk_size=chunk_size)
+    duplicate_positions = set(duplicates)
+
+    accepted = []
+    created_iter = iter(created)
+    for position, index in enumerate(indexes):
+        if position in duplicate_positions:
+            continue
+        accepted.append({'index': index, 'id': next(created_iter).id})
+
+    return {
+        'accepted': accepted,
+        'rejected': rejected,
+        'duplicates': [indexes[position] for position in duplicates],
+    }
+
+
+def ingest_sms_batch(user, messages: List[Dict[str, Any]], chunk_size: Optional[int] = None) -> Dict[str, list]:
+    """Парсит и сохраняет пачку SMS."""
+    return save_parsed_sms(user, messages, parse_sms_batch(messages), chunk_size=chunk_size)
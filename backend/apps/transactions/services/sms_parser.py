@@ -1,51 +1,351 @@
 """
 Сервис для парсинга SMS от банков.
 Поддерживает основные банки России: Сбербанк, Тинькофф, Альфа-Банк.
+Шаблоны банков хранятся в data/bank_templates.json и перечитываются без перезапуска.
 """
 
+import json
+import logging
 import re
+import threading
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any
-
-
-# Паттерны для основных банков России
-BANK_PATTERNS = {
-    'sberbank': {
-        'phone': ['900', '+79000000900', '79000000900'],
-        'patterns': [
-            # "Pokupka 1500.00 RUB. Karta *1234. Magazit 'Produkti'. Ost. 25000.00 RUB"
-            r'(?:Pokupka|Списание)\s+([\d\s]+\.?\d*)\s*(?:RUB|₽|rub|руб).*?(?:карт[аы]\s?\*?(\d{4}))?.*?(?:Магазин|в|M)\s*[\'"]?([^\'".]+)',
-            # "1500.00 RUB списано с карты *5678 в магазине PYATEROCHKA"
-            r'([\d\s]+\.?\d*)\s*(?:RUB|₽|руб)\s+(?:списано|зачислено).*?карт[аы]\s?\*?(\d{4}).*?(?:в\s+)?([^.\n]+)',
-            # "Card *9876: 3500 RUB. Berezka. Balance: 15000 RUB"
-            r'Card\s+\*(\d{4}).*?([\d\s]+\.?\d*)\s*(?:RUB|₽|руб).*?([A-Za-zА-Яа-я0-9\s]+)\. Balance',
-        ]
-    },
-    'tinkoff': {
-        'phone': ['+79991234567', '79991234567', '9991234567'],
-        'patterns': [
-            r'([\d\s]+\.?\d*)\s*(?:RUB|₽|руб)\s+списано с карты \*(\d{4}).*?в\s+([^.\n]+)',
-            r'([\d\s]+\.?\d*)\s*(?:RUB|₽|руб)\s+зачислено.*?(?:с\s+)?([^.\n]+)',
-            r'Card \*(\d{4}):.*?([\d\s]+\.?\d*)\s*(?:RUB|₽|руб).*?([^.\n]+)',
-        ]
-    },
-    'alfa': {
-        'phone': ['+79991234567', '79991234567', 'ALFA', 'ALPHA'],
-        'patterns': [
-            r'([\d\s]+\.?\d*)\s*(?:RUB|₽|руб).*(?:Списано|Зачислено).*?(?:в\s+)?([^.\n]+)',
-            r'Card \*(\d{4}).*?([\d\s]+\.?\d*)\s*(?:RUB|₽|руб).*?([^.\n]+)',
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Шаблоны банков: phone - номера отправителей, keywords - маркеры банка в тексте SMS,
+# patterns[].triggers - подстроки (в нижнем регистре), хотя бы одна из которых обязательна
+# для совпадения regex: без них паттерн даже не запускается; samples - примеры SMS для self-test.
+DEFAULT_TEMPLATES_PATH = Path(__file__).resolve().parent.parent / 'data' / 'bank_templates.json'
+
+
+INCOME_WORDS = ('зачислено', 'поступление', 'пополнение', 'перевод вам', 'credited', 'deposit')
+
+DESCRIPTION_FALLBACK_RE = re.compile(r'[\d\.]+\s*(?:RUB|₽|руб)[^.\n]*[.:\n]\s*([^.\n]+)', re.IGNORECASE)
+
+
+def _clean_phone(phone: str) -> str:
+    return phone.replace('+', '').replace(' ', '').replace('-', '')
+
+
+class CompiledPattern:
+    """Скомпилированный паттерн банка со счётчиками срабатываний."""
+    __slots__ = ('bank', 'index', 'regex', 'triggers', 'hits', 'misses', 'skipped')
+
+    def __init__(self, bank: str, index: int, regex: str, triggers: List[str]):
+        self.bank = bank
+        self.index = index
+        self.regex = re.compile(regex, re.IGNORECASE | re.MULTILINE)
+        self.triggers = tuple(trigger.lower() for trigger in triggers)
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def may_match(self, sms_lower: str) -> bool:
+        """Дешёвая проверка: есть ли в тексте хотя бы одна обязательная подстрока."""
+        return not self.triggers or any(trigger in sms_lower for trigger in self.triggers)
+
+
+class BankTemplateError(Exception):
+    """Ошибка загрузки шаблонов банков (невалидный файл, regex или проваленный self-test)."""
+
+
+class PatternRegistry:
+    """
+    Реестр паттернов, собираемый из шаблонов банков один раз при загрузке:
+    - скомпилированные регулярные выражения;
+    - таблица номер отправителя -> банк (поиск по суффиксам фиксированной длины);
+    - маркеры банков в тексте и обязательные подстроки паттернов,
+      отсекающие заведомо неподходящие банки до запуска regex.
+
+    Шаблон банка: {'name', 'priority', 'phone', 'keywords', 'patterns': [{'regex', 'triggers'}], 'samples'}.
+    Банки применяются в порядке убывания priority, шаблон 'default' - всегда последним.
+    """
+
+    def __init__(self, banks: List[Dict[str, Any]], version: Any = None):
+        self.version = version
+        banks = sorted(banks, key=lambda bank: -bank.get('priority', 0))
+        self.bank_order = [bank['name'] for bank in banks if bank['name'] != 'default']
+        self.samples = [
+            (bank['name'], sample)
+            for bank in banks
+            for sample in bank.get('samples', [])
         ]
-    },
-    'default': {
-        'phone': [],
-        'patterns': [
-            # Универсальный паттерн для суммы
-            r'([\d\s]+\.?\d*)\s*(?:RUB|₽|rub|руб)',
-            # Универсальный паттерн для описания
-            r'(?:в\s+|Card\s+\*\d{4}.*?)([A-Za-zА-Яа-я0-9\s\'"]{3,})',
+        try:
+            self.patterns = {
+                bank['name']: [
+                    CompiledPattern(bank['name'], index, pattern['regex'], pattern.get('triggers', []))
+                    for index, pattern in enumerate(bank['patterns'])
+                ]
+                for bank in banks
+            }
+        except re.error as e:
+            raise BankTemplateError(f'Невалидное регулярное выражение: {e}') from e
+        self.keywords = [
+            (bank['name'], tuple(keyword.lower() for keyword in bank.get('keywords', [])))
+            for bank in banks
+            if bank['name'] != 'default'
         ]
-    }
-}
+
+        # Номер банка совпадает, если номер отправителя оканчивается на последние 10 символов
+        # номера из списка. При конфликте побеждает банк с большим приоритетом.
+        self.phone_index = {}
+        for bank in banks:
+            if bank['name'] == 'default':
+                continue
+            for phone in bank.get('phone', []):
+                suffix = _clean_phone(phone)[-10:]
+                if suffix:
+                    self.phone_index.setdefault(suffix, bank['name'])
+        self.suffix_lengths = sorted({len(suffix) for suffix in self.phone_index})
+        self._priority = {name: position for position, name in enumerate(self.bank_order)}
+        self._lock = threading.Lock()
+
+    def bank_by_phone(self, bank_phone: Optional[str]) -> Optional[str]:
+        """Определяет банк по номеру отправителя за O(число различных длин номеров)."""
+        if not bank_phone:
+            return None
+        phone = _clean_phone(bank_phone)
+        found = None
+        for length in self.suffix_lengths:
+            if len(phone) < length:
+                break
+            name = self.phone_index.get(phone[-length:])
+            if name and (found is None or self._priority[name] < self._priority[found]):
+                found = name
+        return found
+
+    def bank_by_text(self, sms_lower: str) -> Optional[str]:
+        """Определяет банк по маркерам в тексте SMS."""
+        for name, keywords in self.keywords:
+            if any(keyword in sms_lower for keyword in keywords):
+                return name
+        return None
+
+    def candidate_patterns(self, sms_lower: str, bank_name: Optional[str]):
+        """
+        Паттерны в порядке применения: банк (или все банки, если он не определён),
+        затем default. Паттерны без обязательных подстрок в тексте пропускаются.
+        """
+        banks = [bank_name] if bank_name else self.bank_order
+        if 'default' not in banks:
+            banks = [*banks, 'default']
+
+        for bank in banks:
+            for pattern in self.patterns.get(bank, ()):
+                if pattern.may_match(sms_lower):
+                    yield pattern
+                else:
+                    self._count(pattern, 'skipped')
+
+    def _count(self, pattern: CompiledPattern, counter: str):
+        with self._lock:
+            setattr(pattern, counter, getattr(pattern, counter) + 1)
+
+    def record(self, pattern: CompiledPattern, hit: bool):
+        self._count(pattern, 'hits' if hit else 'misses')
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Счётчики паттернов: hits - успешный разбор, misses - regex не подошёл, skipped - отсечён фильтром."""
+        with self._lock:
+            return [
+                {
+                    'bank': pattern.bank,
+                    'pattern': pattern.index,
+                    'hits': pattern.hits,
+                    'misses': pattern.misses,
+                    'skipped': pattern.skipped,
+                }
+                for patterns in self.patterns.values()
+                for pattern in patterns
+            ]
+
+    def reset_stats(self):
+        with self._lock:
+            for patterns in self.patterns.values():
+                for pattern in patterns:
+                    pattern.hits = pattern.misses = pattern.skipped = 0
+
+    def parse(self, sms_text: str, bank_phone: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Разбор SMS паттернами реестра (см. parse_sms)."""
+        sms_text = sms_text.strip()
+        sms_lower = sms_text.lower()
+
+        # Определяем банк по номеру телефона, затем по ключевым словам в тексте
+        bank_name = self.bank_by_phone(bank_phone) or self.bank_by_text(sms_lower)
+
+        for pattern in self.candidate_patterns(sms_lower, bank_name):
+            match = pattern.regex.search(sms_text)
+            if not match:
+                self.record(pattern, hit=False)
+                continue
+
+            # Пытаемся найти сумму в группах
+            amount = None
+            description = None
+
+            for group in match.groups():
+                if group is None:
+                    continue
+                # Проверяем, похоже ли на сумму
+                cleaned = group.replace(' ', '').replace(',', '.')
+                try:
+                    potential_amount = float(cleaned)
+                    if amount is None and potential_amount > 0:
+                        amount = potential_amount
+                except ValueError:
+                    # Если не число, то это описание
+                    if description is None and len(group.strip()) > 2:
+                        description = group.strip()
+
+            if amount is None:
+                self.record(pattern, hit=False)
+                continue
+            self.record(pattern, hit=True)
+
+            # Определяем тип транзакции
+            type_ = 'expense'
+            if any(word in sms_lower for word in INCOME_WORDS):
+                type_ = 'income'
+
+            # Если описание не найдено, берём часть текста
+            if not description:
+                # Извлекаем текст после суммы
+                desc_match = DESCRIPTION_FALLBACK_RE.search(sms_text)
+                if desc_match:
+                    description = desc_match.group(1).strip()
+                else:
+                    description = sms_text[:50]
+
+            return {
+                'amount': amount,
+                'type': type_,
+                'description': description,
+                'date': datetime.now(),
+                'bank': pattern.bank
+            }
+
+        return None
+
+    def self_test(self) -> List[str]:
+        """Прогоняет примеры SMS из шаблонов. Возвращает список ошибок (пустой - всё в порядке)."""
+        errors = []
+        for bank, sample in self.samples:
+            result = self.parse(sample['text'], sample.get('phone'))
+            if result is None:
+                errors.append(f'{bank}: не распознана SMS "{sample["text"]}"')
+                continue
+            for field, expected in sample.get('expect', {}).items():
+                if result.get(field) != expected:
+                    errors.append(
+                        f'{bank}: "{sample["text"]}" - {field}={result.get(field)!r}, ожидалось {expected!r}'
+                    )
+        self.reset_stats()
+        return errors
+
+
+def load_registry(path: Optional[Path] = None) -> PatternRegistry:
+    """
+    Загружает шаблоны банков из JSON-файла и собирает реестр.
+    Реестр возвращается только если все примеры SMS из шаблонов распознаются как ожидается.
+    """
+    path = Path(path or getattr(settings, 'SMS_BANK_TEMPLATES_PATH', DEFAULT_TEMPLATES_PATH))
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        registry = PatternRegistry(data['banks'], version=data.get('version'))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise BankTemplateError(f'Не удалось загрузить шаблоны банков из {path}: {e}') from e
+
+    errors = registry.self_test()
+    if errors:
+        raise BankTemplateError(
+            f'Шаблоны банков {path} (версия {registry.version}) не прошли проверку: ' + '; '.join(errors)
+        )
+    return registry
+
+
+class _RegistryHolder:
+    """
+    Текущий реестр процесса с горячей перезагрузкой.
+    Не чаще раза в SMS_TEMPLATES_RELOAD_INTERVAL секунд проверяет mtime файла шаблонов;
+    новый реестр подменяет старый одним присваиванием, только если прошёл self-test,
+    поэтому gunicorn-воркеры подхватывают исправленные шаблоны без перезапуска.
+    """
+
+    def __init__(self):
+        self.registry = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _templates_path(self) -> Path:
+        return Path(getattr(settings, 'SMS_BANK_TEMPLATES_PATH', DEFAULT_TEMPLATES_PATH))
+
+    def get(self) -> PatternRegistry:
+        registry = self.registry
+        interval = getattr(settings, 'SMS_TEMPLATES_RELOAD_INTERVAL', 30)
+        if registry is not None and time.monotonic() - self._checked_at < interval:
+            return registry
+
+        with self._lock:
+            if self.registry is not None and time.monotonic() - self._checked_at < interval:
+                return self.registry
+            self._checked_at = time.monotonic()
+            path = self._templates_path()
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                mtime = None
+            if self.registry is None or mtime != self._mtime:
+                self._mtime = mtime
+                self._reload(path)
+            return self.registry
+
+    def _reload(self, path: Path):
+        try:
+            registry = load_registry(path)
+        except BankTemplateError as e:
+            if self.registry is None:
+                raise
+            logger.error('%s. Остаётся версия %s', e, self.registry.version)
+            return
+        if self.registry is not None:
+            logger.info('Шаблоны банков обновлены: версия %s -> %s', self.registry.version, registry.version)
+        self.registry = registry
+
+    def reload(self) -> PatternRegistry:
+        """Принудительная перезагрузка (при ошибке остаётся текущий реестр)."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            path = self._templates_path()
+            try:
+                self._mtime = path.stat().st_mtime
+            except OSError:
+                self._mtime = None
+            self._reload(path)
+            return self.registry
+
+
+_holder = _RegistryHolder()
+
+
+def get_registry() -> PatternRegistry:
+    """Текущий реестр паттернов (с проверкой обновления файла шаблонов)."""
+    return _holder.get()
+
+
+def reload_registry() -> PatternRegistry:
+    """Перечитать файл шаблонов банков немедленно."""
+    return _holder.reload()
+
+
+def get_pattern_stats() -> List[Dict[str, Any]]:
+    """Счётчики срабатываний паттернов текущего процесса."""
+    return get_registry().stats()
 
 
 def parse_sms(sms_text: str, bank_phone: Optional[str] = None) -> Optional[Dict[str, Any]]:
@@ -60,97 +360,7 @@ def parse_sms(sms_text: str, bank_phone: Optional[str] = None) -> Optional[Dict[
         Dict с полями: amount, type, description, date, bank
         или None если не удалось распарсить
     """
-    sms_text = sms_text.strip()
-    
-    # Определяем банк по номеру телефона
-    bank_name = None
-    if bank_phone:
-        bank_phone_clean = bank_phone.replace('+', '').replace(' ', '').replace('-', '')
-        for name, data in BANK_PATTERNS.items():
-            if name == 'default':
-                continue
-            for phone in data['phone']:
-                phone_clean = phone.replace('+', '').replace(' ', '').replace('-', '')
-                if bank_phone_clean == phone_clean or bank_phone_clean.endswith(phone_clean[-10:]):
-                    bank_name = name
-                    break
-            if bank_name:
-                break
-    
-    # Если банк не найден по номеру, пробуем найти по ключевым словам в тексте
-    if not bank_name:
-        sms_lower = sms_text.lower()
-        if 'sber' in sms_lower or 'сбер' in sms_lower or '900' in sms_text:
-            bank_name = 'sberbank'
-        elif 'tinkoff' in sms_lower or 'тинькофф' in sms_lower:
-            bank_name = 'tinkoff'
-        elif 'alfa' in sms_lower or 'альфа' in sms_lower:
-            bank_name = 'alfa'
-    
-    # Определяем, какие паттерны использовать
-    banks_to_try = [bank_name] if bank_name else list(BANK_PATTERNS.keys())
-    if 'default' not in banks_to_try:
-        banks_to_try.append('default')
-    
-    for bank in banks_to_try:
-        if bank not in BANK_PATTERNS:
-            continue
-            
-        patterns = BANK_PATTERNS[bank]['patterns']
-        
-        for pattern in patterns:
-            try:
-                match = re.search(pattern, sms_text, re.IGNORECASE | re.MULTILINE)
-                if match:
-                    groups = match.groups()
-                    
-                    # Пытаемся найти сумму в группах
-                    amount = None
-                    description = None
-                    
-                    for group in groups:
-                        if group is None:
-                            continue
-                        # Проверяем, похоже ли на сумму
-                        cleaned = group.replace(' ', '').replace(',', '.')
-                        try:
-                            potential_amount = float(cleaned)
-                            if amount is None and potential_amount > 0:
-                                amount = potential_amount
-                        except ValueError:
-                            # Если не число, то это описание
-                            if description is None and len(group.strip()) > 2:
-                                description = group.strip()
-                    
-                    if amount is None:
-                        continue
-                    
-                    # Определяем тип транзакции
-                    type_ = 'expense'
-                    sms_lower = sms_text.lower()
-                    if any(word in sms_lower for word in ['зачислено', 'поступление', 'пополнение', 'перевод вам', 'credited', 'deposit']):
-                        type_ = 'income'
-                    
-                    # Если описание не найдено, берём часть текста
-                    if not description:
-                        # Извлекаем текст после суммы
-                        desc_match = re.search(r'[\d\.]+\s*(?:RUB|₽|руб)[^.\n]*[.:\n]\s*([^.\n]+)', sms_text, re.IGNORECASE)
-                        if desc_match:
-                            description = desc_match.group(1).strip()
-                        else:
-                            description = sms_text[:50]
-                    
-                    return {
-                        'amount': amount,
-                        'type': type_,
-                        'description': description,
-                        'date': datetime.now(),
-                        'bank': bank
-                    }
-            except re.error:
-                continue
-    
-    return None
+    return get_registry().parse(sms_text, bank_phone)
 
 
 def parse_sms_batch(sms_messages: list) -> list:
@@ -161,11 +371,6 @@ def parse_sms_batch(sms_messages: list) -> list:
         sms_messages: Список словарей с SMS [{'text': str, 'phone': str}, ...]
     
     Returns:
-        Список распарсенных транзакций
+        Список той же длины: распарсенная транзакция или None для нераспознанных SMS
     """
-    results = []
-    for sms in sms_messages:
-        parsed = parse_sms(sms.get('text', ''), sms.get('phone'))
-        if parsed:
-            results.append(parsed)
-    return results
+    return [parse_sms(sms.get('text') or '', sms.get('phone')) for sms in sms_messages]
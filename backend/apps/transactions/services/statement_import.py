@@ -0,0 +1,236 @@
+"""
+Импорт банковских выписок (ImportJob).
+
+Операции читаются из файла потоково (StatementReader), категоризируются
+пачкой и записываются через bulk_create_transactions пачками фиксированного
+размера. Дубли отсекаются уникальным индексом (user, fingerprint), поэтому
+повторная загрузка той же выписки ничего не создаёт.
+После каждой пачки в ImportJob пишется прогресс.
+
+Загруженные через API файлы обрабатываются в фоне: в пуле потоков процесса
+(STATEMENT_IMPORT_ASYNC=True) или командой import_statement --pending.
+Импорт, прерванный перезапуском воркера, остаётся в статусе running без прогресса;
+после STATEMENT_IMPORT_JOB_TIMEOUT он возвращается в очередь и разбирается заново -
+уже записанные строки отсекут отпечатки.
+"""
+
+import logging
+from datetime import date
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+from django.conf import settings
+from django.utils import timezone
+from apps.core.services.background import submit_on_commit
+from apps.transactions.models import ImportJob
+from apps.transactions.services.bulk_writer import bulk_create_transactions
+from apps.transactions.services.category_suggester import suggest_categories
+from apps.transactions.services.fingerprint import content_fingerprint, statement_fingerprint
+from apps.transactions.services.statement_parser import StatementFormatError, StatementReader
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FIELDS = [
+    'processed_bytes', 'rows_processed', 'created_count', 'duplicate_count', 'error_count', 'errors',
+    'updated_at',
+]
+
+
+def get_chunk_size(chunk_size: Optional[int] = None) -> int:
+    """Сколько операций категоризируется и записывается за раз."""
+    return max(1, chunk_size or getattr(settings, 'STATEMENT_IMPORT_CHUNK_SIZE', 1000))
+
+
+def get_day_window(day_window: Optional[int] = None) -> int:
+    """Сколько дней вокруг текущей операции хранятся счётчики одинаковых строк."""
+    return max(0, day_window if day_window is not None else getattr(settings, 'STATEMENT_IMPORT_DAY_WINDOW', 7))
+
+
+def _fingerprinted(user_id: int, operations, on_error: Optional[Callable[[str], None]] = None,
+                   day_window: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Проставляет отпечатки операциям выписки.
+    Одинаковые строки CSV одного дня нумеруются (occurrence). Счётчики хранятся
+    по дням, и только для дней не дальше day_window от текущей строки: выписка
+    может идти от новых к старым и перемешивать даты проведения и списания,
+    а память не должна расти с размером файла. Строку за уже вытесненный день
+    пронумеровать нельзя - она пропускается и передаётся в on_error, а не сливается
+    молча с дублем.
+    """
+    window = get_day_window(day_window)
+    counters: Dict[date, Dict[str, int]] = {}
+    evicted: Set[date] = set()
+    current_day = None
+    for operation in operations:
+        day = operation['date'].date()
+
+        occurrence = 0
+        if not operation['fitid']:
+            if day in evicted:
+                if on_error:
+                    on_error(
+                        f'Операция {day:%d.%m.%Y} {operation["amount"]} «{operation["description"]}» '
+                        f'пропущена: этот день выписки уже обработан - отсортируйте выписку по дате'
+                    )
+                continue
+
+            if day != current_day:
+                current_day = day
+                for old_day in [d for d in counters if abs((d - day).days) > window]:
+                    del counters[old_day]
+                    evicted.add(old_day)
+
+            day_counters = counters.setdefault(day, {})
+            key = content_fingerprint(
+                user_id, operation['amount'], operation['date'], operation['description'], operation['type']
+            )
+            occurrence = day_counters.get(key, 0)
+            day_counters[key] = occurrence + 1
+
+        yield {
+            'amount': operation['amount'],
+            'type': operation['type'],
+            'date': operation['date'],
+            'description': operation['description'],
+            'fingerprint': statement_fingerprint(
+                user_id,
+                operation['amount'],
+                operation['date'],
+                operation['description'],
+                operation['type'],
+                fitid=operation['fitid'],
+                account=operation['account'],
+                occurrence=occurrence,
+            ),
+        }
+
+
+def _chunks(rows, size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_statement_import(job: ImportJob, fileobj, chunk_size: Optional[int] = None,
+                         progress: Optional[Callable[[ImportJob], None]] = None) -> ImportJob:
+    """
+    Импортирует выписку из открытого (в бинарном режиме) файла.
+
+    Args:
+        job: Задача импорта (статус и счётчики обновляются по ходу)
+        fileobj: Файл выписки
+        chunk_size: Размер пачки категоризации и записи
+        progress: Вызывается после каждой записанной пачки
+
+    Returns:
+        Задача импорта со статусом done или failed
+    """
+    chunk_size = get_chunk_size(chunk_size)
+    user = job.user
+    job.status = 'running'
+    job.started_at = job.started_at or timezone.now()
+    job.save(update_fields=['status', 'started_at', 'updated_at'])
+
+    try:
+        reader = StatementReader(fileobj, job.format, job.column_map)
+        for rows in _chunks(_fingerprinted(user.id, reader, on_error=reader.add_error), chunk_size):
+            categories = suggest_categories([(row['description'], row['type']) for row in rows], user=user)
+            for row, category in zip(rows, categories):
+                row['category'] = category
+                row['is_ai_parsed'] = bool(category)
+
+            created, duplicates = bulk_create_transactions(user, rows, source='statement', chunk_size=chunk_size)
+
+            job.rows_processed += len(rows)
+            job.created_count += len(created)
+            job.duplicate_count += len(duplicates)
+            job.error_count = reader.error_count
+            job.errors = reader.errors
+            job.processed_bytes = reader.bytes_read
+            job.save(update_fields=PROGRESS_FIELDS)
+            if progress:
+                progress(job)
+
+        job.error_count = reader.error_count
+        job.errors = reader.errors
+        job.processed_bytes = job.size_bytes or reader.bytes_read
+        job.status = 'done'
+    except StatementFormatError as e:
+        job.status = 'failed'
+        job.error = str(e)
+    except Exception:
+        logger.exception('Statement import %s failed', job.pk)
+        job.status = 'failed'
+        job.error = 'Внутренняя ошибка при импорте выписки'
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=PROGRESS_FIELDS + ['status', 'error', 'finished_at'])
+    return job
+
+
+def process_import_job(job_id: int) -> Optional[ImportJob]:
+    """
+    Обрабатывает загруженную выписку, если задача ещё в очереди.
+    Задача захватывается атомарным UPDATE, поэтому параллельные обработчики
+    (пул потоков и команда) не возьмут её дважды.
+    """
+    now = timezone.now()
+    claimed = ImportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=now, updated_at=now
+    )
+    if not claimed:
+        return None
+
+    job = ImportJob.objects.select_related('user').get(pk=job_id)
+    try:
+        with job.file.open('rb') as fileobj:
+            run_statement_import(job, fileobj)
+    except OSError:
+        logger.exception('Statement import %s: file is not readable', job_id)
+        job.status = 'failed'
+        job.error = 'Файл выписки недоступен'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+
+    if job.status == 'done':
+        # Файл больше не нужен - дубли при повторной загрузке отсекут отпечатки
+        job.file.delete(save=True)
+    return job
+
+
+def enqueue_import_job(job: ImportJob):
+    """Ставит задачу в фоновую обработку после коммита транзакции БД."""
+    if not getattr(settings, 'STATEMENT_IMPORT_ASYNC', True):
+        # Задачу заберёт import_statement --pending
+        return
+    submit_on_commit(
+        'statement-import', getattr(settings, 'STATEMENT_IMPORT_WORKERS', 1), process_import_job, job.pk
+    )
+
+
+def requeue_stale_import_jobs(queryset=None) -> List[int]:
+    """
+    Возвращает в очередь импорты, которые числятся выполняемыми, но не писали
+    прогресс дольше STATEMENT_IMPORT_JOB_TIMEOUT (воркер перезапущен или убит).
+    Счётчики обнуляются: файл разбирается заново.
+
+    Returns:
+        id возвращённых в очередь задач
+    """
+    horizon = timezone.now() - timedelta(seconds=getattr(settings, 'STATEMENT_IMPORT_JOB_TIMEOUT', 900))
+    stale = (queryset if queryset is not None else ImportJob.objects.all()).filter(
+        status='running', updated_at__lt=horizon
+    )
+    job_ids = list(stale.values_list('pk', flat=True))
+    if not job_ids:
+        return []
+    # Повторное условие в UPDATE: задача могла ожить между SELECT и UPDATE
+    ImportJob.objects.filter(pk__in=job_ids, status='running', updated_at__lt=horizon).update(
+        status='pending', started_at=None, updated_at=timezone.now(), processed_bytes=0, rows_processed=0,
+        created_count=0, duplicate_count=0, error_count=0, errors=[],
+    )
+    return job_ids
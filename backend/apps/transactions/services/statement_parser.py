@@ -0,0 +1,355 @@
+"""
+Потоковый разбор банковских выписок (CSV и OFX).
+
+Файл читается по строкам (CSV) или кусками (OFX) и отдаётся генератором
+по одной операции - файл и список строк целиком в памяти не держатся.
+Операция: {'amount' (Decimal > 0), 'type', 'date' (aware datetime),
+'description', 'fitid', 'account'}.
+"""
+
+import codecs
+import csv
+import io
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterator, List, Optional
+from django.utils import timezone
+
+# Сколько байт начала файла смотрим для определения кодировки, формата и разделителя
+SAMPLE_SIZE = 64 * 1024
+# Сколько первых строк CSV просматриваем в поисках заголовка (банки пишут шапку выписки)
+HEADER_SEARCH_ROWS = 30
+# Сколько сообщений об ошибках строк сохраняем
+MAX_ERROR_MESSAGES = 20
+# Размер куска чтения OFX и предел незакрытого блока операции
+OFX_READ_SIZE = 64 * 1024
+OFX_MAX_BLOCK = 1024 * 1024
+
+# Заголовки колонок CSV (в нижнем регистре, ё -> е)
+COLUMN_ALIASES = {
+    'date': [
+        'date', 'дата', 'дата операции', 'дата транзакции', 'дата и время операции', 'дата проводки',
+        'transaction date', 'posted date', 'booking date', 'posting date',
+    ],
+    'amount': [
+        'amount', 'сумма', 'сумма операции', 'сумма в валюте счета', 'сумма платежа', 'sum',
+        'transaction amount',
+    ],
+    'expense': ['расход', 'списание', 'сумма списания', 'дебет', 'debit', 'withdrawal', 'withdrawals'],
+    'income': ['приход', 'зачисление', 'сумма зачисления', 'поступление', 'кредит', 'credit', 'deposit', 'deposits'],
+    'description': [
+        'description', 'описание', 'описание операции', 'назначение', 'назначение платежа',
+        'контрагент', 'получатель', 'комментарий', 'merchant', 'payee', 'memo', 'details',
+    ],
+    'type': ['type', 'тип', 'тип операции', 'вид операции', 'direction'],
+}
+
+TYPE_ALIASES = {
+    'expense': {
+        'expense', 'расход', 'списание', 'покупка', 'оплата', 'платеж', 'снятие', 'перевод',
+        'debit', 'dr', 'withdrawal', 'payment', 'purchase',
+    },
+    'income': {
+        'income', 'доход', 'приход', 'зачисление', 'поступление', 'пополнение', 'возврат',
+        'credit', 'cr', 'deposit', 'refund',
+    },
+}
+
+DATE_FORMATS = [
+    '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y', '%d.%m.%y',
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y',
+]
+
+# Типы операций OFX
+OFX_INCOME_TYPES = {'CREDIT', 'DEP', 'INT', 'DIV', 'DIRECTDEP'}
+OFX_EXPENSE_TYPES = {'DEBIT', 'PAYMENT', 'POS', 'ATM', 'FEE', 'SRVCHG', 'CHECK', 'CASH', 'DIRECTDEBIT', 'REPEATPMT'}
+
+_OFX_TAG_RE = re.compile(r'<(\w+)>([^<\r\n]*)')
+_OFX_ACCOUNT_RE = re.compile(r'<ACCTID>([^<\r\n]*)(?=[<\r\n])')
+_OFX_DATE_RE = re.compile(r'(\d{8})(\d{6})?(?:\.\d+)?(?:\[([+-]?\d+(?:\.\d+)?)(?::\w+)?\])?')
+_AMOUNT_CLEAN_RE = re.compile(r'[^\d,.\-+()]')
+# Целое число с разрядами по три цифры через один и тот же разделитель: 1,000,000 / 1.000.000
+_THOUSANDS_RE = re.compile(r'[-+]?\d{1,3}(?P<separator>[,.])\d{3}(?:(?P=separator)\d{3})*')
+
+
+class StatementFormatError(ValueError):
+    """Файл не похож на выписку поддерживаемого формата."""
+
+
+def detect_encoding(sample: bytes) -> str:
+    """UTF-8 (в т.ч. с BOM) или cp1251 - кодировка выгрузок российских банков."""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Многобайтовый символ, обрезанный концом образца, - не повод менять кодировку
+        if e.start < len(sample) - 3:
+            return 'cp1251'
+    return 'utf-8'
+
+
+def detect_format(sample: bytes, filename: str = '') -> str:
+    """csv или ofx по расширению файла, иначе по содержимому."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in ('ofx', 'qfx'):
+        return 'ofx'
+    if extension == 'csv':
+        return 'csv'
+    head = sample[:4096].upper()
+    if b'OFXHEADER' in head or b'<OFX>' in head:
+        return 'ofx'
+    return 'csv'
+
+
+def normalize_header(value: str) -> str:
+    return ' '.join((value or '').strip().strip('"\'').lower().replace('ё', 'е').split())
+
+
+def parse_amount(value: str) -> Decimal:
+    """
+    Сумма из выписки: '1 234,56', '-1,234.56', '1,000,000', '1.000.000', '(500.00)', '1 000 ₽'.
+    Единственная запятая перед тремя цифрами ('1,000') - разделитель разрядов,
+    единственная точка ('1.000') - десятичный разделитель.
+    """
+    text = (value or '').replace('−', '-').replace('\xa0', '').replace(' ', '')
+    text = _AMOUNT_CLEAN_RE.sub('', text)
+    negative = text.startswith('(') and text.endswith(')')
+    text = text.strip('()')
+    if ',' in text and '.' in text:
+        # Десятичный разделитель - последний из двух
+        thousands = ',' if text.rfind('.') > text.rfind(',') else '.'
+        text = text.replace(thousands, '')
+    else:
+        match = _THOUSANDS_RE.fullmatch(text)
+        if match and (match.group('separator') == ',' or text.count('.') > 1):
+            text = text.replace(match.group('separator'), '')
+    text = text.replace(',', '.')
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f'некорректная сумма: {value!r}')
+    return -amount if negative else amount
+
+
+def parse_date(value: str) -> datetime:
+    """Дата из выписки в текущей временной зоне."""
+    text = (value or '').strip()
+    for date_format in DATE_FORMATS:
+        try:
+            date = datetime.strptime(text, date_format)
+            break
+        except ValueError:
+            continue
+    else:
+        try:
+            date = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f'некорректная дата: {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def _type_from_text(value: str) -> Optional[str]:
+    words = normalize_header(value).split()
+    for transaction_type, aliases in TYPE_ALIASES.items():
+        if words and (' '.join(words) in aliases or words[0] in aliases):
+            return transaction_type
+    return None
+
+
+class StatementReader:
+    """
+    Итератор операций выписки.
+
+    Args:
+        fileobj: Файл, открытый в бинарном режиме
+        statement_format: 'csv' или 'ofx' (None - определить по содержимому)
+        column_map: Явное сопоставление поле -> заголовок колонки CSV
+    """
+
+    def __init__(self, fileobj, statement_format: Optional[str] = None,
+                 column_map: Optional[Dict[str, str]] = None):
+        self.fileobj = fileobj
+        sample = fileobj.read(SAMPLE_SIZE)
+        fileobj.seek(0)
+        self.encoding = detect_encoding(sample)
+        self.format = statement_format or detect_format(sample)
+        self.column_map = column_map or {}
+        self.error_count = 0
+        self.errors: List[str] = []
+
+    @property
+    def bytes_read(self) -> int:
+        """Сколько байт файла уже прочитано (для прогресса)."""
+        return self.fileobj.tell()
+
+    def add_error(self, message: str):
+        """Учитывает ошибочную строку (текст - для первых MAX_ERROR_MESSAGES)."""
+        self.error_count += 1
+        if len(self.errors) < MAX_ERROR_MESSAGES:
+            self.errors.append(message)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self.format == 'ofx':
+            return self._iter_ofx()
+        if self.format == 'csv':
+            return self._iter_csv()
+        raise StatementFormatError(f'Неподдерживаемый формат выписки: {self.format}')
+
+    # CSV
+
+    @contextmanager
+    def _text(self):
+        """Текстовая обёртка над файлом; сам файл после разбора остаётся открытым."""
+        text = io.TextIOWrapper(self.fileobj, encoding=self.encoding, errors='replace', newline='')
+        try:
+            yield text
+        finally:
+            text.detach()
+
+    def _find_columns(self, header: List[str]) -> Optional[Dict[str, int]]:
+        """Индексы колонок по заголовку или None, если это не строка заголовка."""
+        normalized = [normalize_header(value) for value in header]
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            explicit = self.column_map.get(field)
+            candidates = [normalize_header(explicit)] if explicit else aliases
+            for candidate in candidates:
+                if candidate in normalized:
+                    columns[field] = normalized.index(candidate)
+                    break
+        has_amount = 'amount' in columns or ('expense' in columns and 'income' in columns)
+        return columns if 'date' in columns and has_amount else None
+
+    def _iter_csv(self) -> Iterator[Dict[str, Any]]:
+        with self._text() as text:
+            first_line = ''
+            for first_line in text:
+                if first_line.strip():
+                    break
+            delimiter = max(';,\t', key=first_line.count)
+            text.seek(0)
+
+            reader = csv.reader(text, delimiter=delimiter)
+            columns = None
+            for line_number, header in enumerate(reader, start=1):
+                columns = self._find_columns(header)
+                if columns or line_number >= HEADER_SEARCH_ROWS:
+                    break
+            if not columns:
+                raise StatementFormatError(
+                    'Не найдены колонки даты и суммы. Передайте column_map, например '
+                    '{"date": "Дата", "amount": "Сумма", "description": "Описание"}'
+                )
+
+            for row in reader:
+                if not any(value.strip() for value in row):
+                    continue
+                try:
+                    yield self._csv_row(row, columns)
+                except (ValueError, IndexError) as e:
+                    self.add_error(f'Строка {reader.line_num}: {e}')
+
+    def _csv_row(self, row: List[str], columns: Dict[str, int]) -> Dict[str, Any]:
+        def value(field):
+            index = columns.get(field)
+            return row[index].strip() if index is not None and index < len(row) else ''
+
+        transaction_type = None
+        if 'amount' in columns and value('amount'):
+            amount = parse_amount(value('amount'))
+            transaction_type = _type_from_text(value('type')) if value('type') else None
+            if transaction_type is None:
+                transaction_type = 'expense' if amount < 0 else 'income'
+        else:
+            expense = parse_amount(value('expense')) if value('expense') else Decimal('0')
+            income = parse_amount(value('income')) if value('income') else Decimal('0')
+            amount, transaction_type = (expense, 'expense') if expense else (income, 'income')
+
+        amount = abs(amount)
+        if not amount:
+            raise ValueError('нулевая сумма')
+        return {
+            'amount': amount.quantize(Decimal('0.01')),
+            'type': transaction_type,
+            'date': parse_date(value('date')),
+            'description': value('description'),
+            'fitid': None,
+            'account': None,
+        }
+
+    # OFX
+
+    def _iter_ofx(self) -> Iterator[Dict[str, Any]]:
+        with self._text() as text:
+            account = None
+            buffer = ''
+            while True:
+                chunk = text.read(OFX_READ_SIZE)
+                buffer += chunk
+                position = 0
+                while True:
+                    start = buffer.find('<STMTTRN>', position)
+                    for match in _OFX_ACCOUNT_RE.finditer(buffer, position, start if start >= 0 else len(buffer)):
+                        account = match.group(1).strip()
+                    if start < 0:
+                        # Хвост может содержать начало тега - оставляем его до следующего куска
+                        position = max(position, len(buffer) - 64)
+                        break
+                    end = buffer.find('</STMTTRN>', start)
+                    if end < 0:
+                        position = start
+                        break
+                    try:
+                        yield self._ofx_row(buffer[start + len('<STMTTRN>'):end], account)
+                    except ValueError as e:
+                        self.add_error(f'Операция OFX: {e}')
+                    position = end + len('</STMTTRN>')
+                buffer = buffer[position:]
+
+                if not chunk:
+                    break
+                if len(buffer) > OFX_MAX_BLOCK:
+                    raise StatementFormatError('Некорректный OFX: незакрытый блок STMTTRN')
+
+    def _ofx_row(self, block: str, account: Optional[str]) -> Dict[str, Any]:
+        tags = {name.upper(): value.strip() for name, value in _OFX_TAG_RE.findall(block)}
+        amount = parse_amount(tags.get('TRNAMT', ''))
+        ofx_type = tags.get('TRNTYPE', '').upper()
+        if ofx_type in OFX_INCOME_TYPES and amount > 0:
+            transaction_type = 'income'
+        elif ofx_type in OFX_EXPENSE_TYPES and amount < 0:
+            transaction_type = 'expense'
+        else:
+            transaction_type = 'expense' if amount < 0 else 'income'
+
+        amount = abs(amount)
+        if not amount:
+            raise ValueError('нулевая сумма')
+
+        name = tags.get('NAME', '')
+        memo = tags.get('MEMO', '')
+        description = name if not memo or memo == name else f'{name} {memo}'.strip()
+        return {
+            'amount': amount.quantize(Decimal('0.01')),
+            'type': transaction_type,
+            'date': parse_ofx_date(tags.get('DTPOSTED', '')),
+            'description': description,
+            'fitid': tags.get('FITID') or None,
+            'account': account,
+        }
+
+
+def parse_ofx_date(value: str) -> datetime:
+    """Дата OFX: YYYYMMDD[HHMMSS[.XXX]][[+3:MSK]]; без смещения - UTC (по спецификации)."""
+    match = _OFX_DATE_RE.match(value or '')
+    if not match:
+        raise ValueError(f'некорректная дата: {value!r}')
+    day, time_part, offset = match.groups()
+    date = datetime.strptime(day + (time_part or '000000'), '%Y%m%d%H%M%S')
+    tzinfo = dt_timezone(timedelta(hours=float(offset))) if offset else dt_timezone.utc
+    return date.replace(tzinfo=tzinfo)
@@ -1,3 +1,809 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.analytics.models import DailyUserCategoryRollup
+from apps.analytics.services.balance import get_user_balance
+from apps.categories.models import Category
+from apps.categories.services.merchant_rules import learn_category
+from apps.categories.services.system_categories import system_category_cache
+from apps.core.services.cursor import encode_cursor
+from apps.core.services.data_version import get_data_version
+from apps.transactions.models import ImportJob, Transaction
+from apps.transactions.services import bulk_writer
+from apps.transactions.services.category_suggester import (
+    CATEGORY_KEYWORDS, KeywordMatcher, match_category_name, recategorize_transactions
+)
+from apps.transactions.services.exporter import export_columns
+from apps.transactions.services.sms_ingest import save_parsed_sms
+from apps.transactions.services.sms_parser import (
+    BankTemplateError, PatternRegistry, _RegistryHolder, load_registry, parse_sms, parse_sms_batch
+)
+from apps.transactions.services.statement_import import _fingerprinted, requeue_stale_import_jobs
+from apps.transactions.services.statement_parser import parse_amount
 
-# Create your tests here.
+
+def _create_user(name='user'):
+    return get_user_model().objects.create_user(username=name, email=f'{name}@example.com', password='password')
+
+
+class BulkCreateTransactionsTests(TestCase):
+    """Дубли в bulk_create_transactions на обоих путях вставки."""
+
+    def setUp(self):
+        self.user = _create_user()
+        self.date = datetime(2025, 3, 10, 12, 0, tzinfo=dt_timezone.utc)
+        # Строка баланса существует - bulk_create_transactions сдвигает её
+        get_user_balance(self.user.id)
+
+    def _rows(self, *keys):
+        return [
+            {'amount': Decimal('100.00'), 'type': 'expense', 'date': self.date, 'idempotency_key': key}
+            for key in keys
+        ]
+
+    def _check_duplicates(self):
+        created, duplicates = bulk_writer.bulk_create_transactions(self.user, self._rows('a', 'b', 'a'))
+        self.assertEqual(len(created), 2)
+        self.assertTrue(all(obj.pk for obj in created))
+        self.assertEqual(duplicates, [2])
+
+        # Повтор пачки после таймаута: старые строки - дубли, новая создаётся
+        created, duplicates = bulk_writer.bulk_create_transactions(self.user, self._rows('a', 'b', 'c'))
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0].fingerprint, bulk_writer.build_fingerprint(self.user.id, self._rows('c')[0]))
+        self.assertTrue(Transaction.objects.filter(pk=created[0].pk, user=self.user).exists())
+        self.assertEqual(duplicates, [0, 1])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(get_user_balance(self.user.id).total_expense, Decimal('300.00'))
+
+    def _check_concurrent_retry(self):
+        """Строку успел вставить параллельный запрос между построением отпечатков и INSERT."""
+        row = self._rows('a')[0]
+
+        def racing(insert):
+            def wrapper(objs):
+                Transaction.objects.create(
+                    user=self.user,
+                    amount=row['amount'],
+                    type=row['type'],
+                    date=row['date'],
+                    fingerprint=bulk_writer.build_fingerprint(self.user.id, row),
+                )
+                return insert(objs)
+            return wrapper
+
+        with mock.patch.object(bulk_writer, '_insert_returning', racing(bulk_writer._insert_returning)), \
+                mock.patch.object(bulk_writer, '_insert_one_by_one', racing(bulk_writer._insert_one_by_one)):
+            created, duplicates = bulk_writer.bulk_create_transactions(self.user, self._rows('a', 'b'))
+
+        self.assertEqual(len(created), 1)
+        self.assertEqual(duplicates, [0])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+        # Строка параллельного запроса учтена в балансе один раз
+        self.assertEqual(get_user_balance(self.user.id).total_expense, Decimal('200.00'))
+
+    @mock.patch.object(bulk_writer, '_supports_insert_returning', return_value=True)
+    def test_insert_returning_splits_by_batch_size(self, _):
+        keys = [str(index) for index in range(250)]
+        bulk_writer.bulk_create_transactions(self.user, self._rows(*keys[::2]))
+        with mock.patch.object(connection.ops, 'bulk_batch_size', return_value=40), \
+                CaptureQueriesContext(connection) as queries:
+            created, duplicates = bulk_writer.bulk_create_transactions(self.user, self._rows(*keys), chunk_size=1000)
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT INTO "transactions"')]
+        self.assertEqual(len(inserts), 7)
+        self.assertEqual(len(created), 125)
+        self.assertEqual(duplicates, list(range(0, 250, 2)))
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 250)
+
+    @mock.patch.object(bulk_writer, '_supports_insert_returning', return_value=True)
+    def test_duplicates_insert_returning(self, _):
+        self._check_duplicates()
+
+    @mock.patch.object(bulk_writer, '_supports_insert_returning', return_value=False)
+    def test_duplicates_one_by_one(self, _):
+        self._check_duplicates()
+
+    @mock.patch.object(bulk_writer, '_supports_insert_returning', return_value=True)
+    def test_concurrent_retry_insert_returning(self, _):
+        self._check_concurrent_retry()
+
+    @mock.patch.object(bulk_writer, '_supports_insert_returning', return_value=False)
+    def test_concurrent_retry_one_by_one(self, _):
+        self._check_concurrent_retry()
+
+
+class TransactionPaginationTests(TestCase):
+    """Курсорная пагинация: обход всех страниц без пропусков и повторов."""
+
+    def setUp(self):
+        self.user = _create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        base = datetime(2025, 3, 10, 12, 0, tzinfo=dt_timezone.utc)
+        # Одинаковые даты и микросекунды - курсор должен различать строки по id
+        dates = [base, base, base + timedelta(microseconds=1), base + timedelta(days=1),
+                 base - timedelta(days=1), base - timedelta(days=1), base + timedelta(seconds=1)]
+        for index, date in enumerate(dates):
+            Transaction.objects.create(user=self.user, amount=Decimal(index + 1), type='expense', date=date)
+        other = _create_user('other')
+        Transaction.objects.create(user=other, amount=Decimal('1'), type='expense', date=base)
+
+    def _walk(self, ordering):
+        ids = []
+        url = f'/api/v1/transactions/?pagination=cursor&page_size=3&ordering={ordering}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row['id'] for row in response.data['results'])
+            cursor = response.data['next_cursor']
+            url = f'/api/v1/transactions/?cursor={cursor}&page_size=3&ordering={ordering}' if cursor else None
+        return ids
+
+    def test_cursor_round_trip(self):
+        transactions = Transaction.objects.filter(user=self.user)
+        self.assertEqual(self._walk('-date'), list(transactions.order_by('-date', '-id').values_list('id', flat=True)))
+        self.assertEqual(self._walk('date'), list(transactions.order_by('date', 'id').values_list('id', flat=True)))
+
+    def test_next_link_continues_from_cursor(self):
+        response = self.client.get('/api/v1/transactions/?pagination=cursor&page_size=4')
+        first_page = [row['id'] for row in response.data['results']]
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        second_page = [row['id'] for row in response.data['results']]
+        self.assertEqual(len(first_page + second_page), 7)
+        self.assertFalse(set(first_page) & set(second_page))
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-a-cursor', encode_cursor([10 ** 30, 1]), encode_cursor(['x', 1]), encode_cursor([1])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/v1/transactions/?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+
+
+class StatementFingerprintTests(TestCase):
+    """Нумерация одинаковых строк выписки при несортированном вводе."""
+
+    @staticmethod
+    def _operation(day, description='Магнит'):
+        return {
+            'date': datetime(2025, 1, day, 10, 0, tzinfo=dt_timezone.utc),
+            'amount': Decimal('10.00'),
+            'description': description,
+            'type': 'expense',
+            'fitid': None,
+            'account': None,
+        }
+
+    def test_unsorted_identical_rows_get_distinct_fingerprints(self):
+        operations = [self._operation(5), self._operation(4), self._operation(5), self._operation(4)]
+        rows = list(_fingerprinted(1, operations))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(len({row['fingerprint'] for row in rows}), 4)
+
+    def test_fingerprints_do_not_depend_on_order(self):
+        operations = [self._operation(5), self._operation(4), self._operation(5)]
+        forward = {row['fingerprint'] for row in _fingerprinted(1, operations)}
+        backward = {row['fingerprint'] for row in _fingerprinted(1, operations[::-1])}
+        self.assertEqual(forward, backward)
+
+    def test_row_for_evicted_day_is_reported(self):
+        errors = []
+        operations = [self._operation(20), self._operation(10), self._operation(20), self._operation(10)]
+        rows = list(_fingerprinted(1, operations, on_error=errors.append, day_window=3))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(len({row['fingerprint'] for row in rows}), 3)
+
+    def test_fitid_rows_are_never_skipped(self):
+        operations = [dict(self._operation(day), fitid=f'id-{day}') for day in (20, 10, 20)]
+        rows = list(_fingerprinted(1, operations, day_window=3))
+        self.assertEqual(len(rows), 3)
+
+
+class StatementAmountTests(TestCase):
+    """Разбор сумм из выписки с разделителями разрядов."""
+
+    def test_thousands_separators(self):
+        cases = {
+            '1,000,000': Decimal('1000000'),
+            '1.000.000': Decimal('1000000'),
+            '1,000': Decimal('1000'),
+            '-1,000,000.25': Decimal('-1000000.25'),
+            '1.234,56': Decimal('1234.56'),
+            '1 234,56': Decimal('1234.56'),
+            '1\xa0000 ₽': Decimal('1000'),
+            '(500.00)': Decimal('-500.00'),
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(parse_amount(value), expected)
+
+    def test_decimal_separators(self):
+        self.assertEqual(parse_amount('1.000'), Decimal('1.000'))
+        self.assertEqual(parse_amount('12,5'), Decimal('12.5'))
+        self.assertEqual(parse_amount('1000,50'), Decimal('1000.50'))
+
+    def test_invalid_amount(self):
+        with self.assertRaises(ValueError):
+            parse_amount('1,2,3')
+
+
+class SMSPatternEngineTests(TestCase):
+    """Реестр паттернов разбирает SMS так же, как прежний перебор BANK_PATTERNS."""
+
+    # Результаты прежнего парсера (без даты), включая его особенности:
+    # номер карты в 'Card *9876' принимается за сумму
+    BASELINE = [
+        ("Pokupka 1500.00 RUB. Karta *1234. Magazin 'Produkti'. Ost. 25000.00 RUB", '900',
+         (1500.0, 'expense', 'agazin', 'sberbank')),
+        ("Pokupka 1500.00 RUB. Karta *1234. Magazin 'Produkti'. Ost. 25000.00 RUB", None,
+         (1500.0, 'expense', 'agazin', 'sberbank')),
+        ('1500.00 RUB списано с карты *5678 в магазине PYATEROCHKA', '+79000000900',
+         (1500.0, 'expense', 'в магазине PYATEROCHKA', 'sberbank')),
+        ('Card *9876: 3500 RUB. Berezka. Balance: 15000 RUB', None,
+         (9876.0, 'expense', 'Berezka', 'sberbank')),
+        ('Tinkoff: 700 RUB списано с карты *4444 в KFC.', None,
+         (700.0, 'expense', 'KFC', 'tinkoff')),
+        ('250 руб зачислено с карты *1111 от Ивана', '+7 999 123-45-67',
+         (250.0, 'income', 'с карты *1111 от Ивана', 'tinkoff')),
+        ('Альфа-Банк: 1200 RUB Списано. Магнит', None,
+         (1200.0, 'expense', 'Магнит', 'alfa')),
+        ('ALFA: Card *2222 450 RUB Perekrestok', 'ALFA',
+         (2222.0, 'expense', 'Perekrestok', 'alfa')),
+        ('Оплата 99 ₽ в Яндекс Такси', '88005553535',
+         (99.0, 'expense', 'Оплата 99 ₽ в Яндекс Такси', 'default')),
+        ('Перевод вам 5000 руб от Петра', None,
+         (5000.0, 'income', 'Перевод вам 5000 руб от Петра', 'default')),
+        ('Сбербанк: Списание 320 руб в Шоколадница', None,
+         (320.0, 'expense', 'Шоколадница', 'sberbank')),
+        ('Card *1111 credited 1000 RUB. Salary. Balance: 5000 RUB', None,
+         (1111.0, 'income', 'Salary', 'sberbank')),
+        ('  Pokupka 10 RUB v Teremok  ', '1900',
+         (10.0, 'expense', 'Pokupka 10 RUB v Teremok', 'sberbank')),
+        ('Ваш код 1234', None, None),
+    ]
+
+    @staticmethod
+    def _bank(name, priority, phones=(), keywords=(), patterns=()):
+        return {
+            'name': name,
+            'priority': priority,
+            'phone': list(phones),
+            'keywords': list(keywords),
+            'patterns': [{'regex': regex, 'triggers': list(triggers)} for regex, triggers in patterns],
+        }
+
+    def test_matches_baseline_outputs(self):
+        for text, phone, expected in self.BASELINE:
+            with self.subTest(text=text, phone=phone):
+                result = parse_sms(text, phone)
+                if expected is None:
+                    self.assertIsNone(result)
+                else:
+                    self.assertEqual(
+                        (result['amount'], result['type'], result['description'], result['bank']), expected
+                    )
+
+    def test_batch_keeps_positions(self):
+        results = parse_sms_batch([{'text': 'Ваш код 1234'}, {'text': 'Оплата 99 ₽ в Яндекс Такси'}, {}])
+        self.assertEqual(len(results), 3)
+        self.assertIsNone(results[0])
+        self.assertEqual(results[1]['amount'], 99.0)
+        self.assertIsNone(results[2])
+
+    def test_triggers_skip_regex(self):
+        registry = PatternRegistry([
+            self._bank('bank', 10, keywords=['bank'], patterns=[
+                (r'Списано\s+(\d+)', ['списано']),
+                (r'Зачислено\s+(\d+)', ['зачислено']),
+            ]),
+            self._bank('default', 0),
+        ])
+        result = registry.parse('Bank: Зачислено 500', None)
+        self.assertEqual((result['amount'], result['bank']), (500.0, 'bank'))
+        stats = {row['pattern']: row for row in registry.stats()}
+        self.assertEqual((stats[0]['skipped'], stats[0]['misses']), (1, 0))
+        self.assertEqual(stats[1]['hits'], 1)
+
+    def test_phone_suffix_conflict_goes_to_priority(self):
+        banks = [
+            self._bank('short', 10, phones=['4567']),
+            self._bank('long', 20, phones=['+79991234567']),
+            self._bank('default', 0),
+        ]
+        self.assertEqual(PatternRegistry(banks).bank_by_phone('8 999 123-45-67'), 'long')
+        banks[0]['priority'] = 30
+        registry = PatternRegistry(banks)
+        self.assertEqual(registry.bank_by_phone('+7 999 123-45-67'), 'short')
+        self.assertEqual(registry.bank_by_phone('4567'), 'short')
+        self.assertIsNone(registry.bank_by_phone('567'))
+        self.assertIsNone(registry.bank_by_phone(None))
+
+
+class BankTemplatesTests(TestCase):
+    """Файл шаблонов банков: self-test при загрузке и горячая перезагрузка."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'bank_templates.json')
+        self.mtime = 1_700_000_000
+
+    def _write(self, version, regex=r'Оплата\s+(\d+)', expect_amount=100.0):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'banks': [{
+                'name': 'bank',
+                'priority': 10,
+                'phone': ['+79990000001'],
+                'keywords': ['bank'],
+                'patterns': [{'regex': regex, 'triggers': []}],
+                'samples': [{'text': 'Bank: Оплата 100', 'expect': {'bank': 'bank', 'amount': expect_amount}}],
+            }, {'name': 'default', 'patterns': []}]}, f, ensure_ascii=False)
+        # mtime меняется при каждой записи, даже в пределах одной секунды
+        self.mtime += 10
+        os.utime(self.path, (self.mtime, self.mtime))
+
+    def test_self_test_rejects_broken_templates(self):
+        self._write(1)
+        self.assertEqual(load_registry(self.path).version, 1)
+        for kwargs in ({'regex': r'Оплата\s+(\d+'}, {'regex': r'Списано\s+(\d+)'}, {'expect_amount': 99.0}):
+            with self.subTest(**kwargs):
+                self._write(2, **kwargs)
+                with self.assertRaises(BankTemplateError):
+                    load_registry(self.path)
+
+    def test_check_command(self):
+        self._write(1)
+        output = io.StringIO()
+        call_command('check_bank_templates', file=self.path, stdout=output)
+        self.assertIn('Версия шаблонов: 1', output.getvalue())
+        self._write(2, expect_amount=99.0)
+        with self.assertRaises(CommandError):
+            call_command('check_bank_templates', file=self.path, stdout=io.StringIO())
+
+    def test_hot_reload_keeps_last_good_version(self):
+        holder = _RegistryHolder()
+        self._write(1)
+        with self.settings(SMS_BANK_TEMPLATES_PATH=self.path, SMS_TEMPLATES_RELOAD_INTERVAL=0):
+            self.assertEqual(holder.get().version, 1)
+
+            self._write(2)
+            self.assertEqual(holder.get().version, 2)
+
+            # Невалидный файл не подменяет рабочий реестр
+            self._write(3, regex=r'Списано\s+(\d+)')
+            with self.assertLogs('apps.transactions.services.sms_parser', 'ERROR'):
+                self.assertEqual(holder.get().version, 2)
+            self.assertEqual(holder.get().parse('Bank: Оплата 100')['amount'], 100.0)
+
+    def test_reload_interval(self):
+        holder = _RegistryHolder()
+        self._write(1)
+        with self.settings(SMS_BANK_TEMPLATES_PATH=self.path, SMS_TEMPLATES_RELOAD_INTERVAL=3600):
+            self.assertEqual(holder.get().version, 1)
+            self._write(2)
+            # Файл не перечитывается до истечения интервала, reload - сразу
+            self.assertEqual(holder.get().version, 1)
+            self.assertEqual(holder.reload().version, 2)
+
+    def test_first_load_failure_raises(self):
+        self._write(1, expect_amount=99.0)
+        with self.settings(SMS_BANK_TEMPLATES_PATH=self.path):
+            with self.assertRaises(BankTemplateError):
+                _RegistryHolder().get()
+
+
+def _loop_match(category_keywords, description, transaction_type):
+    """Прежний перебор ключевых слов - эталон для KeywordMatcher."""
+    if not description:
+        return None
+    description_lower = description.lower()
+    for category_name, data in category_keywords.items():
+        if data['type'] != transaction_type:
+            continue
+        for keyword in data['keywords']:
+            if keyword.lower() in description_lower:
+                return category_name
+    return None
+
+
+class KeywordMatcherTests(TestCase):
+    """KeywordMatcher выбирает ту же категорию, что и прежний перебор."""
+
+    def test_matches_loop_on_random_descriptions(self):
+        rng = random.Random(7)
+        keywords = [keyword for data in CATEGORY_KEYWORDS.values() for keyword in data['keywords']]
+        noise = ['оплата', 'card', '*1234', 'RUB', '500.00', 'ООО', 'Москва', 'ип', 'sbp', 'pay']
+        for _ in range(2000):
+            words = rng.sample(noise, rng.randint(0, 4)) + rng.sample(keywords, rng.randint(0, 3))
+            rng.shuffle(words)
+            # Без пробелов ключевые слова склеиваются и перекрываются
+            description = rng.choice([' ', '', '-']).join(words)
+            if rng.random() < 0.5:
+                description = description.upper()
+            for transaction_type in ('expense', 'income'):
+                self.assertEqual(
+                    match_category_name(description, transaction_type),
+                    _loop_match(CATEGORY_KEYWORDS, description, transaction_type),
+                    (description, transaction_type),
+                )
+
+    def test_priority_and_overlaps(self):
+        cases = [
+            ('METRO КЭШ', 'expense', 'Продукты'),
+            ('Метро', 'expense', 'Транспорт'),
+            ('Яндекс Лавка магнит', 'expense', 'Продукты'),
+            ('Барбершоп', 'expense', 'Кафе и рестораны'),
+            ('Перевод: зарплата за март', 'income', 'Зарплата'),
+            ('Перевод от Ивана', 'income', 'Переводы'),
+            ('Перевод от Ивана', 'expense', None),
+            ('', 'expense', None),
+            (None, 'expense', None),
+            ('магнит', 'transfer', None),
+        ]
+        for description, transaction_type, expected in cases:
+            with self.subTest(description=description, type=transaction_type):
+                self.assertEqual(match_category_name(description, transaction_type), expected)
+
+    def test_duplicate_keywords_keep_first_category(self):
+        keywords = {
+            'A': {'keywords': ['ab', 'Кофе'], 'type': 'expense'},
+            'B': {'keywords': ['abc', 'кофе', 'b'], 'type': 'expense'},
+            'C': {'keywords': ['ab'], 'type': 'income'},
+        }
+        matcher = KeywordMatcher(keywords)
+        for description in ('abc', 'xbx', 'КОФЕ', 'b ab', 'zz'):
+            for transaction_type in ('expense', 'income'):
+                with self.subTest(description=description, type=transaction_type):
+                    self.assertEqual(
+                        matcher.match(description, transaction_type),
+                        _loop_match(keywords, description, transaction_type),
+                    )
+
+
+class RecategorizeTransactionsTests(TestCase):
+    """Массовая категоризация: dry run, правила пользователя, агрегаты и версия данных."""
+
+    def setUp(self):
+        cache.clear()
+        system_category_cache.invalidate()
+        self.user = _create_user()
+        self.date = timezone.make_aware(datetime(2025, 3, 10, 12, 0))
+        self.food = Category.objects.get(name='Продукты', type='expense', is_system=True)
+
+    def _create(self, description, user=None, category=None, transaction_type='expense'):
+        return Transaction.objects.create(
+            user=user or self.user, amount=Decimal('100.00'), type=transaction_type,
+            date=self.date, description=description, category=category,
+        )
+
+    def _rollup_categories(self):
+        return {
+            row['category_id']: row['count']
+            for row in DailyUserCategoryRollup.objects.filter(user=self.user).values('category_id', 'count')
+        }
+
+    def test_dry_run_writes_nothing(self):
+        self._create('Магнит')
+        self._create('Пятёрочка')
+        self._create('Такси')
+        self._create('Неизвестный продавец')
+        version = get_data_version(self.user.id)
+        rollups = self._rollup_categories()
+
+        result = recategorize_transactions(Transaction.objects.filter(user=self.user), dry_run=True)
+        self.assertEqual(result, {
+            'scanned': 4, 'categorized': 3, 'by_category': {'Продукты': 2, 'Транспорт': 1},
+        })
+        self.assertEqual(Transaction.objects.filter(user=self.user, category__isnull=True).count(), 4)
+        self.assertEqual(self._rollup_categories(), rollups)
+        self.assertEqual(get_data_version(self.user.id), version)
+
+    def test_run_updates_transactions_rollups_and_version(self):
+        cafe = Category.objects.create(user=self.user, name='Любимое кафе', type='expense')
+        learn_category(self.user.id, 'Магнит у дома', 'expense', cafe)
+        by_rule = self._create('Магнит у дома')
+        by_keyword = [self._create('Магнит'), self._create('Пятёрочка'), self._create('METRO')]
+        manual = self._create('Магнит', category=cafe)
+        unknown = self._create('Неизвестный продавец')
+        empty = self._create('')
+        version = get_data_version(self.user.id)
+
+        result = recategorize_transactions(Transaction.objects.filter(user=self.user), chunk_size=2)
+        self.assertEqual(result['scanned'], 5)
+        self.assertEqual(result['categorized'], 4)
+        self.assertEqual(result['by_category'], {'Любимое кафе': 1, 'Продукты': 3})
+
+        by_rule.refresh_from_db()
+        self.assertEqual(by_rule.category, cafe)
+        self.assertTrue(by_rule.is_ai_parsed)
+        for transaction in by_keyword:
+            transaction.refresh_from_db()
+            self.assertEqual(transaction.category, self.food)
+        manual.refresh_from_db()
+        self.assertEqual(manual.category, cafe)
+        self.assertEqual(Transaction.objects.filter(pk__in=[unknown.pk, empty.pk], category__isnull=True).count(), 2)
+
+        self.assertEqual(self._rollup_categories(), {cafe.id: 2, self.food.id: 3, None: 2})
+        self.assertNotEqual(get_data_version(self.user.id), version)
+
+    def test_api_is_scoped_to_user(self):
+        own = self._create('Магнит')
+        other = self._create('Магнит', user=_create_user('other'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post('/api/v1/transactions/recategorize/', {'dry_run': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['dry_run'], response.data['categorized']), (True, 1))
+        own.refresh_from_db()
+        self.assertIsNone(own.category)
+
+        response = client.post('/api/v1/transactions/recategorize/', {}, format='json')
+        self.assertEqual(response.data['by_category'], {'Продукты': 1})
+        own.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(own.category, self.food)
+        self.assertIsNone(other.category)
+
+    def test_command(self):
+        self._create('Магнит')
+        self._create('Магнит', user=_create_user('other'))
+        output = io.StringIO()
+        call_command('recategorize_transactions', user=self.user.email, dry_run=True, stdout=output)
+        self.assertIn('Будет категоризировано 1 из 1', output.getvalue())
+
+        call_command('recategorize_transactions', chunk_size=1, stdout=io.StringIO())
+        self.assertFalse(Transaction.objects.filter(category__isnull=True).exists())
+        with self.assertRaises(CommandError):
+            call_command('recategorize_transactions', user='missing@example.com', stdout=io.StringIO())
+
+
+class SMSBatchParseTests(TestCase):
+    """Пакетный парсинг SMS: приём, дубли и некорректные элементы."""
+
+    url = '/api/v1/transactions/sms-parse/batch/'
+
+    def setUp(self):
+        self.user = _create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _message(self, amount=100, **fields):
+        return {
+            'text': f'Pokupka {amount}.00 RUB. Karta *1234. Magazin Magnit. Ost. 25000.00 RUB',
+            'phone': '900',
+            'date': '2025-03-01T10:00:00+03:00',
+            **fields,
+        }
+
+    def test_accepted_rejected_and_duplicates(self):
+        messages = [self._message(100), self._message(200), self._message(100), {'text': ''}]
+        response = self.client.post(self.url, {'messages': messages}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.data['accepted']], [0, 1])
+        self.assertEqual(response.data['duplicates'], [2])
+        self.assertEqual(response.data['rejected'], [3])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+        # Повтор всего пакета ничего не создаёт
+        response = self.client.post(self.url, {'messages': messages}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['duplicates'], [0, 1, 2])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+
+    def test_same_text_at_different_times_is_not_duplicate(self):
+        messages = [self._message(100), self._message(100, date='2025-03-01T18:00:00+03:00')]
+        response = self.client.post(self.url, {'messages': messages}, format='json')
+        self.assertEqual(response.data['accepted_count'], 2)
+
+    def test_malformed_items(self):
+        # Число CharField приводит к строке - такая SMS просто не распознаётся
+        response = self.client.post(self.url, {'messages': [{'text': 123}]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rejected'], [0])
+
+        for messages in (
+            [{'text': None}],
+            [{'text': ['Pokupka']}],
+            [{'phone': '900'}],
+            ['Pokupka 100.00 RUB'],
+            [self._message(date='not a date')],
+            [self._message(date='2025-03-01')],
+            [self._message(idempotency_key='x' * 129)],
+        ):
+            with self.subTest(messages=messages):
+                response = self.client.post(self.url, {'messages': messages}, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('messages', response.data)
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+    def test_invalid_date_from_import_is_rejected(self):
+        messages = [self._message(100, date='2025-03-01'), self._message(200, date='garbage'), self._message(300)]
+        result = save_parsed_sms(self.user, messages, parse_sms_batch(messages))
+        self.assertEqual(result['rejected'], [0, 1])
+        self.assertEqual([item['index'] for item in result['accepted']], [2])
+
+
+@override_settings(TRANSACTION_LIST_PAGE_SIZE=2)
+class TransactionListPageTests(TestCase):
+    """Страница /transactions/: количество из агрегатов, фильтры в ссылках пагинации."""
+
+    def setUp(self):
+        self.user = _create_user()
+        self.client.force_login(self.user)
+        now = timezone.now()
+        for index in range(5):
+            Transaction.objects.create(
+                user=self.user, amount=Decimal(index + 1), type='expense', date=now - timedelta(days=index)
+            )
+        Transaction.objects.create(user=self.user, amount=Decimal('100'), type='income', date=now)
+        # За пределами периода по умолчанию
+        Transaction.objects.create(user=self.user, amount=Decimal('7'), type='expense', date=now - timedelta(days=400))
+
+    def test_counts_come_from_rollups(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/transactions/', {'type': 'expense'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_count'], 5)
+        self.assertEqual(response.context['total_expenses'], Decimal('15'))
+        self.assertEqual(response.context['paginator'].num_pages, 3)
+        self.assertEqual(len(response.context['transactions']), 2)
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT(*)' in query['sql'].upper()])
+
+    def test_page_links_keep_filters(self):
+        response = self.client.get('/transactions/', {'type': 'expense', 'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        date_to = timezone.localdate().isoformat()
+        self.assertContains(response, 'page=3')
+        self.assertContains(response, 'type=expense')
+        self.assertContains(response, f'date_to={date_to}')
+        self.assertNotContains(response, 'page=2&amp;page')
+
+        next_page = self.client.get(f'/transactions/?{response.context["querystring"]}&page=3')
+        self.assertEqual(len(next_page.context['transactions']), 1)
+        self.assertEqual(next_page.context['current_type'], 'expense')
+
+    def test_explicit_period(self):
+        date_from = (timezone.localdate() - timedelta(days=500)).isoformat()
+        response = self.client.get('/transactions/', {'date_from': date_from})
+        self.assertEqual(response.context['total_count'], 7)
+
+
+class TransactionExportTests(TestCase):
+    """Потоковая выгрузка: тела csv/jsonl/parquet/gzip и проверка параметров до потока."""
+
+    url = '/api/v1/transactions/export/'
+
+    def setUp(self):
+        self.user = _create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(user=self.user, name='Кофе, чай', type='expense')
+        self.first = Transaction.objects.create(
+            user=self.user, amount=Decimal('150.50'), type='expense', category=self.category,
+            date=datetime(2025, 3, 1, 9, 30, tzinfo=dt_timezone.utc), description='Кофе "Зёрна"',
+        )
+        self.second = Transaction.objects.create(
+            user=self.user, amount=Decimal('1000.00'), type='income',
+            date=datetime(2025, 3, 2, 12, 0, tzinfo=dt_timezone.utc), description='Зарплата',
+        )
+        Transaction.objects.create(
+            user=_create_user('other'), amount=Decimal('1'), type='expense', date=self.first.date
+        )
+
+    def _body(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response = self.client.get(self.url, {'format': 'csv', 'include_category': 'true'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.csv"')
+        rows = list(csv.reader(io.StringIO(self._body(response).decode('utf-8-sig'))))
+        self.assertEqual(rows[0], export_columns(True))
+        self.assertEqual(rows[1], [
+            str(self.first.id), '2025-03-01T09:30:00+00:00', 'expense', '150.50', 'Кофе "Зёрна"', 'manual',
+            str(self.category.id), 'Кофе, чай',
+        ])
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.first.id), str(self.second.id)])
+
+    def test_jsonl_with_period(self):
+        response = self.client.get(self.url, {'format': 'jsonl', 'start': '2025-03-02'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        lines = self._body(response).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{
+            'id': self.second.id, 'date': '2025-03-02T12:00:00+00:00', 'type': 'income', 'amount': '1000.00',
+            'description': 'Зарплата', 'source': 'manual', 'category_id': None,
+        }])
+
+    def test_gzip(self):
+        plain = self._body(self.client.get(self.url, {'format': 'jsonl'}))
+        response = self.client.get(self.url, {'format': 'jsonl', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.jsonl.gz"')
+        self.assertEqual(gzip.decompress(self._body(response)), plain)
+
+    def test_parquet(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            response = self.client.get(self.url, {'format': 'parquet'})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            return
+        table = pq.read_table(io.BytesIO(self._body(self.client.get(self.url, {'format': 'parquet'}))))
+        self.assertEqual(table.column('id').to_pylist(), [self.first.id, self.second.id])
+        self.assertEqual(table.column('amount').to_pylist(), [Decimal('150.50'), Decimal('1000.00')])
+
+    def test_invalid_arguments_return_json_400(self):
+        for params in (
+            {'format': 'xml'},
+            {'format': 'csv', 'gzip': 'yes please'},
+            {'format': 'csv', 'include_category': 'maybe'},
+            {'format': 'csv', 'start': '01.03.2025'},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertIn('error', response.json())
+
+
+@override_settings(STATEMENT_IMPORT_ASYNC=False, STATEMENT_IMPORT_JOB_TIMEOUT=900)
+class ImportJobRecoveryTests(TestCase):
+    """Импорт, прерванный перезапуском воркера, возвращается в очередь."""
+
+    def setUp(self):
+        self.user = _create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _running_job(self, seconds_ago):
+        job = ImportJob.objects.create(
+            user=self.user, format='csv', status='running', started_at=timezone.now(),
+            processed_bytes=500, rows_processed=10, created_count=8, duplicate_count=1, error_count=1,
+            errors=[{'row': 3}],
+        )
+        # updated_at - отметка прогресса, save() выставил бы текущее время
+        ImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=seconds_ago))
+        return job
+
+    def test_stale_job_is_requeued_with_reset_counters(self):
+        stale = self._running_job(1000)
+        alive = self._running_job(60)
+        self.assertEqual(requeue_stale_import_jobs(), [stale.pk])
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'pending')
+        self.assertIsNone(stale.started_at)
+        self.assertEqual(
+            (stale.processed_bytes, stale.rows_processed, stale.created_count, stale.errors), (0, 0, 0, [])
+        )
+        alive.refresh_from_db()
+        self.assertEqual((alive.status, alive.rows_processed), ('running', 10))
+
+    def test_polling_requeues_stale_job(self):
+        stale = self._running_job(1000)
+        response = self.client.get(f'/api/v1/transactions/imports/{stale.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'pending')
+
+        alive = self._running_job(60)
+        self.assertEqual(self.client.get(f'/api/v1/transactions/imports/{alive.pk}/').data['status'], 'running')
@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from apps.transactions.views import TransactionViewSet
+from apps.transactions.views import ImportJobViewSet, TransactionViewSet
 
 # Router для транзакций
 router = DefaultRouter()
+# Регистрируется до транзакций: иначе /imports/ совпадёт с /{pk}/
+router.register(r'imports', ImportJobViewSet, basename='import-job')
 router.register(r'', TransactionViewSet, basename='transaction')
 
 urlpatterns = router.urls
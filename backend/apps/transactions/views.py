@@ -1,22 +1,56 @@
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncDay, TruncMonth
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from datetime import datetime, timedelta
-from apps.transactions.models import Transaction
+import time
+from apps.analytics.services.rollups import period_buckets, totals_by_period
+from apps.analytics.services.summary import period_summary
+from apps.core.services.etag import conditional_response
+from apps.core.services.response_cache import cached_response
+from apps.transactions.models import ImportJob, Transaction
+from apps.transactions.pagination import TransactionPagination
+from apps.transactions.negotiation import ExportContentNegotiation
 from apps.transactions.serializers import (
     TransactionSerializer,
     TransactionCreateSerializer,
     TransactionUpdateSerializer,
     TransactionBulkSerializer,
     SMSParseSerializer,
+    SMSBatchParseSerializer,
+    ImportJobSerializer,
+    ImportJobCreateSerializer,
 )
 from apps.transactions.services.sms_parser import parse_sms
-from apps.transactions.services.category_suggester import suggest_category
+from apps.transactions.services.category_suggester import suggest_category, recategorize_transactions
+from apps.transactions.services.bulk_writer import build_fingerprint, bulk_create_transactions
+from apps.transactions.services.fingerprint import idempotency_fingerprint, sms_fingerprint
+from apps.transactions.services.sms_ingest import ingest_sms_batch
+from apps.transactions.services.statement_import import enqueue_import_job, requeue_stale_import_jobs
+from apps.transactions.services.statement_parser import detect_format
+from apps.transactions.services.exporter import (
+    CONTENT_TYPES, EXPORT_FORMATS, ExportFormatError, export_columns, export_rows, export_stream
+)
+
+
+_EXPORT_FLAG_VALUES = {'': False, '0': False, 'false': False, '1': True, 'true': True}
+
+
+def _parse_export_date(value, end=False):
+    """Дата/время ISO 8601; для даты без времени конец периода - конец дня."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if end and len(value) == 10:
+        parsed += timedelta(days=1) - timedelta(microseconds=1)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
 
 
 class TransactionViewSet(viewsets.ModelViewSet):
@@ -28,8 +62,12 @@ class TransactionViewSet(viewsets.ModelViewSet):
     retrieve: GET /api/v1/transactions/{id}/
     update: PUT /api/v1/transactions/{id}/
     destroy: DELETE /api/v1/transactions/{id}/
+
+    Пагинация списка: ?page=N (&count=false - без общего количества)
+    или ?pagination=cursor / ?cursor=... - keyset по (date, id) для бесконечной прокрутки.
     """
     permission_classes = [IsAuthenticated]
+    pagination_class = TransactionPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['type', 'category', 'source']
     ordering_fields = ['date', 'amount', 'created_at']
@@ -49,6 +87,10 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
     serializer_class = TransactionSerializer
 
+    @conditional_response('transactions.list')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -57,11 +99,40 @@ class TransactionViewSet(viewsets.ModelViewSet):
         """
         Массовое создание транзакций (для SMS).
         POST /api/v1/transactions/bulk/
+
+        Body:
+        {
+            "transactions": [{"amount": "100.00", "type": "expense", "date": "...", ...}, ...],
+            "allow_partial": false (опционально, сохранить корректные строки, ошибки остальных - в отчёте)
+        }
+
+        Каждая строка может содержать "idempotency_key": повторная отправка той же
+        пачки после таймаута не создаёт дублей.
+
+        По умолчанию возвращается список созданных транзакций, без дублей и ошибок.
+        С ?envelope=1 возвращается отчёт: created, duplicates, duplicate_indexes,
+        failed, errors, elapsed_ms, rows_per_second и transactions.
         """
+        started = time.perf_counter()
         serializer = TransactionBulkSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         transactions = serializer.save()
-        return Response(TransactionSerializer(transactions, many=True).data, status=status.HTTP_201_CREATED)
+        elapsed = time.perf_counter() - started
+
+        data = TransactionSerializer(transactions, many=True).data
+        if request.query_params.get('envelope', '').lower() not in ('1', 'true'):
+            return Response(data, status=status.HTTP_201_CREATED)
+
+        return Response({
+            'created': len(transactions),
+            'duplicates': len(serializer.duplicate_indexes),
+            'duplicate_indexes': serializer.duplicate_indexes,
+            'failed': len(serializer.validated_data['row_errors']),
+            'errors': serializer.validated_data['row_errors'],
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'rows_per_second': round(len(transactions) / elapsed, 1) if elapsed > 0 else None,
+            'transactions': data,
+        }, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'])
     def sms_parse(self, request):
@@ -72,8 +143,13 @@ class TransactionViewSet(viewsets.ModelViewSet):
         Body:
         {
             "sms_text": "текст SMS",
-            "bank_phone": "+79000000900" (опционально)
+            "bank_phone": "+79000000900" (опционально),
+            "idempotency_key": "..." (опционально),
+            "date": "2024-01-01T10:00:00+03:00" (опционально, время получения SMS)
         }
+
+        Повтор уже обработанной SMS (тот же idempotency_key или тот же текст и date)
+        возвращает существующую транзакцию со статусом 200.
         """
         serializer = SMSParseSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -91,23 +167,93 @@ class TransactionViewSet(viewsets.ModelViewSet):
             )
 
         # Автоматически находим категорию
-        category = suggest_category(parsed_data['description'], parsed_data['type'])
+        category = suggest_category(parsed_data['description'], parsed_data['type'], user=request.user)
+
+        # Повторная отправка той же SMS (ретрай клиента) не создаёт дубль.
+        # Без ключа и времени SMS повтор не отличить от новой такой же SMS - пишем как новую.
+        idempotency_key = serializer.validated_data.get('idempotency_key')
+        sms_date = serializer.validated_data.get('date')
+        row = {
+            'amount': parsed_data['amount'],
+            'description': parsed_data['description'],
+            'type': parsed_data['type'],
+            'date': sms_date or parsed_data['date'],
+            'category': category,
+            'is_ai_parsed': bool(category),
+        }
+        if idempotency_key:
+            row['fingerprint'] = idempotency_fingerprint(request.user.id, idempotency_key)
+        elif sms_date:
+            row['fingerprint'] = sms_fingerprint(request.user.id, sms_text, sms_date)
+        fingerprint = row['fingerprint'] = build_fingerprint(request.user.id, row)
 
         # Создаём транзакцию
-        transaction = Transaction.objects.create(
-            user=request.user,
-            amount=parsed_data['amount'],
-            description=parsed_data['description'],
-            type=parsed_data['type'],
-            date=parsed_data['date'],
-            category=category,
-            source='sms',
-            is_ai_parsed=bool(category)
-        )
+        created, duplicates = bulk_create_transactions(request.user, [row], source='sms')
 
-        return Response(TransactionSerializer(transaction).data, status=status.HTTP_201_CREATED)
+        if duplicates:
+            transaction = Transaction.objects.select_related('category').get(
+                user=request.user, fingerprint=fingerprint
+            )
+            return Response(TransactionSerializer(transaction).data, status=status.HTTP_200_OK)
+
+        return Response(TransactionSerializer(created[0]).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='sms-parse/batch')
+    def sms_parse_batch(self, request):
+        """
+        Пакетный парсинг SMS и создание транзакций (импорт всего SMS-инбокса).
+        POST /api/v1/transactions/sms-parse/batch/
+
+        Body:
+        {
+            "messages": [
+                {"text": "текст SMS", "phone": "900", "date": "2024-01-01T10:00:00+03:00", "idempotency_key": "..."},
+                ...
+            ]
+        }
+
+        Ответ содержит индексы принятых, отклонённых (не распознаны или некорректный date)
+        и повторных SMS.
+        """
+        started = time.perf_counter()
+        serializer = SMSBatchParseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        messages = serializer.validated_data['messages']
+        result = ingest_sms_batch(request.user, messages)
+        elapsed = time.perf_counter() - started
+
+        return Response({
+            'total': len(messages),
+            'accepted_count': len(result['accepted']),
+            'rejected_count': len(result['rejected']),
+            'duplicate_count': len(result['duplicates']),
+            **result,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'rows_per_second': round(len(messages) / elapsed, 1) if elapsed > 0 else None,
+        }, status=status.HTTP_201_CREATED if result['accepted'] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def recategorize(self, request):
+        """
+        Автоматически проставить категории транзакциям без категории.
+        POST /api/v1/transactions/recategorize/
+
+        Body:
+        {
+            "dry_run": true (опционально, только посчитать)
+        }
+        """
+        dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true')
+        result = recategorize_transactions(
+            Transaction.objects.filter(user=request.user),
+            dry_run=dry_run,
+        )
+        return Response({'dry_run': dry_run, **result})
 
     @action(detail=False, methods=['get'])
+    @conditional_response('transactions.stats_by_category', time_window=True)
+    @cached_response('transactions.stats_by_category')
     def stats_by_category(self, request):
         """
         Статистика по категориям за период.
@@ -126,28 +272,17 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if isinstance(end_date, str):
             end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
 
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__range=[start_date, end_date]
-        )
-
-        # Группировка по категориям
-        stats = transactions.filter(type='expense').values(
-            'category__name', 'category__color'
-        ).annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        ).order_by('-total')
-
-        total_expenses = transactions.filter(type='expense').aggregate(total=Sum('amount'))['total'] or 0
-        total_income = transactions.filter(type='income').aggregate(total=Sum('amount'))['total'] or 0
+        # Итоги и группировка по категориям - одним проходом по дневным агрегатам
+        summary = period_summary(request.user.id, start_date, end_date, top_limit=None)
+        total_expenses = summary['total_expenses']
+        total_income = summary['total_income']
 
         result = []
-        for item in stats:
+        for item in summary['top_categories']:
             percentage = (item['total'] / total_expenses * 100) if total_expenses > 0 else 0
             result.append({
-                'category': item['category__name'] or 'Без категории',
-                'color': item['category__color'] or '#CCCCCC',
+                'category': item['name'] or 'Без категории',
+                'color': item['color'] or '#CCCCCC',
                 'amount': float(item['total']),
                 'count': item['count'],
                 'percentage': round(percentage, 1)
@@ -165,6 +300,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @conditional_response('transactions.monthly_stats', time_window=True)
+    @cached_response('transactions.monthly_stats')
     def monthly_stats(self, request):
         """
         Месячная статистика.
@@ -174,26 +311,16 @@ class TransactionViewSet(viewsets.ModelViewSet):
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30 * months)
 
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__range=[start_date, end_date]
-        )
-
         # Группировка по месяцам
-        monthly = transactions.annotate(
-            month=TruncMonth('date')
-        ).values('month').annotate(
-            expenses=Sum('amount', filter=Q(type='expense')),
-            income=Sum('amount', filter=Q(type='income'))
-        ).order_by('month')
+        monthly = totals_by_period(period_buckets(request.user.id, start_date, end_date), 'month')
 
         result = []
         for item in monthly:
             result.append({
-                'month': item['month'].strftime('%Y-%m'),
-                'expenses': float(item['expenses'] or 0),
-                'income': float(item['income'] or 0),
-                'balance': float((item['income'] or 0) - (item['expenses'] or 0))
+                'month': '%04d-%02d' % item['key'],
+                'expenses': float(item['expenses']),
+                'income': float(item['income']),
+                'balance': float(item['income'] - item['expenses'])
             })
 
         return Response({
@@ -202,6 +329,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=False, methods=['get'])
+    @conditional_response('transactions.daily_stats', time_window=True)
+    @cached_response('transactions.daily_stats')
     def daily_stats(self, request):
         """
         Дневная статистика.
@@ -211,26 +340,125 @@ class TransactionViewSet(viewsets.ModelViewSet):
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
 
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__range=[start_date, end_date]
-        )
-
         # Группировка по дням
-        daily = transactions.annotate(
-            day=TruncDay('date')
-        ).values('day').annotate(
-            expenses=Sum('amount', filter=Q(type='expense')),
-            income=Sum('amount', filter=Q(type='income'))
-        ).order_by('day')
+        daily = totals_by_period(period_buckets(request.user.id, start_date, end_date), 'day')
 
         result = [
             {
-                'date': item['day'].strftime('%Y-%m-%d'),
-                'expenses': float(item['expenses'] or 0),
-                'income': float(item['income'] or 0)
+                'date': item['key'].strftime('%Y-%m-%d'),
+                'expenses': float(item['expenses']),
+                'income': float(item['income'])
             }
             for item in daily
         ]
 
         return Response({'daily_data': result})
+
+    @action(
+        detail=False,
+        methods=['get'],
+        renderer_classes=[JSONRenderer],
+        content_negotiation_class=ExportContentNegotiation,
+    )
+    def export(self, request):
+        """
+        Потоковая выгрузка транзакций.
+        GET /api/v1/transactions/export/?format=csv&start=2024-01-01&end=2024-12-31
+
+        Параметры:
+            format: csv (по умолчанию), jsonl или parquet (нужен pyarrow)
+            start, end: границы периода (ISO 8601, опционально)
+            include_category=true: добавить название категории
+            gzip=true: сжать выгрузку (файл .gz)
+        """
+        export_format = request.query_params.get('format') or 'csv'
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'Неизвестный формат экспорта: {export_format} (доступны: {", ".join(EXPORT_FORMATS)})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        flags = {}
+        for name in ('include_category', 'gzip'):
+            value = request.query_params.get(name, '').lower()
+            if value not in _EXPORT_FLAG_VALUES:
+                return Response(
+                    {'error': f'{name}: ожидается true или false'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            flags[name] = _EXPORT_FLAG_VALUES[value]
+        try:
+            start_date = _parse_export_date(request.query_params.get('start'))
+            end_date = _parse_export_date(request.query_params.get('end'), end=True)
+        except ValueError:
+            return Response(
+                {'error': 'Некорректная дата: ожидается формат ISO 8601 (YYYY-MM-DD)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with_category = flags['include_category']
+        use_gzip = flags['gzip']
+        try:
+            stream = export_stream(
+                export_rows(request.user, start_date, end_date, with_category),
+                export_format,
+                export_columns(with_category),
+                gzip=use_gzip,
+            )
+        except ExportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        filename = f'transactions.{export_format}' + ('.gz' if use_gzip else '')
+        response = StreamingHttpResponse(
+            stream,
+            content_type='application/gzip' if use_gzip else CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # Выгрузку не кэшируем и не буферизуем на прокси
+        response['Cache-Control'] = 'no-store'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class ImportJobViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Импорт банковских выписок (CSV/OFX).
+
+    create: POST /api/v1/transactions/imports/ (multipart: file, format, column_map)
+    list: GET /api/v1/transactions/imports/
+    retrieve: GET /api/v1/transactions/imports/{id}/ - статус и прогресс
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ImportJobSerializer
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        # Импорт прерван перезапуском воркера - разбираем файл заново
+        if requeue_stale_import_jobs(ImportJob.objects.filter(pk=job.pk)):
+            job.refresh_from_db()
+            enqueue_import_job(job)
+        return Response(self.get_serializer(job).data)
+
+    def create(self, request):
+        serializer = ImportJobCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        upload = serializer.validated_data['file']
+        statement_format = serializer.validated_data.get('format')
+        if not statement_format:
+            statement_format = detect_format(upload.read(4096), upload.name)
+            upload.seek(0)
+
+        job = ImportJob.objects.create(
+            user=request.user,
+            format=statement_format,
+            file=upload,
+            original_name=upload.name[:255],
+            size_bytes=upload.size,
+            column_map=serializer.validated_data.get('column_map') or {},
+        )
+        # Файл разбирается в фоне; прогресс - через GET /imports/{id}/
+        enqueue_import_job(job)
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
@@ -1,29 +1,84 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.db.models import Sum, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
+from datetime import datetime, time, timedelta
+from apps.analytics.services.rollups import period_buckets, totals_by_type
 from apps.transactions.models import Transaction
 from apps.categories.models import Category
 from apps.transactions.services.sms_parser import parse_sms
+from apps.categories.services.merchant_rules import learn_category
 from apps.transactions.services.category_suggester import suggest_category
 
 
+class RollupCountPaginator(Paginator):
+    """Paginator с заранее известным количеством объектов (без COUNT(*))."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        return self._known_count
+
+
+def _list_period(request):
+    """Период списка из ?date_from/?date_to (YYYY-MM-DD), по умолчанию - последние N дней."""
+    today = timezone.localdate()
+    date_to = parse_date(request.GET.get('date_to') or '') or today
+    date_from = parse_date(request.GET.get('date_from') or '')
+    if date_from is None:
+        date_from = date_to - timedelta(days=settings.TRANSACTION_LIST_DEFAULT_DAYS - 1)
+    if date_from > date_to:
+        date_from, date_to = date_to, date_from
+    return date_from, date_to
+
+
 @login_required
 def transaction_list(request):
-    """Список транзакций"""
+    """Список транзакций (постранично, за период)"""
+    date_from, date_to = _list_period(request)
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to, time.max))
+
     transactions = Transaction.objects.filter(
-        user=request.user
-    ).select_related('category').order_by('-date')
+        user=request.user, date__range=[start, end]
+    ).select_related('category').order_by('-date', '-id')
     
     # Фильтры
     transaction_type = request.GET.get('type')
     category_id = request.GET.get('category')
+    category_id = int(category_id) if category_id and category_id.isdigit() else None
     
     if transaction_type:
         transactions = transactions.filter(type=transaction_type)
     
     if category_id:
         transactions = transactions.filter(category_id=category_id)
+
+    # Количество и итоги - из дневных агрегатов, без COUNT(*) по транзакциям
+    buckets = [
+        bucket for bucket in period_buckets(request.user.id, start, end)
+        if (not transaction_type or bucket['type'] == transaction_type)
+        and (not category_id or bucket['category_id'] == category_id)
+    ]
+    totals = totals_by_type(buckets)
+    count = sum(item['count'] for item in totals.values())
+
+    paginator = RollupCountPaginator(transactions, settings.TRANSACTION_LIST_PAGE_SIZE, count)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Параметры фильтров для ссылок пагинации
+    query = request.GET.copy()
+    query.pop('page', None)
+    query['date_from'] = date_from.isoformat()
+    query['date_to'] = date_to.isoformat()
     
     # Категории для фильтра
     categories = Category.objects.filter(
@@ -31,10 +86,18 @@ def transaction_list(request):
     ).distinct()
     
     context = {
-        'transactions': transactions,
+        'transactions': page_obj.object_list,
+        'page_obj': page_obj,
+        'paginator': paginator,
+        'total_count': count,
+        'total_expenses': totals['expense']['total'],
+        'total_income': totals['income']['total'],
         'categories': categories,
         'current_type': transaction_type,
-        'current_category': int(category_id) if category_id else None,
+        'current_category': category_id,
+        'date_from': date_from,
+        'date_to': date_to,
+        'querystring': query.urlencode(),
     }
     
     return render(request, 'transactions/transaction_list.html', context)
@@ -94,6 +157,7 @@ def transaction_edit(request, pk):
     ).distinct()
     
     if request.method == 'POST':
+        previous_category_id = transaction.category_id
         transaction.amount = request.POST.get('amount')
         transaction.description = request.POST.get('description')
         transaction.type = request.POST.get('type')
@@ -106,6 +170,8 @@ def transaction_edit(request, pk):
             transaction.category = None
         
         transaction.save()
+        if transaction.category and transaction.category_id != previous_category_id:
+            learn_category(request.user.id, transaction.description, transaction.type, transaction.category)
         
         messages.success(request, 'Транзакция обновлена!')
         return redirect('transactions:list')
@@ -155,7 +221,9 @@ def sms_parse_view(request):
             return redirect('transactions:sms_parse')
         
         # Предлагаем категорию
-        suggested_category = suggest_category(parsed_data['description'], parsed_data['type'])
+        suggested_category = suggest_category(
+            parsed_data['description'], parsed_data['type'], user=request.user
+        )
         
         # Сохраняем в сессию для подтверждения
         request.session['parsed_transaction'] = {
@@ -247,3 +247,118 @@ SPECTACULAR_SETTINGS = {
 # AI Settings
 OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
 LLM_MODEL = os.getenv('LLM_MODEL', 'llama2')
+
+# Transactions bulk ingestion
+# Максимальное количество строк в одном запросе POST /api/v1/transactions/bulk/
+TRANSACTIONS_BULK_MAX_BATCH = int(os.getenv('TRANSACTIONS_BULK_MAX_BATCH', 5000))
+# Размер пачки для одного INSERT при bulk_create
+TRANSACTIONS_BULK_CHUNK_SIZE = int(os.getenv('TRANSACTIONS_BULK_CHUNK_SIZE', 500))
+# Максимальное количество SMS в одном запросе POST /api/v1/transactions/sms-parse/batch/
+TRANSACTIONS_SMS_BATCH_MAX = int(os.getenv('TRANSACTIONS_SMS_BATCH_MAX', 20000))
+
+# Categorization
+# Как долго (в секундах) воркер держит кэш системных категорий без перечитывания
+SYSTEM_CATEGORY_CACHE_TTL = int(os.getenv('SYSTEM_CATEGORY_CACHE_TTL', 300))
+
+# SMS parsing
+# Файл шаблонов банков (по умолчанию apps/transactions/data/bank_templates.json)
+SMS_BANK_TEMPLATES_PATH = os.getenv(
+    'SMS_BANK_TEMPLATES_PATH',
+    str(BASE_DIR / 'apps' / 'transactions' / 'data' / 'bank_templates.json')
+)
+# Как часто (в секундах) воркеры проверяют, не изменился ли файл шаблонов
+SMS_TEMPLATES_RELOAD_INTERVAL = int(os.getenv('SMS_TEMPLATES_RELOAD_INTERVAL', 30))
+
+# Cache
+# Общий кэш для всех воркеров (Redis). Без REDIS_URL - локальная память процесса
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Response cache
+# TTL (в секундах) кэша ответов аналитики по эндпоинтам; 0 - не кэшировать.
+# Изменения данных сбрасывают кэш сразу (через версию данных), TTL ограничивает
+# только сдвиг периодов "последние N дней" относительно текущего времени.
+RESPONSE_CACHE_DEFAULT_TTL = int(os.getenv('RESPONSE_CACHE_DEFAULT_TTL', 300))
+RESPONSE_CACHE_TTLS = {
+    'analytics.summary': int(os.getenv('RESPONSE_CACHE_TTL_SUMMARY', RESPONSE_CACHE_DEFAULT_TTL)),
+    'analytics.daily': int(os.getenv('RESPONSE_CACHE_TTL_DAILY', RESPONSE_CACHE_DEFAULT_TTL)),
+    'analytics.monthly': int(os.getenv('RESPONSE_CACHE_TTL_MONTHLY', 900)),
+    'transactions.stats_by_category': int(os.getenv('RESPONSE_CACHE_TTL_STATS_BY_CATEGORY', RESPONSE_CACHE_DEFAULT_TTL)),
+    'transactions.monthly_stats': int(os.getenv('RESPONSE_CACHE_TTL_MONTHLY_STATS', 900)),
+    'transactions.daily_stats': int(os.getenv('RESPONSE_CACHE_TTL_DAILY_STATS', RESPONSE_CACHE_DEFAULT_TTL)),
+}
+
+# Delta sync (GET /api/v1/sync/)
+# Размер страницы по умолчанию и максимальный ?limit
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 1000))
+SYNC_MAX_PAGE_SIZE = int(os.getenv('SYNC_MAX_PAGE_SIZE', 5000))
+# Перекрытие раундов: изменения последних N секунд отдаются повторно,
+# чтобы не потерять транзакции БД, закоммиченные позже своего updated_at
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', 5))
+# Сколько дней хранятся отметки об удалении; более старый курсор - полная перезагрузка
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+
+# Transaction list page (/transactions/)
+# Транзакций на странице и период по умолчанию (последние N дней)
+TRANSACTION_LIST_PAGE_SIZE = int(os.getenv('TRANSACTION_LIST_PAGE_SIZE', 50))
+TRANSACTION_LIST_DEFAULT_DAYS = int(os.getenv('TRANSACTION_LIST_DEFAULT_DAYS', 90))
+
+# Dashboard page
+# Сколько секунд хранится список последних транзакций (сбрасывается изменением данных)
+DASHBOARD_RECENT_CACHE_TTL = int(os.getenv('DASHBOARD_RECENT_CACHE_TTL', 600))
+
+# Transactions export (GET /api/v1/transactions/export/)
+# Сколько строк читается из серверного курсора и кодируется за раз
+TRANSACTIONS_EXPORT_CHUNK_SIZE = int(os.getenv('TRANSACTIONS_EXPORT_CHUNK_SIZE', 2000))
+
+# Bank statement import (POST /api/v1/transactions/imports/)
+# Операций в одной пачке категоризации и записи в БД
+STATEMENT_IMPORT_CHUNK_SIZE = int(os.getenv('STATEMENT_IMPORT_CHUNK_SIZE', 1000))
+# Максимальный размер загружаемого файла (байт)
+STATEMENT_IMPORT_MAX_SIZE = int(os.getenv('STATEMENT_IMPORT_MAX_SIZE', 200 * 1024 * 1024))
+# Насколько дней вокруг текущей строки выписки помнить счётчики одинаковых операций.
+# Строки за более далёкий уже пройденный день не импортируются и считаются ошибкой
+STATEMENT_IMPORT_DAY_WINDOW = int(os.getenv('STATEMENT_IMPORT_DAY_WINDOW', 7))
+# Разбирать загруженные файлы в фоновых потоках веб-процесса.
+# False - задачи ждут команды `manage.py import_statement --pending` (cron/отдельный воркер)
+STATEMENT_IMPORT_ASYNC = os.getenv('STATEMENT_IMPORT_ASYNC', 'True') == 'True'
+# Потоков импорта на один процесс
+STATEMENT_IMPORT_WORKERS = int(os.getenv('STATEMENT_IMPORT_WORKERS', 1))
+# Через сколько секунд без прогресса выполняемый импорт считается прерванным
+# (воркер перезапущен) и возвращается в очередь
+STATEMENT_IMPORT_JOB_TIMEOUT = int(os.getenv('STATEMENT_IMPORT_JOB_TIMEOUT', 900))
+
+# AI insights (GET /api/v1/analytics/ai-insights/)
+# Рекомендации кэшируются по хэшу данных для промпта, модели и версии промпта.
+# Сколько секунд рекомендации для одних и тех же данных считаются актуальными (хранятся в БД)
+AI_INSIGHTS_CONTENT_TTL = int(os.getenv('AI_INSIGHTS_CONTENT_TTL', 7 * 24 * 3600))
+# Сколько секунд запись держится в кэше Django поверх БД и сколько - ответ с ошибкой API
+AI_INSIGHTS_CACHE_TTL = int(os.getenv('AI_INSIGHTS_CACHE_TTL', 3600))
+AI_INSIGHTS_ERROR_CACHE_TTL = int(os.getenv('AI_INSIGHTS_ERROR_CACHE_TTL', 300))
+# Сколько секунд отдаются устаревшие рекомендации (истёкшие или по прежним данным),
+# пока одна фоновая задача готовит новые
+AI_INSIGHTS_STALE_TTL = int(os.getenv('AI_INSIGHTS_STALE_TTL', 86400))
+# Генерировать рекомендации в фоновых потоках веб-процесса.
+# False - задачи ждут команды `manage.py run_insight_jobs` (отдельный воркер)
+AI_INSIGHTS_ASYNC = os.getenv('AI_INSIGHTS_ASYNC', 'True') == 'True'
+# Потоков генерации на один процесс
+AI_INSIGHTS_WORKERS = int(os.getenv('AI_INSIGHTS_WORKERS', 2))
+# Через сколько секунд незавершённая задача считается потерянной: зависшая в running
+# завершается ошибкой (run_insight_jobs, опрос статуса), по запросу создаётся новая
+AI_INSIGHTS_JOB_TIMEOUT = int(os.getenv('AI_INSIGHTS_JOB_TIMEOUT', 600))
+# Рекомендуемый клиенту интервал опроса задачи (Retry-After), секунд
+AI_INSIGHTS_POLL_INTERVAL = int(os.getenv('AI_INSIGHTS_POLL_INTERVAL', 2))
+# Сколько дней хранятся задачи
+AI_INSIGHTS_JOB_RETENTION_DAYS = int(os.getenv('AI_INSIGHTS_JOB_RETENTION_DAYS', 7))